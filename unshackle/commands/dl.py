@@ -10,8 +10,10 @@ import shutil
 import subprocess
 import sys
 import time
+from collections import deque
 from concurrent import futures
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 from copy import deepcopy
 from functools import partial
 from http.cookiejar import CookieJar, MozillaCookieJar
@@ -50,6 +52,7 @@ from unshackle.core.config import config
 from unshackle.core.console import console
 from unshackle.core.constants import DOWNLOAD_LICENCE_ONLY, AnyTrack, context_settings
 from unshackle.core.credential import Credential
+from unshackle.core.downloaders import bandwidth, connections
 from unshackle.core.drm import DRM_T, MonaLisa, PlayReady, Widevine
 from unshackle.core.events import events
 from unshackle.core.proxies import Basic, Gluetun, Hola, NordVPN, SurfsharkVPN, WindscribeVPN
@@ -494,6 +497,18 @@ class dl:
         help="Max workers/threads to download with per-track. Default depends on the downloader.",
     )
     @click.option("--downloads", type=int, default=1, help="Amount of tracks to download concurrently.")
+    @click.option(
+        "--resume",
+        is_flag=True,
+        default=False,
+        help="Continue interrupted track downloads from their temp data instead of starting over.",
+    )
+    @click.option(
+        "--pipeline",
+        is_flag=True,
+        default=False,
+        help="Mux each title in the background while the next title is licensed and downloaded.",
+    )
     @click.option(
         "-o",
         "--output",
@@ -1000,6 +1015,8 @@ class dl:
         worst: bool,
         best_available: bool,
         split_audio: Optional[bool] = None,
+        resume: bool = False,
+        pipeline: bool = False,
         *_: Any,
         **__: Any,
     ) -> None:
@@ -1264,6 +1281,10 @@ class dl:
             latest_episode_id = f"{latest_ep.season}x{latest_ep.number}"
             self.log.info(f"Latest episode mode: Selecting S{latest_ep.season:02}E{latest_ep.number:02}")
 
+        # titles are muxed one at a time, but may be while the next title is downloading
+        mux_pool = ThreadPoolExecutor(1, thread_name_prefix="mux") if pipeline else None
+        pending_muxes: deque[Future] = deque()
+
         for i, title in enumerate(titles):
             if isinstance(title, Episode) and latest_episode and latest_episode_id:
                 # If --latest-episode is set, only process the latest episode
@@ -1909,9 +1930,8 @@ class dl:
 
             selected_tracks, tracks_progress_callables = title.tracks.tree(add_progress=True)
 
-            for track in title.tracks:
-                if hasattr(track, "needs_drm_loading") and track.needs_drm_loading:
-                    track.load_drm_if_needed(service)
+            # only the selected tracks are left, so it doesn't request the playlists of every rendition
+            title.tracks.load_drm(service)
 
             download_table = Table.grid()
             download_table.add_row(selected_tracks)
@@ -1939,7 +1959,12 @@ class dl:
                             )
                             self.cdm = quality_based_cdm
 
+            # cap the temp data to the title downloading and at most one title waiting to be muxed
+            while len(pending_muxes) > 1 or (pending_muxes and pending_muxes[0].done()):
+                pending_muxes.popleft().result()
+
             dl_start_time = time.time()
+            connections.set_concurrent_downloads(downloads)
 
             try:
                 with Live(Padding(download_table, (1, 5)), console=console, refresh_per_second=5):
@@ -1972,8 +1997,12 @@ class dl:
                                     cdm=self.cdm,
                                     max_workers=workers,
                                     progress=tracks_progress_callables[i],
+                                    resume=resume,
+                                )
+                                # start the tracks of higher priority classes first, e.g., audio and subs
+                                for i, track in sorted(
+                                    enumerate(title.tracks), key=lambda x: bandwidth.get_priority(x[1])
                                 )
-                                for i, track in enumerate(title.tracks)
                             )
                         ):
                             download.result()
@@ -2031,484 +2060,577 @@ class dl:
                 dl_time = time_elapsed_since(dl_start_time)
                 console.print(Padding(f"Track downloads finished in [progress.elapsed]{dl_time}[/]", (0, 5)))
 
-                # Subtitle output mode configuration (for sidecar originals)
-                subtitle_output_mode = config.subtitle.get("output_mode", "mux")
-                sidecar_format = config.subtitle.get("sidecar_format", "srt")
-                skip_subtitle_mux = subtitle_output_mode == "sidecar" and (title.tracks.videos or title.tracks.audio)
-                sidecar_subtitles: list[Subtitle] = []
-                sidecar_original_paths: dict[str, Path] = {}
-                if subtitle_output_mode in ("sidecar", "both") and not no_mux:
-                    sidecar_subtitles = [s for s in title.tracks.subtitles if s.path and s.path.exists()]
-                    if sidecar_format == "original":
-                        config.directories.temp.mkdir(parents=True, exist_ok=True)
-                        for subtitle in sidecar_subtitles:
-                            original_path = (
-                                config.directories.temp / f"sidecar_original_{subtitle.id}{subtitle.path.suffix}"
-                            )
-                            shutil.copy2(subtitle.path, original_path)
-                            sidecar_original_paths[subtitle.id] = original_path
-
-                with console.status("Converting Subtitles..."):
-                    for subtitle in title.tracks.subtitles:
-                        if sub_format:
-                            if subtitle.codec != sub_format:
-                                subtitle.convert(sub_format)
-                        elif subtitle.codec == Subtitle.Codec.TimedTextMarkupLang:
-                            # MKV does not support TTML, VTT is the next best option
-                            subtitle.convert(Subtitle.Codec.WebVTT)
-
-                with console.status("Checking Subtitles for Fonts..."):
-                    font_names = []
-                    for subtitle in title.tracks.subtitles:
-                        if subtitle.codec == Subtitle.Codec.SubStationAlphav4:
-                            for line in subtitle.path.read_text("utf8").splitlines():
-                                if line.startswith("Style: "):
-                                    font_names.append(line.removeprefix("Style: ").split(",")[1].strip())
-
-                    font_count, missing_fonts = self.attach_subtitle_fonts(font_names, title, temp_font_files)
-
-                    if font_count:
-                        self.log.info(f"Attached {font_count} fonts for the Subtitles")
-
-                    if missing_fonts and sys.platform != "win32":
-                        self.suggest_missing_fonts(missing_fonts)
-
-                # Handle DRM decryption BEFORE repacking (must decrypt first!)
-                service_name = service.__class__.__name__.upper()
-                decryption_method = config.decryption_map.get(service_name, config.decryption)
-                decrypt_tool = "mp4decrypt" if decryption_method.lower() == "mp4decrypt" else "Shaka Packager"
-
-                drm_tracks = [track for track in title.tracks if track.drm]
-                if drm_tracks:
-                    with console.status(f"Decrypting tracks with {decrypt_tool}..."):
-                        has_decrypted = False
-                        for track in drm_tracks:
-                            drm = track.get_drm_for_cdm(self.cdm)
-                            if drm and hasattr(drm, "decrypt"):
-                                drm.decrypt(track.path)
-                                if not isinstance(drm, MonaLisa):
-                                    has_decrypted = True
-                                events.emit(events.Types.TRACK_REPACKED, track=track)
-                            else:
-                                self.log.warning(
-                                    f"No matching DRM found for track {track} with CDM type {type(self.cdm).__name__}"
-                                )
-                        if has_decrypted:
-                            self.log.info(f"Decrypted tracks with {decrypt_tool}")
+                if self.debug_logger:
+                    self.debug_logger.log(
+                        level="DEBUG",
+                        operation="download_connection_pools",
+                        service=self.service,
+                        message="Connection pool usage of the track downloads so far",
+                        context={"title": str(title), "pools": connections.get_stats()},
+                    )
 
-                # Extract Closed Captions from decrypted video tracks
-                if (
-                    not no_subs
-                    and not (hasattr(service, "NO_SUBTITLES") and service.NO_SUBTITLES)
-                    and not video_only
-                    and not no_video
-                ):
-                    match_func = is_exact_match if exact_lang else is_close_match
-                    for video_track_n, video_track in enumerate(title.tracks.videos):
-                        has_manifest_cc = bool(getattr(video_track, "closed_captions", None))
-                        has_eia_cc = (
-                            not has_manifest_cc
-                            and not title.tracks.subtitles
-                            and any(
-                                x.get("codec_name", "").startswith("eia_")
-                                for x in ffprobe(video_track.path).get("streams", [])
-                            )
-                        )
-                        if not has_manifest_cc and not has_eia_cc:
-                            continue
+                finish = partial(
+                    self.finish_title,
+                    title=title,
+                    service=service,
+                    cdm=self.cdm,
+                    temp_font_files=temp_font_files,
+                    dl_start_time=dl_start_time,
+                    tmdb_id=self.tmdb_id,
+                    imdb_id=self.imdb_id,
+                    quality=quality,
+                    vcodec=vcodec,
+                    range_=range_,
+                    s_lang=s_lang,
+                    exact_lang=exact_lang,
+                    sub_format=sub_format,
+                    video_only=video_only,
+                    no_subs=no_subs,
+                    no_audio=no_audio,
+                    no_video=no_video,
+                    no_folder=no_folder,
+                    no_source=no_source,
+                    no_mux=no_mux,
+                    split_audio=split_audio,
+                )
+                if mux_pool:
+                    # mux in the background, while the next title is licensed and downloaded
+                    self.log.info(f"Muxing {title} in the background...")
+                    mux = mux_pool.submit(finish, live=False)
+                    mux.add_done_callback(partial(self.log_mux_error, title=title))
+                    pending_muxes.append(mux)
+                else:
+                    finish()
 
-                        # Build list of CC entries to extract
-                        if has_manifest_cc:
-                            cc_entries = video_track.closed_captions
-                            # Filter CC languages against --s-lang if specified
-                            if s_lang and "all" not in s_lang:
-                                cc_entries = [
-                                    entry for entry in cc_entries
-                                    if entry.get("language")
-                                    and match_func(Language.get(entry["language"]), s_lang)
-                                ]
-                                if not cc_entries:
-                                    continue
-                        else:
-                            # EIA fallback: single entry with unknown language
-                            cc_entries = [{}]
-
-                        with console.status(f"Checking Video track {video_track_n + 1} for Closed Captions..."):
-                            try:
-                                for cc_idx, cc_entry in enumerate(cc_entries):
-                                    cc_lang = (
-                                        Language.get(cc_entry["language"])
-                                        if cc_entry.get("language")
-                                        else title.language or video_track.language
-                                    )
-                                    track_id = f"ccextractor-{video_track.id}-{cc_idx}"
-                                    cc = video_track.ccextractor(
-                                        track_id=track_id,
-                                        out_path=config.directories.temp
-                                        / config.filenames.subtitle.format(id=track_id, language=cc_lang),
-                                        language=cc_lang,
-                                        original=False,
-                                    )
-                                    if cc:
-                                        cc.cc = True
-                                        title.tracks.add(cc)
-                                        self.log.info(
-                                            f"Extracted a Closed Caption ({cc_lang}) from Video track {video_track_n + 1}"
-                                        )
-                                    else:
-                                        self.log.info(
-                                            f"No Closed Captions were found in Video track {video_track_n + 1}"
-                                        )
-                            except EnvironmentError:
-                                self.log.error(
-                                    "Cannot extract Closed Captions as the ccextractor executable was not found..."
-                                )
-                                break
+            # update cookies
+            cookie_file = self.get_cookie_path(self.service, self.profile)
+            if cookie_file:
+                self.save_cookies(cookie_file, service.session.cookies)
 
-                # Now repack the decrypted tracks
-                with console.status("Repackaging tracks with FFMPEG..."):
-                    has_repacked = False
-                    for track in title.tracks:
-                        if track.needs_repack:
-                            track.repackage()
-                            has_repacked = True
-                            events.emit(events.Types.TRACK_REPACKED, track=track)
-                    if has_repacked:
-                        # we don't want to fill up the log with "Repacked x track"
-                        self.log.info("Repacked one or more tracks with FFMPEG")
-
-                muxed_paths = []
-                muxed_audio_codecs: dict[Path, Optional[Audio.Codec]] = {}
-                append_audio_codec_suffix = True
-
-                if no_mux:
-                    # Skip muxing, handle individual track files
-                    for track in title.tracks:
-                        if track.path and track.path.exists():
-                            muxed_paths.append(track.path)
-                elif isinstance(title, (Movie, Episode)):
-                    progress = Progress(
-                        TextColumn("[progress.description]{task.description}"),
-                        SpinnerColumn(finished_text=""),
-                        BarColumn(),
-                        "•",
-                        TimeRemainingColumn(compact=True, elapsed_when_finished=True),
-                        console=console,
-                    )
+        while pending_muxes:
+            pending_muxes.popleft().result()
+        if mux_pool:
+            mux_pool.shutdown()
 
-                    merge_audio = (
-                        (not split_audio) if split_audio is not None else config.muxing.get("merge_audio", True)
-                    )
-                    # When we split audio (merge_audio=False), multiple outputs may exist per title, so suffix codec.
-                    append_audio_codec_suffix = not merge_audio
-
-                    multiplex_tasks: list[tuple[TaskID, Tracks, Optional[Audio.Codec]]] = []
-                    # Track hybrid-processing outputs explicitly so we can always clean them up,
-                    # even if muxing fails early (e.g. SystemExit) before the normal delete loop.
-                    hybrid_temp_paths: list[Path] = []
-
-                    def clone_tracks_for_audio(base_tracks: Tracks, audio_tracks: list[Audio]) -> Tracks:
-                        task_tracks = Tracks()
-                        task_tracks.videos = list(base_tracks.videos)
-                        task_tracks.audio = audio_tracks
-                        task_tracks.subtitles = list(base_tracks.subtitles)
-                        task_tracks.chapters = base_tracks.chapters
-                        task_tracks.attachments = list(base_tracks.attachments)
-                        return task_tracks
-
-                    def enqueue_mux_tasks(task_description: str, base_tracks: Tracks) -> None:
-                        if merge_audio or not base_tracks.audio:
-                            task_id = progress.add_task(f"{task_description}...", total=None, start=False)
-                            multiplex_tasks.append((task_id, base_tracks, None))
-                            return
-
-                        audio_by_codec: dict[Optional[Audio.Codec], list[Audio]] = {}
-                        for audio_track in base_tracks.audio:
-                            audio_by_codec.setdefault(audio_track.codec, []).append(audio_track)
-
-                        for audio_codec, codec_audio_tracks in audio_by_codec.items():
-                            description = task_description
-                            if audio_codec:
-                                description = f"{task_description} {audio_codec.name}"
-
-                            task_id = progress.add_task(f"{description}...", total=None, start=False)
-                            task_tracks = clone_tracks_for_audio(base_tracks, codec_audio_tracks)
-                            multiplex_tasks.append((task_id, task_tracks, audio_codec))
-
-                    # Check if we're in hybrid mode
-                    if any(r == Video.Range.HYBRID for r in range_) and title.tracks.videos:
-                        # Hybrid mode: process DV and HDR10 tracks separately for each resolution
-                        self.log.info("Processing Hybrid HDR10+DV tracks...")
-
-                        # Group video tracks by resolution (prefer HDR10+ over HDR10 as base)
-                        resolutions_processed = set()
-                        base_tracks_list = [
-                            v for v in title.tracks.videos if v.range in (Video.Range.HDR10P, Video.Range.HDR10)
-                        ]
-                        dv_tracks = [v for v in title.tracks.videos if v.range == Video.Range.DV]
+        dl_time = time_elapsed_since(start_time)
+
+        console.print(Padding(f"Processed all titles in [progress.elapsed]{dl_time}", (0, 5, 1, 5)))
+
+    def finish_title(
+        self,
+        title: Title_T,
+        service: Service,
+        cdm: Any,
+        temp_font_files: list[Path],
+        dl_start_time: float,
+        tmdb_id: Optional[int],
+        imdb_id: Optional[str],
+        quality: list[int],
+        vcodec: list[Video.Codec],
+        range_: list[Video.Range],
+        s_lang: list[str],
+        exact_lang: bool,
+        sub_format: Optional[Subtitle.Codec],
+        video_only: bool,
+        no_subs: bool,
+        no_audio: bool,
+        no_video: bool,
+        no_folder: bool,
+        no_source: bool,
+        no_mux: bool,
+        split_audio: Optional[bool],
+        live: bool = True,
+    ) -> None:
+        """
+        Decrypt, repack, and mux the downloaded tracks of a title, and move the output to the downloads directory.
+
+        Parameters:
+            title: The title whose tracks were downloaded.
+            service: The service the title is from.
+            cdm: The CDM the tracks were licensed with, to get the DRM to decrypt them with.
+            temp_font_files: Temp font files of the title, deleted once muxed.
+            dl_start_time: When the track downloads started, to print how long the title took.
+            tmdb_id: The TMDB ID to tag the output files with, if any.
+            imdb_id: The IMDB ID to tag the output files with, if any.
+            live: Show live status and progress displays. These must be off if it's not run
+                on the main thread, as only one live display may be shown at a time.
+        """
 
-                        for hdr10_track in base_tracks_list:
-                            resolution = hdr10_track.height
-                            if resolution in resolutions_processed:
-                                continue
-                            resolutions_processed.add(resolution)
-
-                            # Find matching DV track for this resolution (use the lowest DV resolution)
-                            matching_dv = min(dv_tracks, key=lambda v: v.height) if dv_tracks else None
-
-                            if matching_dv:
-                                # Create track pair for this resolution
-                                resolution_tracks = [hdr10_track, matching_dv]
-
-                                for track in resolution_tracks:
-                                    track.needs_duration_fix = True
-
-                                # Run the hybrid processing for this resolution
-                                Hybrid(resolution_tracks, self.service)
-
-                                # Create unique output filename for this resolution
-                                hybrid_filename = f"HDR10-DV-{resolution}p.hevc"
-                                hybrid_output_path = config.directories.temp / hybrid_filename
-                                hybrid_temp_paths.append(hybrid_output_path)
-
-                                # The Hybrid class creates HDR10-DV.hevc, rename it for this resolution
-                                default_output = config.directories.temp / "HDR10-DV.hevc"
-                                if default_output.exists():
-                                    # If a previous run left this behind, replace it to avoid move() failures.
-                                    hybrid_output_path.unlink(missing_ok=True)
-                                    shutil.move(str(default_output), str(hybrid_output_path))
-
-                                # Create tracks with the hybrid video output for this resolution
-                                task_description = f"Multiplexing Hybrid HDR10+DV {resolution}p"
-                                task_tracks = Tracks(title.tracks) + title.tracks.chapters + title.tracks.attachments
-
-                                # Create a new video track for the hybrid output
-                                hybrid_track = deepcopy(hdr10_track)
-                                hybrid_track.id = f"hybrid_{hdr10_track.id}_{resolution}"
-                                hybrid_track.path = hybrid_output_path
-                                hybrid_track.range = Video.Range.DV  # It's now a DV track
-                                hybrid_track.needs_duration_fix = True
-                                title.tracks.add(hybrid_track)
-                                task_tracks.videos = [hybrid_track]
-
-                                enqueue_mux_tasks(task_description, task_tracks)
-
-                        console.print()
+        def status(message: str) -> Any:
+            if live:
+                return console.status(message)
+            self.log.info(f"{title}: {message}")
+            return nullcontext()
+
+        # Subtitle output mode configuration (for sidecar originals)
+        subtitle_output_mode = config.subtitle.get("output_mode", "mux")
+        sidecar_format = config.subtitle.get("sidecar_format", "srt")
+        skip_subtitle_mux = subtitle_output_mode == "sidecar" and (title.tracks.videos or title.tracks.audio)
+        sidecar_subtitles: list[Subtitle] = []
+        sidecar_original_paths: dict[str, Path] = {}
+        if subtitle_output_mode in ("sidecar", "both") and not no_mux:
+            sidecar_subtitles = [s for s in title.tracks.subtitles if s.path and s.path.exists()]
+            if sidecar_format == "original":
+                config.directories.temp.mkdir(parents=True, exist_ok=True)
+                for subtitle in sidecar_subtitles:
+                    original_path = config.directories.temp / f"sidecar_original_{subtitle.id}{subtitle.path.suffix}"
+                    shutil.copy2(subtitle.path, original_path)
+                    sidecar_original_paths[subtitle.id] = original_path
+
+        with status("Converting Subtitles..."):
+            for subtitle in title.tracks.subtitles:
+                if sub_format:
+                    if subtitle.codec != sub_format:
+                        subtitle.convert(sub_format)
+                elif subtitle.codec == Subtitle.Codec.TimedTextMarkupLang:
+                    # MKV does not support TTML, VTT is the next best option
+                    subtitle.convert(Subtitle.Codec.WebVTT)
+
+        with status("Checking Subtitles for Fonts..."):
+            font_names = []
+            for subtitle in title.tracks.subtitles:
+                if subtitle.codec == Subtitle.Codec.SubStationAlphav4:
+                    for line in subtitle.path.read_text("utf8").splitlines():
+                        if line.startswith("Style: "):
+                            font_names.append(line.removeprefix("Style: ").split(",")[1].strip())
+
+            font_count, missing_fonts = self.attach_subtitle_fonts(font_names, title, temp_font_files)
+
+            if font_count:
+                self.log.info(f"Attached {font_count} fonts for the Subtitles")
+
+            if missing_fonts and sys.platform != "win32":
+                self.suggest_missing_fonts(missing_fonts)
+
+        # Handle DRM decryption BEFORE repacking (must decrypt first!)
+        service_name = service.__class__.__name__.upper()
+        decryption_method = config.decryption_map.get(service_name, config.decryption)
+        decrypt_tool = "mp4decrypt" if decryption_method.lower() == "mp4decrypt" else "Shaka Packager"
+
+        drm_tracks = [track for track in title.tracks if track.drm]
+        if drm_tracks:
+            with status(f"Decrypting tracks with {decrypt_tool}..."):
+                has_decrypted = False
+                for track in drm_tracks:
+                    drm = track.get_drm_for_cdm(cdm)
+                    if drm and hasattr(drm, "decrypt"):
+                        drm.decrypt(track.path)
+                        if not isinstance(drm, MonaLisa):
+                            has_decrypted = True
+                        events.emit(events.Types.TRACK_REPACKED, track=track)
                     else:
-                        # Normal mode: process each video track separately
-                        for video_track in title.tracks.videos or [None]:
-                            task_description = "Multiplexing"
-                            if video_track:
-                                if len(quality) > 1:
-                                    task_description += f" {video_track.height}p"
-                                if len(range_) > 1:
-                                    task_description += f" {video_track.range.name}"
-                                if len(vcodec) > 1:
-                                    task_description += f" {video_track.codec.name}"
-
-                            task_tracks = Tracks(title.tracks) + title.tracks.chapters + title.tracks.attachments
-                            if video_track:
-                                task_tracks.videos = [video_track]
-
-                            enqueue_mux_tasks(task_description, task_tracks)
+                        self.log.warning(f"No matching DRM found for track {track} with CDM type {type(cdm).__name__}")
+                if has_decrypted:
+                    self.log.info(f"Decrypted tracks with {decrypt_tool}")
+
+        # Extract Closed Captions from decrypted video tracks
+        if (
+            not no_subs
+            and not (hasattr(service, "NO_SUBTITLES") and service.NO_SUBTITLES)
+            and not video_only
+            and not no_video
+        ):
+            match_func = is_exact_match if exact_lang else is_close_match
+            for video_track_n, video_track in enumerate(title.tracks.videos):
+                has_manifest_cc = bool(getattr(video_track, "closed_captions", None))
+                has_eia_cc = (
+                    not has_manifest_cc
+                    and not title.tracks.subtitles
+                    and any(
+                        x.get("codec_name", "").startswith("eia_") for x in ffprobe(video_track.path).get("streams", [])
+                    )
+                )
+                if not has_manifest_cc and not has_eia_cc:
+                    continue
+
+                # Build list of CC entries to extract
+                if has_manifest_cc:
+                    cc_entries = video_track.closed_captions
+                    # Filter CC languages against --s-lang if specified
+                    if s_lang and "all" not in s_lang:
+                        cc_entries = [
+                            entry
+                            for entry in cc_entries
+                            if entry.get("language") and match_func(Language.get(entry["language"]), s_lang)
+                        ]
+                        if not cc_entries:
+                            continue
+                else:
+                    # EIA fallback: single entry with unknown language
+                    cc_entries = [{}]
 
+                with status(f"Checking Video track {video_track_n + 1} for Closed Captions..."):
                     try:
-                        with Live(Padding(progress, (0, 5, 1, 5)), console=console):
-                            mux_index = 0
-                            for task_id, task_tracks, audio_codec in multiplex_tasks:
-                                progress.start_task(task_id)  # TODO: Needed?
-                                audio_expected = not video_only and not no_audio
-                                muxed_path, return_code, errors = task_tracks.mux(
-                                    str(title),
-                                    progress=partial(progress.update, task_id=task_id),
-                                    delete=False,
-                                    audio_expected=audio_expected,
-                                    title_language=title.language,
-                                    skip_subtitles=skip_subtitle_mux,
+                        for cc_idx, cc_entry in enumerate(cc_entries):
+                            cc_lang = (
+                                Language.get(cc_entry["language"])
+                                if cc_entry.get("language")
+                                else title.language or video_track.language
+                            )
+                            track_id = f"ccextractor-{video_track.id}-{cc_idx}"
+                            cc = video_track.ccextractor(
+                                track_id=track_id,
+                                out_path=config.directories.temp
+                                / config.filenames.subtitle.format(id=track_id, language=cc_lang),
+                                language=cc_lang,
+                                original=False,
+                            )
+                            if cc:
+                                cc.cc = True
+                                title.tracks.add(cc)
+                                self.log.info(
+                                    f"Extracted a Closed Caption ({cc_lang}) from Video track {video_track_n + 1}"
                                 )
-                                if muxed_path.exists():
-                                    mux_index += 1
-                                    unique_path = muxed_path.with_name(
-                                        f"{muxed_path.stem}.{mux_index}{muxed_path.suffix}"
-                                    )
-                                    if unique_path != muxed_path:
-                                        shutil.move(muxed_path, unique_path)
-                                        muxed_path = unique_path
-                                muxed_paths.append(muxed_path)
-                                muxed_audio_codecs[muxed_path] = audio_codec
-                                if return_code >= 2:
-                                    self.log.error(f"Failed to Mux video to Matroska file ({return_code}):")
-                                elif return_code == 1 or errors:
-                                    self.log.warning("mkvmerge had at least one warning or error, continuing anyway...")
-                                for line in errors:
-                                    if line.startswith("#GUI#error"):
-                                        self.log.error(line)
-                                    else:
-                                        self.log.warning(line)
-                                if return_code >= 2:
-                                    sys.exit(1)
-
-                            # Output sidecar subtitles before deleting track files
-                            if sidecar_subtitles and not no_mux:
-                                media_info = MediaInfo.parse(muxed_paths[0]) if muxed_paths else None
-                                if media_info:
-                                    base_filename = title.get_filename(media_info, show_service=not no_source)
-                                else:
-                                    base_filename = str(title)
+                            else:
+                                self.log.info(f"No Closed Captions were found in Video track {video_track_n + 1}")
+                    except EnvironmentError:
+                        self.log.error("Cannot extract Closed Captions as the ccextractor executable was not found...")
+                        break
 
-                                sidecar_dir = self.output_dir or config.directories.downloads
-                                if not no_folder and isinstance(title, (Episode, Song)) and media_info:
-                                    sidecar_dir /= title.get_filename(
-                                        media_info, show_service=not no_source, folder=True
-                                    )
-                                sidecar_dir.mkdir(parents=True, exist_ok=True)
-
-                                with console.status("Saving subtitle sidecar files..."):
-                                    created = self.output_subtitle_sidecars(
-                                        sidecar_subtitles,
-                                        base_filename,
-                                        sidecar_dir,
-                                        sidecar_format,
-                                        original_paths=sidecar_original_paths or None,
-                                    )
-                                    if created:
-                                        self.log.info(f"Saved {len(created)} sidecar subtitle files")
+        # Now repack the decrypted tracks
+        with status("Repackaging tracks with FFMPEG..."):
+            has_repacked = False
+            for track in title.tracks:
+                if track.needs_repack:
+                    track.repackage()
+                    has_repacked = True
+                    events.emit(events.Types.TRACK_REPACKED, track=track)
+            if has_repacked:
+                # we don't want to fill up the log with "Repacked x track"
+                self.log.info("Repacked one or more tracks with FFMPEG")
+
+        muxed_paths = []
+        muxed_audio_codecs: dict[Path, Optional[Audio.Codec]] = {}
+        append_audio_codec_suffix = True
+
+        if no_mux:
+            # Skip muxing, handle individual track files
+            for track in title.tracks:
+                if track.path and track.path.exists():
+                    muxed_paths.append(track.path)
+        elif isinstance(title, (Movie, Episode)):
+            progress = Progress(
+                TextColumn("[progress.description]{task.description}"),
+                SpinnerColumn(finished_text=""),
+                BarColumn(),
+                "•",
+                TimeRemainingColumn(compact=True, elapsed_when_finished=True),
+                console=console,
+            )
 
-                            for track in title.tracks:
-                                track.delete()
+            merge_audio = (not split_audio) if split_audio is not None else config.muxing.get("merge_audio", True)
+            # When we split audio (merge_audio=False), multiple outputs may exist per title, so suffix codec.
+            append_audio_codec_suffix = not merge_audio
+
+            multiplex_tasks: list[tuple[TaskID, Tracks, Optional[Audio.Codec]]] = []
+            # Track hybrid-processing outputs explicitly so we can always clean them up,
+            # even if muxing fails early (e.g. SystemExit) before the normal delete loop.
+            hybrid_temp_paths: list[Path] = []
+
+            def clone_tracks_for_audio(base_tracks: Tracks, audio_tracks: list[Audio]) -> Tracks:
+                task_tracks = Tracks()
+                task_tracks.videos = list(base_tracks.videos)
+                task_tracks.audio = audio_tracks
+                task_tracks.subtitles = list(base_tracks.subtitles)
+                task_tracks.chapters = base_tracks.chapters
+                task_tracks.attachments = list(base_tracks.attachments)
+                return task_tracks
+
+            def enqueue_mux_tasks(task_description: str, base_tracks: Tracks) -> None:
+                if merge_audio or not base_tracks.audio:
+                    task_id = progress.add_task(f"{task_description}...", total=None, start=False)
+                    multiplex_tasks.append((task_id, base_tracks, None))
+                    return
+
+                audio_by_codec: dict[Optional[Audio.Codec], list[Audio]] = {}
+                for audio_track in base_tracks.audio:
+                    audio_by_codec.setdefault(audio_track.codec, []).append(audio_track)
+
+                for audio_codec, codec_audio_tracks in audio_by_codec.items():
+                    description = task_description
+                    if audio_codec:
+                        description = f"{task_description} {audio_codec.name}"
+
+                    task_id = progress.add_task(f"{description}...", total=None, start=False)
+                    task_tracks = clone_tracks_for_audio(base_tracks, codec_audio_tracks)
+                    multiplex_tasks.append((task_id, task_tracks, audio_codec))
+
+            # Check if we're in hybrid mode
+            if any(r == Video.Range.HYBRID for r in range_) and title.tracks.videos:
+                # Hybrid mode: process DV and HDR10 tracks separately for each resolution
+                self.log.info("Processing Hybrid HDR10+DV tracks...")
+
+                # Group video tracks by resolution (prefer HDR10+ over HDR10 as base)
+                resolutions_processed = set()
+                base_tracks_list = [
+                    v for v in title.tracks.videos if v.range in (Video.Range.HDR10P, Video.Range.HDR10)
+                ]
+                dv_tracks = [v for v in title.tracks.videos if v.range == Video.Range.DV]
 
-                            # Clear temp font attachment paths and delete other attachments
-                            for attachment in title.tracks.attachments:
-                                if attachment.path and attachment.path in temp_font_files:
-                                    attachment.path = None
-                                else:
-                                    attachment.delete()
-
-                            # Clean up temp fonts
-                            for temp_path in temp_font_files:
-                                temp_path.unlink(missing_ok=True)
-                            for temp_path in sidecar_original_paths.values():
-                                temp_path.unlink(missing_ok=True)
-                    finally:
-                        # Hybrid() produces a temp HEVC output we rename; make sure it's never left behind.
-                        # Also attempt to remove the default hybrid output name if it still exists.
-                        for temp_path in hybrid_temp_paths:
-                            try:
-                                temp_path.unlink(missing_ok=True)
-                            except PermissionError:
-                                self.log.warning(f"Failed to delete temp file (in use?): {temp_path}")
-                        try:
-                            (config.directories.temp / "HDR10-DV.hevc").unlink(missing_ok=True)
-                        except PermissionError:
-                            self.log.warning(
-                                f"Failed to delete temp file (in use?): {config.directories.temp / 'HDR10-DV.hevc'}"
-                            )
+                for hdr10_track in base_tracks_list:
+                    resolution = hdr10_track.height
+                    if resolution in resolutions_processed:
+                        continue
+                    resolutions_processed.add(resolution)
 
-                else:
-                    # dont mux
-                    muxed_paths.append(title.tracks.audio[0].path)
-
-                if no_mux:
-                    # Handle individual track files without muxing
-                    final_dir = self.output_dir or config.directories.downloads
-                    if not no_folder and isinstance(title, (Episode, Song)):
-                        # Create folder based on title
-                        # Use first available track for filename generation
-                        sample_track = (
-                            title.tracks.videos[0]
-                            if title.tracks.videos
-                            else (
-                                title.tracks.audio[0]
-                                if title.tracks.audio
-                                else (title.tracks.subtitles[0] if title.tracks.subtitles else None)
-                            )
-                        )
-                        if sample_track and sample_track.path:
-                            media_info = MediaInfo.parse(sample_track.path)
-                            final_dir /= title.get_filename(media_info, show_service=not no_source, folder=True)
-
-                    final_dir.mkdir(parents=True, exist_ok=True)
-
-                    for track_path in muxed_paths:
-                        # Generate appropriate filename for each track
-                        media_info = MediaInfo.parse(track_path)
-                        base_filename = title.get_filename(media_info, show_service=not no_source)
-
-                        # Add track type suffix to filename
-                        track = next((t for t in title.tracks if t.path == track_path), None)
-                        if track:
-                            if isinstance(track, Video):
-                                track_suffix = f".{track.codec.name if hasattr(track.codec, 'name') else 'video'}"
-                            elif isinstance(track, Audio):
-                                lang_suffix = f".{track.language}" if track.language else ""
-                                track_suffix = (
-                                    f"{lang_suffix}.{track.codec.name if hasattr(track.codec, 'name') else 'audio'}"
-                                )
-                            elif isinstance(track, Subtitle):
-                                lang_suffix = f".{track.language}" if track.language else ""
-                                forced_suffix = ".forced" if track.forced else ""
-                                sdh_suffix = ".sdh" if track.sdh else ""
-                                track_suffix = f"{lang_suffix}{forced_suffix}{sdh_suffix}"
+                    # Find matching DV track for this resolution (use the lowest DV resolution)
+                    matching_dv = min(dv_tracks, key=lambda v: v.height) if dv_tracks else None
+
+                    if matching_dv:
+                        # Create track pair for this resolution
+                        resolution_tracks = [hdr10_track, matching_dv]
+
+                        for track in resolution_tracks:
+                            track.needs_duration_fix = True
+
+                        # Run the hybrid processing for this resolution
+                        Hybrid(resolution_tracks, self.service)
+
+                        # Create unique output filename for this resolution
+                        hybrid_filename = f"HDR10-DV-{resolution}p.hevc"
+                        hybrid_output_path = config.directories.temp / hybrid_filename
+                        hybrid_temp_paths.append(hybrid_output_path)
+
+                        # The Hybrid class creates HDR10-DV.hevc, rename it for this resolution
+                        default_output = config.directories.temp / "HDR10-DV.hevc"
+                        if default_output.exists():
+                            # If a previous run left this behind, replace it to avoid move() failures.
+                            hybrid_output_path.unlink(missing_ok=True)
+                            shutil.move(str(default_output), str(hybrid_output_path))
+
+                        # Create tracks with the hybrid video output for this resolution
+                        task_description = f"Multiplexing Hybrid HDR10+DV {resolution}p"
+                        task_tracks = Tracks(title.tracks) + title.tracks.chapters + title.tracks.attachments
+
+                        # Create a new video track for the hybrid output
+                        hybrid_track = deepcopy(hdr10_track)
+                        hybrid_track.id = f"hybrid_{hdr10_track.id}_{resolution}"
+                        hybrid_track.path = hybrid_output_path
+                        hybrid_track.range = Video.Range.DV  # It's now a DV track
+                        hybrid_track.needs_duration_fix = True
+                        title.tracks.add(hybrid_track)
+                        task_tracks.videos = [hybrid_track]
+
+                        enqueue_mux_tasks(task_description, task_tracks)
+
+                console.print()
+            else:
+                # Normal mode: process each video track separately
+                for video_track in title.tracks.videos or [None]:
+                    task_description = "Multiplexing"
+                    if video_track:
+                        if len(quality) > 1:
+                            task_description += f" {video_track.height}p"
+                        if len(range_) > 1:
+                            task_description += f" {video_track.range.name}"
+                        if len(vcodec) > 1:
+                            task_description += f" {video_track.codec.name}"
+
+                    task_tracks = Tracks(title.tracks) + title.tracks.chapters + title.tracks.attachments
+                    if video_track:
+                        task_tracks.videos = [video_track]
+
+                    enqueue_mux_tasks(task_description, task_tracks)
+
+            def mux_task(
+                task_id: TaskID, task_tracks: Tracks, output_path: Optional[Path]
+            ) -> tuple[Path, int, list[str]]:
+                progress.start_task(task_id)  # TODO: Needed?
+                audio_expected = not video_only and not no_audio
+                return task_tracks.mux(
+                    str(title),
+                    progress=partial(progress.update, task_id=task_id),
+                    delete=False,
+                    audio_expected=audio_expected,
+                    title_language=title.language,
+                    skip_subtitles=skip_subtitle_mux,
+                    output_path=output_path,
+                )
+
+            # mkvmerge is single-threaded and mostly waits on the disk, but every mux reads and writes
+            # the same temp directory, so more than a few at once would only contend for it
+            mux_workers = max(1, min(len(multiplex_tasks), int(config.muxing.get("max_workers", 2))))
+            mux_pool = ThreadPoolExecutor(mux_workers, thread_name_prefix="mux-task")
+
+            try:
+                with Live(Padding(progress, (0, 5, 1, 5)), console=console) if live else nullcontext():
+                    mux_jobs: list[tuple[Future, Optional[Audio.Codec]]] = []
+                    for mux_index, (task_id, task_tracks, audio_codec) in enumerate(multiplex_tasks, start=1):
+                        # number the outputs by task, so their names don't depend on which finishes first
+                        mux_path = task_tracks.get_mux_path()
+                        if mux_path:
+                            mux_path = mux_path.with_name(f"{mux_path.stem}.{mux_index}{mux_path.suffix}")
+                        mux_jobs.append((mux_pool.submit(mux_task, task_id, task_tracks, mux_path), audio_codec))
+
+                    for mux_job, audio_codec in mux_jobs:
+                        muxed_path, return_code, errors = mux_job.result()
+                        muxed_paths.append(muxed_path)
+                        muxed_audio_codecs[muxed_path] = audio_codec
+                        if return_code >= 2:
+                            self.log.error(f"Failed to Mux video to Matroska file ({return_code}):")
+                        elif return_code == 1 or errors:
+                            self.log.warning("mkvmerge had at least one warning or error, continuing anyway...")
+                        for line in errors:
+                            if line.startswith("#GUI#error"):
+                                self.log.error(line)
                             else:
-                                track_suffix = ""
+                                self.log.warning(line)
+                        if return_code >= 2:
+                            sys.exit(1)
 
-                            final_path = final_dir / f"{base_filename}{track_suffix}{track_path.suffix}"
+                    # Output sidecar subtitles before deleting track files
+                    if sidecar_subtitles and not no_mux:
+                        media_info = MediaInfo.parse(muxed_paths[0]) if muxed_paths else None
+                        if media_info:
+                            base_filename = title.get_filename(media_info, show_service=not no_source)
                         else:
-                            final_path = final_dir / f"{base_filename}{track_path.suffix}"
+                            base_filename = str(title)
+
+                        sidecar_dir = self.output_dir or config.directories.downloads
+                        if not no_folder and isinstance(title, (Episode, Song)) and media_info:
+                            sidecar_dir /= title.get_filename(media_info, show_service=not no_source, folder=True)
+                        sidecar_dir.mkdir(parents=True, exist_ok=True)
+
+                        with status("Saving subtitle sidecar files..."):
+                            created = self.output_subtitle_sidecars(
+                                sidecar_subtitles,
+                                base_filename,
+                                sidecar_dir,
+                                sidecar_format,
+                                original_paths=sidecar_original_paths or None,
+                            )
+                            if created:
+                                self.log.info(f"Saved {len(created)} sidecar subtitle files")
 
-                        shutil.move(track_path, final_path)
-                        self.log.debug(f"Saved: {final_path.name}")
-                else:
-                    # Handle muxed files
-                    used_final_paths: set[Path] = set()
-                    for muxed_path in muxed_paths:
-                        media_info = MediaInfo.parse(muxed_path)
-                        final_dir = self.output_dir or config.directories.downloads
-                        final_filename = title.get_filename(media_info, show_service=not no_source)
-                        audio_codec_suffix = muxed_audio_codecs.get(muxed_path)
-
-                        if not no_folder and isinstance(title, (Episode, Song)):
-                            final_dir /= title.get_filename(media_info, show_service=not no_source, folder=True)
-
-                        final_dir.mkdir(parents=True, exist_ok=True)
-                        final_path = final_dir / f"{final_filename}{muxed_path.suffix}"
-                        template_type = (
-                            "series" if isinstance(title, Episode) else "songs" if isinstance(title, Song) else "movies"
-                        )
-                        sep = config.get_template_separator(template_type)
+                    for track in title.tracks:
+                        track.delete()
 
-                        if final_path.exists() and audio_codec_suffix and append_audio_codec_suffix:
-                            final_filename = f"{final_filename.rstrip()}{sep}{audio_codec_suffix.name}"
-                            final_path = final_dir / f"{final_filename}{muxed_path.suffix}"
+                    # Clear temp font attachment paths and delete other attachments
+                    for attachment in title.tracks.attachments:
+                        if attachment.path and attachment.path in temp_font_files:
+                            attachment.path = None
+                        else:
+                            attachment.delete()
+
+                    # Clean up temp fonts
+                    for temp_path in temp_font_files:
+                        temp_path.unlink(missing_ok=True)
+                    for temp_path in sidecar_original_paths.values():
+                        temp_path.unlink(missing_ok=True)
+            finally:
+                mux_pool.shutdown(cancel_futures=True)
+                # Hybrid() produces a temp HEVC output we rename; make sure it's never left behind.
+                # Also attempt to remove the default hybrid output name if it still exists.
+                for temp_path in hybrid_temp_paths:
+                    try:
+                        temp_path.unlink(missing_ok=True)
+                    except PermissionError:
+                        self.log.warning(f"Failed to delete temp file (in use?): {temp_path}")
+                try:
+                    (config.directories.temp / "HDR10-DV.hevc").unlink(missing_ok=True)
+                except PermissionError:
+                    self.log.warning(
+                        f"Failed to delete temp file (in use?): {config.directories.temp / 'HDR10-DV.hevc'}"
+                    )
 
-                        if final_path in used_final_paths:
-                            i = 2
-                            while final_path in used_final_paths:
-                                final_path = final_dir / f"{final_filename.rstrip()}{sep}{i}{muxed_path.suffix}"
-                                i += 1
+        else:
+            # dont mux
+            muxed_paths.append(title.tracks.audio[0].path)
+
+        if no_mux:
+            # Handle individual track files without muxing
+            final_dir = self.output_dir or config.directories.downloads
+            if not no_folder and isinstance(title, (Episode, Song)):
+                # Create folder based on title
+                # Use first available track for filename generation
+                sample_track = (
+                    title.tracks.videos[0]
+                    if title.tracks.videos
+                    else (
+                        title.tracks.audio[0]
+                        if title.tracks.audio
+                        else (title.tracks.subtitles[0] if title.tracks.subtitles else None)
+                    )
+                )
+                if sample_track and sample_track.path:
+                    media_info = MediaInfo.parse(sample_track.path)
+                    final_dir /= title.get_filename(media_info, show_service=not no_source, folder=True)
+
+            final_dir.mkdir(parents=True, exist_ok=True)
+
+            for track_path in muxed_paths:
+                # Generate appropriate filename for each track
+                media_info = MediaInfo.parse(track_path)
+                base_filename = title.get_filename(media_info, show_service=not no_source)
+
+                # Add track type suffix to filename
+                track = next((t for t in title.tracks if t.path == track_path), None)
+                if track:
+                    if isinstance(track, Video):
+                        track_suffix = f".{track.codec.name if hasattr(track.codec, 'name') else 'video'}"
+                    elif isinstance(track, Audio):
+                        lang_suffix = f".{track.language}" if track.language else ""
+                        track_suffix = f"{lang_suffix}.{track.codec.name if hasattr(track.codec, 'name') else 'audio'}"
+                    elif isinstance(track, Subtitle):
+                        lang_suffix = f".{track.language}" if track.language else ""
+                        forced_suffix = ".forced" if track.forced else ""
+                        sdh_suffix = ".sdh" if track.sdh else ""
+                        track_suffix = f"{lang_suffix}{forced_suffix}{sdh_suffix}"
+                    else:
+                        track_suffix = ""
 
-                        try:
-                            os.replace(muxed_path, final_path)
-                        except OSError:
-                            if final_path.exists():
-                                final_path.unlink()
-                            shutil.move(muxed_path, final_path)
-                        used_final_paths.add(final_path)
-                        tags.tag_file(final_path, title, self.tmdb_id, self.imdb_id)
-
-                title_dl_time = time_elapsed_since(dl_start_time)
-                console.print(
-                    Padding(f":tada: Title downloaded in [progress.elapsed]{title_dl_time}[/]!", (0, 5, 1, 5))
+                    final_path = final_dir / f"{base_filename}{track_suffix}{track_path.suffix}"
+                else:
+                    final_path = final_dir / f"{base_filename}{track_path.suffix}"
+
+                shutil.move(track_path, final_path)
+                self.log.debug(f"Saved: {final_path.name}")
+        else:
+            # Handle muxed files
+            used_final_paths: set[Path] = set()
+            for muxed_path in muxed_paths:
+                media_info = MediaInfo.parse(muxed_path)
+                final_dir = self.output_dir or config.directories.downloads
+                final_filename = title.get_filename(media_info, show_service=not no_source)
+                audio_codec_suffix = muxed_audio_codecs.get(muxed_path)
+
+                if not no_folder and isinstance(title, (Episode, Song)):
+                    final_dir /= title.get_filename(media_info, show_service=not no_source, folder=True)
+
+                final_dir.mkdir(parents=True, exist_ok=True)
+                final_path = final_dir / f"{final_filename}{muxed_path.suffix}"
+                template_type = (
+                    "series" if isinstance(title, Episode) else "songs" if isinstance(title, Song) else "movies"
                 )
+                sep = config.get_template_separator(template_type)
 
-            # update cookies
-            cookie_file = self.get_cookie_path(self.service, self.profile)
-            if cookie_file:
-                self.save_cookies(cookie_file, service.session.cookies)
+                if final_path.exists() and audio_codec_suffix and append_audio_codec_suffix:
+                    final_filename = f"{final_filename.rstrip()}{sep}{audio_codec_suffix.name}"
+                    final_path = final_dir / f"{final_filename}{muxed_path.suffix}"
 
-        dl_time = time_elapsed_since(start_time)
+                if final_path in used_final_paths:
+                    i = 2
+                    while final_path in used_final_paths:
+                        final_path = final_dir / f"{final_filename.rstrip()}{sep}{i}{muxed_path.suffix}"
+                        i += 1
 
-        console.print(Padding(f"Processed all titles in [progress.elapsed]{dl_time}", (0, 5, 1, 5)))
+                try:
+                    os.replace(muxed_path, final_path)
+                except OSError:
+                    if final_path.exists():
+                        final_path.unlink()
+                    shutil.move(muxed_path, final_path)
+                used_final_paths.add(final_path)
+                tags.tag_file(final_path, title, tmdb_id, imdb_id)
+
+        title_dl_time = time_elapsed_since(dl_start_time)
+        console.print(Padding(f":tada: Title downloaded in [progress.elapsed]{title_dl_time}[/]!", (0, 5, 1, 5)))
+
+    def log_mux_error(self, mux: Future, title: Title_T) -> None:
+        """Log the error of a title muxed in the background, as it may not be waited on if a later title fails."""
+        error = mux.exception()
+        if error and not isinstance(error, SystemExit):
+            self.log.error(f"Failed to mux {title}: {error!r}")
 
     def prepare_drm(
         self,
@@ -2583,6 +2705,11 @@ class dl:
                 if track_kid and track_kid not in all_kids:
                     all_kids.append(track_kid)
 
+                # every KID without a key is looked up in the vaults at once
+                vault_keys = {}
+                if not cdm_only:
+                    vault_keys = self.vaults.get_keys([kid for kid in all_kids if kid not in drm.content_keys])
+
                 for kid in all_kids:
                     if kid in drm.content_keys:
                         continue
@@ -2590,7 +2717,7 @@ class dl:
                     is_track_kid = ["", "*"][kid == track_kid]
 
                     if not cdm_only:
-                        content_key, vault_used = self.vaults.get_key(kid)
+                        content_key, vault_used = vault_keys.get(kid, (None, None))
                         if content_key:
                             drm.content_keys[kid] = content_key
                             label = f"[text2]{kid.hex}:{content_key}{is_track_kid} from {vault_used}"
@@ -2767,6 +2894,11 @@ class dl:
                 if track_kid and track_kid not in all_kids:
                     all_kids.append(track_kid)
 
+                # every KID without a key is looked up in the vaults at once
+                vault_keys = {}
+                if not cdm_only:
+                    vault_keys = self.vaults.get_keys([kid for kid in all_kids if kid not in drm.content_keys])
+
                 for kid in all_kids:
                     if kid in drm.content_keys:
                         continue
@@ -2774,7 +2906,7 @@ class dl:
                     is_track_kid = ["", "*"][kid == track_kid]
 
                     if not cdm_only:
-                        content_key, vault_used = self.vaults.get_key(kid)
+                        content_key, vault_used = vault_keys.get(kid, (None, None))
                         if content_key:
                             drm.content_keys[kid] = content_key
                             label = f"[text2]{kid.hex}:{content_key}{is_track_kid} from {vault_used}"
@@ -6,11 +6,13 @@ from pathlib import Path
 from typing import Optional
 
 import click
+from rich import filesize
 from rich.padding import Padding
 from rich.table import Table
 from rich.tree import Tree
 
 from unshackle.core import binaries
+from unshackle.core.cacher import SQLiteBackend, get_cache_backend
 from unshackle.core.config import POSSIBLE_CONFIG_PATHS, config, config_path
 from unshackle.core.console import console
 from unshackle.core.constants import context_settings
@@ -208,6 +210,45 @@ def info() -> None:
     console.print(Padding(table, (1, 5)))
 
 
+@env.command(name="cache")
+def cache_info() -> None:
+    """Displays the entries and size of the cache of each Service."""
+    backend = get_cache_backend()
+    stats = backend.stats()
+    is_sqlite = isinstance(backend, SQLiteBackend)
+
+    table = Table(title=f"Cache ({type(backend).__name__})", title_style="bold", expand=True)
+    table.add_column("Service", no_wrap=True)
+    table.add_column("Entries", justify="right")
+    table.add_column("Size", justify="right")
+    if is_sqlite:
+        table.add_column("Hits", justify="right")
+
+    for service, service_stats in sorted(stats.items()):
+        row = [service, str(service_stats["entries"]), filesize.decimal(service_stats["bytes"])]
+        if is_sqlite:
+            row.append(str(service_stats["hits"]))
+        table.add_row(*row)
+
+    total_entries = sum(x["entries"] for x in stats.values())
+    total_size = sum(x["bytes"] for x in stats.values())
+    total = ["Total", str(total_entries), filesize.decimal(total_size)]
+    if is_sqlite:
+        total.append(str(sum(x["hits"] for x in stats.values())))
+    table.add_section()
+    table.add_row(*total, style="bold")
+
+    console.print(Padding(table, (1, 5)))
+    if is_sqlite:
+        console.print(
+            Padding(
+                f"[bright_black]{backend.path}, least recently used entries are evicted "
+                f"over {filesize.decimal(backend.max_size)}",
+                (0, 5),
+            )
+        )
+
+
 @env.group(name="clear", short_help="Clear an environment directory.", context_settings=context_settings)
 def clear() -> None:
     """Clear an environment directory."""
@@ -229,6 +270,11 @@ def cache(service: Optional[str]) -> None:
         log.info(f"Deleting {files_count} files...")
         shutil.rmtree(cache_dir)
         log.info("Cleared")
+    if service:
+        # the entries of the service in the sqlite backend, which isn't in its directory
+        entries_count = get_cache_backend().clear(Services.get_tag(service))
+        if entries_count:
+            log.info(f"Deleted {entries_count} cache entries")
 
 
 @clear.command()
@@ -1,7 +1,13 @@
+import hashlib
+import json
 import logging
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
-from typing import Optional
+from typing import Any, Iterator, Optional
 
 import click
 
@@ -11,6 +17,9 @@ from unshackle.core.services import Services
 from unshackle.core.vault import Vault
 from unshackle.core.vaults import Vaults
 
+BATCH_SIZE = 1000  # keys sent to the vault at once
+WORKERS = 4  # services copied at once
+
 
 def load_vaults(vault_names: list[str]) -> Vaults:
     """Load and validate vaults by name."""
@@ -30,40 +39,137 @@ def load_vaults(vault_names: list[str]) -> Vaults:
     return vaults
 
 
-def process_service_keys(from_vault: Vault, service: str, log: logging.Logger) -> dict[str, str]:
-    """Get and validate keys from a vault for a specific service."""
-    content_keys = list(from_vault.get_keys(service))
+class CopyProgress:
+    """
+    Progress of a copy from one vault to another, saved after every batch so an interrupted
+    copy resumes where it stopped instead of from the first key of each service.
 
-    bad_keys = {kid: key for kid, key in content_keys if not key or key.count("0") == len(key)}
-    for kid, key in bad_keys.items():
-        log.warning(f"Skipping NULL key: {kid}:{key}")
+    The progress of a service is the position, from Vault.get_keys_after(), of the last key that
+    was copied, so the vault continues after it without getting the keys before it again where
+    it can. It is forgotten once the service has been fully copied.
+    """
 
-    return {kid: key for kid, key in content_keys if kid not in bad_keys}
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._services: dict[str, dict] = json.loads(path.read_text(encoding="utf8"))
+        except (OSError, ValueError):
+            self._services = {}
+
+    @classmethod
+    def of(cls, to_vault: Vault, from_vault: Vault) -> "CopyProgress":
+        """Get the saved progress of copying from one vault to another."""
+        name = hashlib.sha256(f"{from_vault.name}\n{to_vault.name}".encode("utf8")).hexdigest()
+        return cls(config.directories.cache / "kv" / f"{name}.json")
+
+    def get(self, service: str) -> tuple[int, Optional[Any], bool]:
+        """
+        Get the amount of keys of a service that were copied, the position of the last key that
+        was copied, and if all of them were.
+        """
+        with self._lock:
+            progress = self._services.get(service) or {}
+        after = progress.get("after")
+        if after is None:
+            # progress saved without a position can't be resumed from, copy the service from the start
+            return 0, None, bool(progress.get("done", False))
+        return int(progress.get("copied", 0)), after, bool(progress.get("done", False))
+
+    def set(self, service: str, copied: int, after: Optional[Any], done: bool = False) -> None:
+        with self._lock:
+            self._services[service] = {"copied": copied, "after": after, "done": done}
+            self._save()
+
+    def forget(self, services: list[str]) -> None:
+        """Forget the progress of services, e.g., once a copy of them is complete."""
+        with self._lock:
+            for service in services:
+                self._services.pop(service, None)
+            self._save()
+
+    def _save(self) -> None:
+        if not self._services:
+            self.path.unlink(missing_ok=True)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self._services), encoding="utf8")
+        temp_path.replace(self.path)
+
+
+def iter_service_keys(
+    from_vault: Vault, service: str, log: logging.Logger, after: Optional[Any] = None
+) -> Iterator[tuple[str, str, Any]]:
+    """
+    Get and validate keys from a vault for a specific service, as they're read from the vault.
+    Only the keys after the `after` position are got, with the position of each key.
+    """
+    for kid, key, position in from_vault.get_keys_after(service, after):
+        if not key or key.count("0") == len(key):
+            log.warning(f"Skipping NULL key: {kid}:{key}")
+            continue
+        yield kid, key, position
 
 
-def copy_service_data(to_vault: Vault, from_vault: Vault, service: str, log: logging.Logger) -> int:
-    """Copy data for a single service between vaults."""
-    content_keys = process_service_keys(from_vault, service, log)
-    total_count = len(content_keys)
+def copy_service_data(
+    to_vault: Vault,
+    from_vault: Vault,
+    service: str,
+    log: logging.Logger,
+    progress: Optional[CopyProgress] = None,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """
+    Copy data for a single service between vaults.
 
-    if total_count == 0:
-        log.info(f"{service}: No keys found in {from_vault}")
+    The keys are streamed from one vault to the other in batches of batch_size, and if
+    progress is given, copying starts after the last position it has and saves it after every batch.
+    """
+    copied, after, done = progress.get(service) if progress else (0, None, False)
+    if done:
+        log.info(f"{service}: Already copied, skipped")
         return 0
 
+    if after is not None:
+        log.info(f"{service}: Resuming after {copied} keys")
+    content_keys = iter_service_keys(from_vault, service, log, after)
+
+    start = time.monotonic()
+    total_count = copied
+    added = 0
     try:
-        added = to_vault.add_keys(service, content_keys)
-    except PermissionError:
-        log.warning(f"{service}: No permission to create table in {to_vault}, skipped")
+        while rows := list(islice(content_keys, batch_size)):
+            try:
+                added += to_vault.add_keys(service, {kid: key for kid, key, _ in rows})
+            except PermissionError:
+                log.warning(f"{service}: No permission to create table in {to_vault}, skipped")
+                return added
+            total_count += len(rows)
+            after = rows[-1][2]
+            if progress:
+                progress.set(service, total_count, after)
+    finally:
+        # close it in this thread, vaults like SQLite can only use their connection in the thread that made it
+        content_keys.close()
+
+    if progress:
+        progress.set(service, total_count, after, done=True)
+
+    if total_count == 0:
+        log.info(f"{service}: No keys found in {from_vault}")
         return 0
 
-    existed = total_count - added
+    # keys copied before resuming were neither added nor skipped by this copy
+    existed = total_count - copied - added
+    rate = (total_count - copied) / max(time.monotonic() - start, 1e-6)
 
     if added > 0 and existed > 0:
-        log.info(f"{service}: {added} added, {existed} skipped ({total_count} total)")
+        log.info(f"{service}: {added} added, {existed} skipped ({total_count} total, {rate:.0f} keys/s)")
     elif added > 0:
-        log.info(f"{service}: {added} added ({total_count} total)")
+        log.info(f"{service}: {added} added ({total_count} total, {rate:.0f} keys/s)")
     else:
-        log.info(f"{service}: {existed} skipped (all existed)")
+        log.info(f"{service}: {existed} skipped (all existed, {rate:.0f} keys/s)")
 
     return added
 
@@ -77,7 +183,17 @@ def kv() -> None:
 @click.argument("to_vault_name", type=str)
 @click.argument("from_vault_names", nargs=-1, type=click.UNPROCESSED)
 @click.option("-s", "--service", type=str, default=None, help="Only copy data to and from a specific service.")
-def copy(to_vault_name: str, from_vault_names: list[str], service: Optional[str] = None) -> None:
+@click.option("-b", "--batch-size", type=click.IntRange(1), default=BATCH_SIZE, help="Amount of keys to add at once.")
+@click.option("-w", "--workers", type=click.IntRange(1), default=WORKERS, help="Amount of services to copy at once.")
+@click.option("--restart", is_flag=True, default=False, help="Copy every key again, not resuming a previous copy.")
+def copy(
+    to_vault_name: str,
+    from_vault_names: list[str],
+    service: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+    workers: int = WORKERS,
+    restart: bool = False,
+) -> None:
     """
     Copy data from multiple Key Vaults into a single Key Vault.
     Rows with matching KIDs are skipped unless there's no KEY set.
@@ -88,6 +204,9 @@ def copy(to_vault_name: str, from_vault_names: list[str], service: Optional[str]
 
     The `from_vault_names` argument is the key vault(s) you wish to take
     data from. You may supply multiple key vaults.
+
+    Keys are copied in batches, multiple services at once. If a copy is
+    interrupted, running it again resumes each service where it stopped.
     """
     if not from_vault_names:
         raise click.ClickException("No Vaults were specified to copy data from.")
@@ -107,16 +226,29 @@ def copy(to_vault_name: str, from_vault_names: list[str], service: Optional[str]
         service = Services.get_tag(service)
         log.info(f"Filtering by service: {service}")
 
+    start = time.monotonic()
     total_added = 0
+    # vaults are copied one after the other, so keys of earlier vaults take precedence
     for from_vault in from_vaults:
-        services_to_copy = [service] if service else from_vault.get_services()
+        services_to_copy = [service] if service else list(from_vault.get_services())
+
+        progress = CopyProgress.of(to_vault, from_vault)
+        if restart:
+            progress.forget(services_to_copy)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kv") as pool:
+            futures = [
+                pool.submit(copy_service_data, to_vault, from_vault, service_tag, log, progress, batch_size)
+                for service_tag in services_to_copy
+            ]
+            for future in as_completed(futures):
+                total_added += future.result()
 
-        for service_tag in services_to_copy:
-            added = copy_service_data(to_vault, from_vault, service_tag, log)
-            total_added += added
+        progress.forget(services_to_copy)
 
+    elapsed = time.monotonic() - start
     if total_added > 0:
-        log.info(f"Successfully added {total_added} new keys to {to_vault}")
+        log.info(f"Successfully added {total_added} new keys to {to_vault} in {elapsed:.1f}s")
     else:
         log.info("Copy completed - no new keys to add")
 
@@ -124,8 +256,18 @@ def copy(to_vault_name: str, from_vault_names: list[str], service: Optional[str]
 @kv.command()
 @click.argument("vaults", nargs=-1, type=click.UNPROCESSED)
 @click.option("-s", "--service", type=str, default=None, help="Only sync data to and from a specific service.")
+@click.option("-b", "--batch-size", type=click.IntRange(1), default=BATCH_SIZE, help="Amount of keys to add at once.")
+@click.option("-w", "--workers", type=click.IntRange(1), default=WORKERS, help="Amount of services to copy at once.")
+@click.option("--restart", is_flag=True, default=False, help="Copy every key again, not resuming a previous copy.")
 @click.pass_context
-def sync(ctx: click.Context, vaults: list[str], service: Optional[str] = None) -> None:
+def sync(
+    ctx: click.Context,
+    vaults: list[str],
+    service: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+    workers: int = WORKERS,
+    restart: bool = False,
+) -> None:
     """
     Ensure multiple Key Vaults copies of all keys as each other.
     It's essentially just a bi-way copy between each vault.
@@ -135,9 +277,10 @@ def sync(ctx: click.Context, vaults: list[str], service: Optional[str] = None) -
     if not len(vaults) > 1:
         raise click.ClickException("You must provide more than one Vault to sync.")
 
-    ctx.invoke(copy, to_vault_name=vaults[0], from_vault_names=vaults[1:], service=service)
+    options = dict(service=service, batch_size=batch_size, workers=workers, restart=restart)
+    ctx.invoke(copy, to_vault_name=vaults[0], from_vault_names=vaults[1:], **options)
     for i in range(1, len(vaults)):
-        ctx.invoke(copy, to_vault_name=vaults[i], from_vault_names=[vaults[i - 1]], service=service)
+        ctx.invoke(copy, to_vault_name=vaults[i], from_vault_names=[vaults[i - 1]], **options)
 
 
 @kv.command()
@@ -15,6 +15,8 @@ from typing import Any, Callable, Dict, List, Optional
 
 log = logging.getLogger("download_manager")
 
+PROGRESS_INTERVAL = 2  # seconds between progress reports of a job's downloads
+
 
 class JobStatus(Enum):
     QUEUED = "queued"
@@ -39,6 +41,7 @@ class DownloadJob:
     started_time: Optional[datetime] = None
     completed_time: Optional[datetime] = None
     progress: float = 0.0
+    telemetry: Optional[Dict[str, Any]] = None  # bytes, throughput and ETA of the downloads so far
 
     # Results and error info
     output_files: List[str] = field(default_factory=list)
@@ -62,6 +65,9 @@ class DownloadJob:
             "progress": self.progress,
         }
 
+        if self.telemetry:
+            result["telemetry"] = self.telemetry
+
         if include_full_details:
             result.update(
                 {
@@ -240,13 +246,35 @@ def _perform_download(
         # Simple approach: report progress at key points
         original_result = dl_instance.result
 
+        def report_progress(stop: threading.Event) -> None:
+            # the bytes of the tracks that have started so far, from 5% to 95%, never going back
+            from unshackle.core.downloaders import telemetry
+
+            progress = 5.0
+            while not stop.wait(PROGRESS_INTERVAL):
+                summary = telemetry.get_summary()
+                if not summary["downloads"]:
+                    continue
+                if summary["total"]:
+                    progress = max(progress, 5.0 + 90.0 * min(1.0, summary["completed"] / summary["total"]))
+                progress_callback({"progress": round(progress, 1), "status": "downloading", "telemetry": summary})
+
         def result_with_progress(*args, **kwargs):
             try:
                 # Report that download started
                 progress_callback({"progress": 5.0, "status": "downloading"})
 
-                # Call original method
-                result = original_result(*args, **kwargs)
+                # Report the progress of the downloads until the original method returns
+                stop_reporting = threading.Event()
+                reporter = threading.Thread(
+                    target=report_progress, args=(stop_reporting,), name="progress-reporter", daemon=True
+                )
+                reporter.start()
+                try:
+                    result = original_result(*args, **kwargs)
+                finally:
+                    stop_reporting.set()
+                    reporter.join()
 
                 # Report completion
                 progress_callback({"progress": 100.0, "status": "completed"})
@@ -572,6 +600,16 @@ class DownloadQueueManager:
         with open(payload_path, "w", encoding="utf-8") as handle:
             json.dump(payload, handle)
 
+        from unshackle.core.downloaders import bandwidth
+
+        # the worker's downloads share this process's bandwidth scheduler, as a job of their own
+        bandwidth_server = None
+        bandwidth_limit = bandwidth.parse_rate(job.parameters.get("bandwidth_limit"))
+        if bandwidth_limit or bandwidth.get_scheduler():
+            bandwidth_server = bandwidth.get_server()
+            if bandwidth_limit:
+                bandwidth_server.scheduler.set_job_limit(job.job_id, bandwidth_limit)
+
         process = await asyncio.create_subprocess_exec(
             sys.executable,
             "-m",
@@ -581,6 +619,7 @@ class DownloadQueueManager:
             progress_path,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, **bandwidth_server.env(job.job_id)} if bandwidth_server else None,
         )
 
         self._download_processes[job.job_id] = process
@@ -608,6 +647,8 @@ class DownloadQueueManager:
                                 if new_progress != job.progress:
                                     job.progress = new_progress
                                     log.info(f"Job {job.job_id} progress updated: {job.progress}%")
+                            if progress_data.get("telemetry"):
+                                job.telemetry = progress_data["telemetry"]
                 except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
                     log.debug(f"Could not read progress for job {job.job_id}: {e}")
 
@@ -665,6 +706,9 @@ class DownloadQueueManager:
 
             self._download_processes.pop(job.job_id, None)
 
+            if bandwidth_server:
+                bandwidth_server.scheduler.remove_job(job.job_id)
+
             temp_paths = self._job_temp_files.pop(job.job_id, {})
             for path in temp_paths.values():
                 try:
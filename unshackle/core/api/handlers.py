@@ -1,15 +1,16 @@
+import asyncio
 import enum
+import json
 import logging
 from typing import Any, Dict, List, Optional
 
 from aiohttp import web
 
 from unshackle.core.api.errors import APIError, APIErrorCode, handle_api_exception
+from unshackle.core.api.service_pool import ServicePool, get_service_pool
 from unshackle.core.constants import AUDIO_CODEC_MAP, DYNAMIC_RANGE_MAP, VIDEO_CODEC_MAP
-from unshackle.core.proxies.basic import Basic
-from unshackle.core.proxies.hola import Hola
-from unshackle.core.proxies.nordvpn import NordVPN
-from unshackle.core.proxies.surfsharkvpn import SurfsharkVPN
+from unshackle.core.downloaders.bandwidth import parse_rate
+from unshackle.core.proxies.registry import get_proxy_registry
 from unshackle.core.services import Services
 from unshackle.core.titles import Episode, Movie, Title_T
 from unshackle.core.tracks import Audio, Subtitle, Video
@@ -56,6 +57,7 @@ DEFAULT_DOWNLOAD_PARAMS = {
     "no_mux": False,
     "workers": None,
     "downloads": 1,
+    "bandwidth_limit": None,
     "best_available": False,
     "repack": False,
     "imdb_id": None,
@@ -65,43 +67,28 @@ DEFAULT_DOWNLOAD_PARAMS = {
 }
 
 
-def initialize_proxy_providers() -> List[Any]:
-    """Initialize and return available proxy providers."""
-    proxy_providers = []
-    try:
-        from unshackle.core import binaries
-        # Load the main unshackle config to get proxy provider settings
-        from unshackle.core.config import config as main_config
-
-        log.debug(f"Main config proxy providers: {getattr(main_config, 'proxy_providers', {})}")
-        log.debug(f"Available proxy provider configs: {list(getattr(main_config, 'proxy_providers', {}).keys())}")
-
-        # Use main_config instead of the service-specific config for proxy providers
-        proxy_config = getattr(main_config, "proxy_providers", {})
-
-        if proxy_config.get("basic"):
-            log.debug("Loading Basic proxy provider")
-            proxy_providers.append(Basic(**proxy_config["basic"]))
-        if proxy_config.get("nordvpn"):
-            log.debug("Loading NordVPN proxy provider")
-            proxy_providers.append(NordVPN(**proxy_config["nordvpn"]))
-        if proxy_config.get("surfsharkvpn"):
-            log.debug("Loading SurfsharkVPN proxy provider")
-            proxy_providers.append(SurfsharkVPN(**proxy_config["surfsharkvpn"]))
-        if hasattr(binaries, "HolaProxy") and binaries.HolaProxy:
-            log.debug("Loading Hola proxy provider")
-            proxy_providers.append(Hola())
-
-        for proxy_provider in proxy_providers:
-            log.info(f"Loaded {proxy_provider.__class__.__name__}: {proxy_provider}")
-
-        if not proxy_providers:
-            log.warning("No proxy providers were loaded. Check your proxy provider configuration in unshackle.yaml")
+async def initialize_proxy_providers(request: Optional[web.Request] = None) -> List[Any]:
+    """
+    Get the available proxy providers.
 
-    except Exception as e:
-        log.warning(f"Failed to initialize some proxy providers: {e}")
+    The providers are made once and shared by every request, see ProxyRegistry. They're got in
+    a thread, so a request made while they're still being made doesn't block the event loop.
+    """
+    registry = (request.app.get("proxy_registry") if request else None) or get_proxy_registry()
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: registry.providers)
 
-    return proxy_providers
+
+def get_request_service_pool(request: Optional[web.Request] = None) -> ServicePool:
+    """Get the pool of authenticated Service instances shared by every request."""
+    pool = request.app.get("service_pool") if request else None
+    return pool or get_service_pool()
+
+
+def get_service_key(
+    service_tag: str, profile: Optional[str], proxy: Optional[str], no_proxy: bool, service_kwargs: Dict[str, Any]
+) -> str:
+    """Get the key of a Service instance in the pool, from everything it's made with."""
+    return json.dumps([service_tag, profile, proxy, no_proxy, service_kwargs], sort_keys=True, default=str)
 
 
 def resolve_proxy(proxy: str, proxy_providers: List[Any]) -> str:
@@ -391,7 +378,7 @@ async def search_handler(data: Dict[str, Any], request: Optional[web.Request] =
 
     proxy_providers = []
     if not no_proxy:
-        proxy_providers = initialize_proxy_providers()
+        proxy_providers = await initialize_proxy_providers(request)
 
     if proxy_param and not no_proxy:
         try:
@@ -445,37 +432,48 @@ async def search_handler(data: Dict[str, Any], request: Optional[web.Request] =
     accepted_params = set(service_init_params.keys()) - {"self", "ctx"}
     service_kwargs = {k: v for k, v in service_kwargs.items() if k in accepted_params}
 
-    try:
-        service_instance = service_module(service_ctx, **service_kwargs)
-    except Exception as exc:
-        raise APIError(
-            APIErrorCode.SERVICE_ERROR,
-            f"Failed to initialize service: {exc}",
-            details={"service": normalized_service},
-        )
+    def create_service():
+        try:
+            service = service_module(service_ctx, **service_kwargs)
+        except Exception as exc:
+            raise APIError(
+                APIErrorCode.SERVICE_ERROR,
+                f"Failed to initialize service: {exc}",
+                details={"service": normalized_service},
+            )
 
-    # Authenticate
-    cookies = dl.get_cookie_jar(normalized_service, profile)
-    credential = dl.get_credentials(normalized_service, profile)
-    service_instance.authenticate(cookies, credential)
+        # Authenticate
+        cookies = dl.get_cookie_jar(normalized_service, profile)
+        credential = dl.get_credentials(normalized_service, profile)
+        service.authenticate(cookies, credential)
+        return service
+
+    service_pool = get_request_service_pool(request)
 
     # Search
-    results = []
     try:
-        for result in service_instance.search():
-            results.append({
-                "id": result.id,
-                "title": result.title,
-                "description": result.description,
-                "label": result.label,
-                "url": result.url,
-            })
+        pooled, search_results = service_pool.use(
+            get_service_key(normalized_service, profile, data.get("proxy"), no_proxy, service_kwargs),
+            create_service,
+            lambda service: list(service.search()),
+        )
     except NotImplementedError:
         raise APIError(
             APIErrorCode.SERVICE_ERROR,
             f"Search is not supported by {normalized_service}",
             details={"service": normalized_service},
         )
+    service_pool.release(pooled)
+
+    results = []
+    for result in search_results:
+        results.append({
+            "id": result.id,
+            "title": result.title,
+            "description": result.description,
+            "label": result.label,
+            "url": result.url,
+        })
 
     return web.json_response({"results": results, "count": len(results)})
 
@@ -508,6 +506,8 @@ async def list_titles_handler(data: Dict[str, Any], request: Optional[web.Reques
             details={"service": service_tag},
         )
 
+    service_pool = get_request_service_pool(request)
+    pooled = None
     try:
         import inspect
 
@@ -537,7 +537,7 @@ async def list_titles_handler(data: Dict[str, Any], request: Optional[web.Reques
         proxy_providers = []
 
         if not no_proxy:
-            proxy_providers = initialize_proxy_providers()
+            proxy_providers = await initialize_proxy_providers(request)
 
         if proxy_param and not no_proxy:
             try:
@@ -601,13 +601,19 @@ async def list_titles_handler(data: Dict[str, Any], request: Optional[web.Reques
             if key in service_init_params:
                 filtered_kwargs[key] = value
 
-        service_instance = service_module(service_ctx, **filtered_kwargs)
-
-        cookies = dl.get_cookie_jar(normalized_service, profile)
-        credential = dl.get_credentials(normalized_service, profile)
-        service_instance.authenticate(cookies, credential)
-
-        titles = service_instance.get_titles()
+        def create_service():
+            service = service_module(service_ctx, **filtered_kwargs)
+            cookies = dl.get_cookie_jar(normalized_service, profile)
+            credential = dl.get_credentials(normalized_service, profile)
+            service.authenticate(cookies, credential)
+            return service
+
+        # a warm instance made with the same arguments skips the IP lookup and authentication
+        pooled, titles = service_pool.use(
+            get_service_key(normalized_service, profile, data.get("proxy"), no_proxy, filtered_kwargs),
+            create_service,
+            lambda service: service.get_titles(),
+        )
 
         if hasattr(titles, "__iter__") and not isinstance(titles, str):
             title_list = [serialize_title(t) for t in titles]
@@ -619,6 +625,8 @@ async def list_titles_handler(data: Dict[str, Any], request: Optional[web.Reques
     except APIError:
         raise
     except Exception as e:
+        if pooled:
+            pooled.healthy = False
         log.exception("Error listing titles")
         debug_mode = request.app.get("debug_api", False) if request else False
         return handle_api_exception(
@@ -626,6 +634,9 @@ async def list_titles_handler(data: Dict[str, Any], request: Optional[web.Reques
             context={"operation": "list_titles", "service": normalized_service, "title_id": title_id},
             debug_mode=debug_mode,
         )
+    finally:
+        if pooled:
+            service_pool.release(pooled)
 
 
 async def list_tracks_handler(data: Dict[str, Any], request: Optional[web.Request] = None) -> web.Response:
@@ -656,6 +667,8 @@ async def list_tracks_handler(data: Dict[str, Any], request: Optional[web.Reques
             details={"service": service_tag},
         )
 
+    service_pool = get_request_service_pool(request)
+    pooled = None
     try:
         import inspect
 
@@ -685,7 +698,7 @@ async def list_tracks_handler(data: Dict[str, Any], request: Optional[web.Reques
         proxy_providers = []
 
         if not no_proxy:
-            proxy_providers = initialize_proxy_providers()
+            proxy_providers = await initialize_proxy_providers(request)
 
         if proxy_param and not no_proxy:
             try:
@@ -749,13 +762,20 @@ async def list_tracks_handler(data: Dict[str, Any], request: Optional[web.Reques
             if key in service_init_params:
                 filtered_kwargs[key] = value
 
-        service_instance = service_module(service_ctx, **filtered_kwargs)
-
-        cookies = dl.get_cookie_jar(normalized_service, profile)
-        credential = dl.get_credentials(normalized_service, profile)
-        service_instance.authenticate(cookies, credential)
-
-        titles = service_instance.get_titles()
+        def create_service():
+            service = service_module(service_ctx, **filtered_kwargs)
+            cookies = dl.get_cookie_jar(normalized_service, profile)
+            credential = dl.get_credentials(normalized_service, profile)
+            service.authenticate(cookies, credential)
+            return service
+
+        # a warm instance made with the same arguments skips the IP lookup and authentication
+        pooled, titles = service_pool.use(
+            get_service_key(normalized_service, profile, data.get("proxy"), no_proxy, filtered_kwargs),
+            create_service,
+            lambda service: service.get_titles(),
+        )
+        service_instance = pooled.service
 
         wanted_param = data.get("wanted")
         season = data.get("season")
@@ -885,6 +905,8 @@ async def list_tracks_handler(data: Dict[str, Any], request: Optional[web.Reques
     except APIError:
         raise
     except Exception as e:
+        if pooled:
+            pooled.healthy = False
         log.exception("Error listing tracks")
         debug_mode = request.app.get("debug_api", False) if request else False
         return handle_api_exception(
@@ -892,6 +914,9 @@ async def list_tracks_handler(data: Dict[str, Any], request: Optional[web.Reques
             context={"operation": "list_tracks", "service": normalized_service, "title_id": title_id},
             debug_mode=debug_mode,
         )
+    finally:
+        if pooled:
+            service_pool.release(pooled)
 
 
 def validate_download_parameters(data: Dict[str, Any]) -> Optional[str]:
@@ -952,6 +977,12 @@ def validate_download_parameters(data: Dict[str, Any]) -> Optional[str]:
         if not isinstance(data["downloads"], int) or data["downloads"] <= 0:
             return "downloads must be a positive integer"
 
+    if "bandwidth_limit" in data and data["bandwidth_limit"] is not None:
+        try:
+            parse_rate(data["bandwidth_limit"])
+        except (TypeError, ValueError):
+            return "bandwidth_limit must be a positive number of bytes per second, or a rate like '5 MB/s'"
+
     exclusive_flags = []
     if data.get("video_only"):
         exclusive_flags.append("video_only")
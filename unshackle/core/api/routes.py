@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import re
 
@@ -9,6 +10,8 @@ from unshackle.core.api.errors import APIError, APIErrorCode, build_error_respon
 from unshackle.core.api.handlers import (cancel_download_job_handler, download_handler, get_download_job_handler,
                                          list_download_jobs_handler, list_titles_handler, list_tracks_handler,
                                          search_handler)
+from unshackle.core.api.service_pool import get_service_pool
+from unshackle.core.proxies.registry import get_proxy_registry
 from unshackle.core.services import Services
 from unshackle.core.update_checker import UpdateChecker
 
@@ -644,6 +647,11 @@ async def download(request: web.Request) -> web.Response:
               downloads:
                 type: integer
                 description: Amount of tracks to download concurrently (default - 1)
+              bandwidth_limit:
+                oneOf:
+                  - type: integer
+                  - type: string
+                description: Max download rate of this job, in bytes per second or e.g. "5 MB/s" (default - None)
               best_available:
                 type: boolean
                 description: Continue with best available if requested quality unavailable (default - false)
@@ -759,6 +767,9 @@ async def download_jobs(request: web.Request) -> web.Response:
                         type: string
                       progress:
                         type: number
+                      telemetry:
+                        type: object
+                        description: Bytes, throughput and ETA of the job's downloads, while downloading
       '400':
         description: Invalid query parameters
       '500':
@@ -836,8 +847,32 @@ async def cancel_download_job(request: web.Request) -> web.Response:
         return build_error_response(e, debug_mode)
 
 
+async def load_proxy_providers(app: web.Application) -> None:
+    """Load the proxy providers in the background, so the first request using a proxy doesn't wait on them."""
+    registry = app["proxy_registry"]
+    future = asyncio.get_running_loop().run_in_executor(None, lambda: registry.providers)
+    future.add_done_callback(log_proxy_provider_error)
+
+
+def log_proxy_provider_error(future: asyncio.Future) -> None:
+    """Log the error of loading the proxy providers in the background, if it failed."""
+    if not future.cancelled() and future.exception():
+        log.error(f"Failed to load the proxy providers: {future.exception()!r}")
+
+
+async def clear_service_pool(app: web.Application) -> None:
+    """Drop the pooled Service instances."""
+    app["service_pool"].clear()
+
+
 def setup_routes(app: web.Application) -> None:
     """Setup all API routes."""
+    # the proxy providers and their server lists, and authenticated services, are shared by every request
+    app["proxy_registry"] = get_proxy_registry()
+    app["service_pool"] = get_service_pool()
+    app.on_startup.append(load_proxy_providers)
+    app.on_cleanup.append(clear_service_pool)
+
     app.router.add_get("/api/health", health)
     app.router.add_get("/api/services", services)
     app.router.add_post("/api/search", search)
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Optional, TypeVar
+
+from unshackle.core.config import config
+
+if TYPE_CHECKING:
+    from unshackle.core.service import Service
+
+MAX_SIZE = 32  # instances kept, of every service
+MAX_IDLE = 600  # seconds an unused instance is kept
+MAX_AGE = 3600  # seconds an instance is used before it's made, and authenticated, again
+
+log = logging.getLogger("ServicePool")
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_pool: Optional[ServicePool] = None
+
+
+class PooledService:
+    """A Service instance of a ServicePool, used by one request at a time."""
+
+    def __init__(self, key: Hashable, service: Service):
+        self.key = key
+        self.service = service
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+        self.healthy = True
+        self.lock = threading.Lock()
+
+    def is_usable(self, max_idle: float, max_age: float) -> bool:
+        now = time.monotonic()
+        return self.healthy and now - self.last_used < max_idle and now - self.created < max_age
+
+
+class ServicePool:
+    """
+    Authenticated Service instances, kept so later requests with the same arguments reuse them.
+
+    Instances are keyed by everything they were made with, e.g., the service, title,
+    profile and proxy, as a Service binds them when it's made. A reused instance
+    skips the IP lookup and authentication of making one, so the request goes
+    straight to getting titles or tracks.
+
+    Each instance is only used by one request at a time, a request finding every
+    instance of its key busy makes another one. An instance that failed a request
+    is dropped instead of reused, as are instances unused for max_idle seconds, or
+    made more than max_age seconds ago, e.g., so expiring logins are refreshed.
+
+    A request that fails with a reused instance, e.g., as its login expired before
+    max_age, is tried again once with a new instance, see use().
+    """
+
+    def __init__(self, max_size: int = MAX_SIZE, max_idle: float = MAX_IDLE, max_age: float = MAX_AGE):
+        """
+        Parameters:
+            max_size: Instances to keep, the least recently used are dropped first.
+            max_idle: Seconds to keep an unused instance.
+            max_age: Seconds to use an instance before making it again.
+        """
+        if max_size < 0:
+            raise ValueError(f"Expected max_size to be 0 or more, not {max_size}")
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, PooledService] = OrderedDict()
+
+    def acquire(self, key: Hashable, factory: Callable[[], Service], reuse: bool = True) -> PooledService:
+        """
+        Get an idle instance of a key, or make one with factory if there's none, or if not reusing one.
+        It must be given back with release() once the request is done with it.
+        """
+        with self._lock:
+            self._evict()
+            for entry in reversed(self._entries.values()):
+                if reuse and entry.key == key and entry.lock.acquire(blocking=False):
+                    self._entries.move_to_end(id(entry))
+                    self.stats["hits"] += 1
+                    entry.uses += 1
+                    return entry
+            self.stats["misses"] += 1
+
+        entry = PooledService(key, factory())
+        entry.lock.acquire()
+        entry.uses += 1
+        return entry
+
+    def use(
+        self, key: Hashable, factory: Callable[[], Service], func: Callable[[Service], T]
+    ) -> tuple[PooledService, T]:
+        """
+        Get an instance of a key, see acquire(), and call func with it, e.g., the first service call of a request.
+
+        If func fails with a reused instance, it and the idle instances of the key are dropped, as they're
+        likely stale, e.g., their login expired, and func is called again with a new instance. The instance
+        is given back if func fails, otherwise it must be given back with release().
+        """
+        entry = self.acquire(key, factory)
+        try:
+            return entry, self._call(entry, func)
+        except Exception as e:
+            if entry.uses == 1 or isinstance(e, NotImplementedError):
+                raise
+            log.info(f"A reused {type(entry.service).__name__} instance failed, trying a new one: {e!r}")
+
+        self.drop(key)
+        entry = self.acquire(key, factory, reuse=False)
+        return entry, self._call(entry, func)
+
+    def release(self, entry: PooledService) -> None:
+        """Give back an instance, keeping it for later requests if it's still healthy."""
+        entry.last_used = time.monotonic()
+        with self._lock:
+            if entry.is_usable(self.max_idle, self.max_age) and self.max_size:
+                self._entries[id(entry)] = entry
+                self._entries.move_to_end(id(entry))
+            elif self._entries.pop(id(entry), None):
+                self.stats["evicted"] += 1
+            self._evict()
+        entry.lock.release()
+
+    def drop(self, key: Hashable) -> None:
+        """Drop the idle instances of a key."""
+        with self._lock:
+            for entry_id, entry in list(self._entries.items()):
+                if entry.key == key and not entry.lock.locked():
+                    del self._entries[entry_id]
+                    self.stats["evicted"] += 1
+
+    def clear(self) -> None:
+        """Drop every instance."""
+        with self._lock:
+            self._entries.clear()
+
+    def _call(self, entry: PooledService, func: Callable[[Service], T]) -> T:
+        try:
+            return func(entry.service)
+        except NotImplementedError:
+            # not supported by the service, the instance is fine
+            self.release(entry)
+            raise
+        except BaseException:
+            entry.healthy = False
+            self.release(entry)
+            raise
+
+    def _evict(self) -> None:
+        for entry_id, entry in list(self._entries.items()):
+            if entry.lock.locked():
+                continue
+            if len(self._entries) > self.max_size or not entry.is_usable(self.max_idle, self.max_age):
+                del self._entries[entry_id]
+                self.stats["evicted"] += 1
+                log.debug(f"Dropped a {type(entry.service).__name__} instance")
+
+
+def get_service_pool() -> ServicePool:
+    """Get the ServicePool of this process, made from the `serve` config."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            cfg: dict[str, Any] = config.serve.get("service_pool") or {}
+            _pool = ServicePool(
+                max_size=int(cfg.get("max_size", MAX_SIZE)),
+                max_idle=float(cfg.get("max_idle", MAX_IDLE)),
+                max_age=float(cfg.get("max_age", MAX_AGE)),
+            )
+        return _pool
+
+
+__all__ = ("ServicePool", "get_service_pool")
@@ -1,6 +1,13 @@
 from __future__ import annotations
 
+import io
+import logging
+import pickle
+import sqlite3
+import threading
+import time
 import zlib
+from abc import ABCMeta, abstractmethod
 from datetime import datetime, timedelta
 from os import stat_result
 from pathlib import Path
@@ -12,6 +19,310 @@ import jwt
 from unshackle.core.config import config
 
 EXP_T = Union[datetime, str, int, float]
+ENTRY_T = tuple[Any, Optional[datetime], Optional[int]]  # data, expiration, version
+
+MAX_SIZE = 256  # MB the sqlite backend keeps before evicting the least recently used entries
+
+log = logging.getLogger("Cacher")
+
+_lock = threading.Lock()
+_backend: Optional[CacheBackend] = None
+
+
+class CacheBackend(metaclass=ABCMeta):
+    """Where a Cacher reads and writes the data of each Service and Key."""
+
+    @abstractmethod
+    def read(self, service_tag: str, key: str) -> Optional[ENTRY_T]:
+        """
+        Get the data, expiration and version of a Key, or None if it's not cached.
+
+        Raises:
+            ValueError: If the stored entry is corrupt, i.e., its checksum mismatched.
+        """
+
+    @abstractmethod
+    def write(
+        self, service_tag: str, key: str, data: Any, expiration: Optional[datetime], version: Optional[int]
+    ) -> None:
+        """Set the data, expiration and version of a Key, replacing the whole entry at once."""
+
+    @abstractmethod
+    def delete(self, service_tag: str, key: str) -> None:
+        """Delete the entry of a Key, if there is one."""
+
+    @abstractmethod
+    def keys(self, service_tag: str) -> list[str]:
+        """Get the Keys cached for a Service."""
+
+    @abstractmethod
+    def clear(self, service_tag: Optional[str] = None) -> int:
+        """Delete the entries of a Service, or of every Service, returning how many were deleted."""
+
+    @abstractmethod
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Get the entries, bytes, and if tracked, hits of each Service."""
+
+
+class JSONBackend(CacheBackend):
+    """
+    One jsonpickle'd JSON file per Key in the cache directory, with a CRC32 of its payload.
+
+    This is the file format of earlier versions. Entries are never evicted.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def get_path(self, service_tag: str, key: str) -> Path:
+        return (self.directory / service_tag / key).with_suffix(".json")
+
+    def read(self, service_tag: str, key: str) -> Optional[ENTRY_T]:
+        path = self.get_path(service_tag, key)
+        if not path.is_file():
+            return None
+        data = jsonpickle.loads(path.read_text(encoding="utf8"))
+        payload = data.copy()
+        del payload["crc32"]
+        checksum = data["crc32"]
+        calculated = zlib.crc32(jsonpickle.dumps(payload).encode("utf8"))
+        if calculated != checksum:
+            raise ValueError(
+                f"The checksum of the Cache payload mismatched. Checksum: {checksum} !== Calculated: {calculated}"
+            )
+        return data["data"], data["expiration"], data["version"]
+
+    def write(
+        self, service_tag: str, key: str, data: Any, expiration: Optional[datetime], version: Optional[int]
+    ) -> None:
+        payload = {"data": data, "expiration": expiration, "version": version}
+        payload["crc32"] = zlib.crc32(jsonpickle.dumps(payload).encode("utf8"))
+
+        path = self.get_path(service_tag, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(jsonpickle.dumps(payload), encoding="utf8")
+        temp_path.replace(path)
+
+    def delete(self, service_tag: str, key: str) -> None:
+        self.get_path(service_tag, key).unlink(missing_ok=True)
+
+    def keys(self, service_tag: str) -> list[str]:
+        return [path.stem for path in (self.directory / service_tag).glob("*.json")]
+
+    def clear(self, service_tag: Optional[str] = None) -> int:
+        paths = list(self.directory.glob(f"{service_tag or '*'}/*.json"))
+        for path in paths:
+            path.unlink(missing_ok=True)
+        return len(paths)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        stats: dict[str, dict[str, int]] = {}
+        for path in self.directory.glob("*/*.json"):
+            service = stats.setdefault(path.parent.name, {"entries": 0, "bytes": 0})
+            service["entries"] += 1
+            service["bytes"] += path.stat().st_size
+        return stats
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Every Key of every Service in one SQLite database, with binary pickled data.
+
+    The data is serialized once per write, and the CRC32 is of the stored bytes,
+    so neither a read nor a write has to serialize it again to check it. Each write
+    replaces its entry in one transaction, so a crash never leaves a partial entry.
+    Once the stored data is over max_size bytes, the least recently read or written
+    entries are evicted.
+
+    Data that can't be pickled is stored jsonpickle'd instead, and entries that can
+    no longer be unpickled, e.g., of classes that changed since, are dropped as if
+    they were never cached.
+    """
+
+    def __init__(self, path: Path, max_size: int = MAX_SIZE * 1000 * 1000):
+        self.path = path
+        self.max_size = max_size
+        self._store = threading.local()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.DatabaseError:
+            # e.g., a read-only file or a file system without shared memory support
+            pass
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS "entries" (
+                  "service"    TEXT NOT NULL,
+                  "key"        TEXT NOT NULL,
+                  "version"    INTEGER,
+                  "expiration" TEXT,
+                  "format"     TEXT NOT NULL,
+                  "data"       BLOB NOT NULL,
+                  "crc32"      INTEGER NOT NULL,
+                  "size"       INTEGER NOT NULL,
+                  "accessed"   REAL NOT NULL,
+                  "hits"       INTEGER NOT NULL DEFAULT 0,
+                  PRIMARY KEY("service", "key")
+                );
+                """
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS "entries_accessed" ON "entries" ("accessed");')
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if not hasattr(self._store, "conn"):
+            self._store.conn = self._create_connection()
+        return self._store.conn
+
+    def read(self, service_tag: str, key: str) -> Optional[ENTRY_T]:
+        row = self.conn.execute(
+            'SELECT "version", "expiration", "format", "data", "crc32" FROM "entries" WHERE "service"=? AND "key"=?',
+            (service_tag, key),
+        ).fetchone()
+        if not row:
+            return None
+        version, expiration, format_, blob, checksum = row
+
+        calculated = zlib.crc32(blob)
+        if calculated != checksum:
+            raise ValueError(
+                f"The checksum of the Cache payload mismatched. Checksum: {checksum} !== Calculated: {calculated}"
+            )
+
+        try:
+            data = _loads(format_, blob)
+        except Exception as e:
+            log.debug(f"Dropping the {service_tag} {key} cache, it could not be loaded: {e!r}")
+            self.delete(service_tag, key)
+            return None
+
+        with self.conn:
+            self.conn.execute(
+                'UPDATE "entries" SET "accessed"=?, "hits"="hits"+1 WHERE "service"=? AND "key"=?',
+                (time.time(), service_tag, key),
+            )
+
+        return data, datetime.fromisoformat(expiration) if expiration else None, version
+
+    def write(
+        self, service_tag: str, key: str, data: Any, expiration: Optional[datetime], version: Optional[int]
+    ) -> None:
+        format_, blob = _dumps(data)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO "entries" '
+                '("service", "key", "version", "expiration", "format", "data", "crc32", "size", "accessed") '
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    service_tag,
+                    key,
+                    version,
+                    expiration.isoformat() if expiration else None,
+                    format_,
+                    blob,
+                    zlib.crc32(blob),
+                    len(blob),
+                    time.time(),
+                ),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        size = self.conn.execute('SELECT COALESCE(SUM("size"), 0) FROM "entries"').fetchone()[0]
+        if size <= self.max_size:
+            return
+        evicted = 0
+        rows = self.conn.execute('SELECT "service", "key", "size" FROM "entries" ORDER BY "accessed"').fetchall()
+        for service_tag, key, entry_size in rows[:-1]:  # the entry just written is always kept
+            self.conn.execute('DELETE FROM "entries" WHERE "service"=? AND "key"=?', (service_tag, key))
+            size -= entry_size
+            evicted += 1
+            if size <= self.max_size:
+                break
+        log.debug(f"Evicted {evicted} least recently used cache entries")
+
+    def delete(self, service_tag: str, key: str) -> None:
+        with self.conn:
+            self.conn.execute('DELETE FROM "entries" WHERE "service"=? AND "key"=?', (service_tag, key))
+
+    def keys(self, service_tag: str) -> list[str]:
+        return [key for (key,) in self.conn.execute('SELECT "key" FROM "entries" WHERE "service"=?', (service_tag,))]
+
+    def clear(self, service_tag: Optional[str] = None) -> int:
+        with self.conn:
+            if service_tag:
+                cursor = self.conn.execute('DELETE FROM "entries" WHERE "service"=?', (service_tag,))
+            else:
+                cursor = self.conn.execute('DELETE FROM "entries"')
+        return cursor.rowcount
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            service: {"entries": entries, "bytes": size, "hits": hits}
+            for service, entries, size, hits in self.conn.execute(
+                'SELECT "service", COUNT(*), SUM("size"), SUM("hits") FROM "entries" GROUP BY "service"'
+            )
+        }
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles Service classes by their tag, as they're imported by path rather than by module name."""
+
+    def reducer_override(self, obj: Any) -> Any:
+        if isinstance(obj, type):
+            from unshackle.core.service import Service
+
+            if issubclass(obj, Service) and obj is not Service:
+                return _load_service, (obj.__name__,)
+        return NotImplemented
+
+
+def _load_service(tag: str) -> type:
+    from unshackle.core.services import Services
+
+    return Services.load(tag)
+
+
+def _dumps(data: Any) -> tuple[str, bytes]:
+    buffer = io.BytesIO()
+    try:
+        _Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(data)
+        return "pickle", buffer.getvalue()
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        log.debug(f"Storing the data with jsonpickle as it could not be pickled: {e!r}")
+        return "jsonpickle", jsonpickle.dumps(data).encode("utf8")
+
+
+def _loads(format_: str, blob: bytes) -> Any:
+    if format_ == "pickle":
+        return pickle.loads(blob)
+    return jsonpickle.loads(blob.decode("utf8"))
+
+
+def get_cache_backend() -> CacheBackend:
+    """Get the CacheBackend of this process, made from the `cache` config."""
+    global _backend
+    with _lock:
+        if _backend is None:
+            cfg = config.cache
+            backend = cfg.get("backend", "sqlite")
+            if backend == "sqlite":
+                _backend = SQLiteBackend(
+                    path=config.directories.cache / "cache.db",
+                    max_size=int(float(cfg.get("max_size", MAX_SIZE)) * 1000 * 1000),
+                )
+            elif backend == "json":
+                _backend = JSONBackend(config.directories.cache)
+            else:
+                raise ValueError(f"Unknown cache backend {backend!r}, expected 'sqlite' or 'json'")
+        return _backend
 
 
 class Cacher:
@@ -32,16 +343,16 @@ class Cacher:
         self.expiration = expiration
 
         if self.expiration and self.expired:
-            # if its expired, remove the data for safety and delete cache file
+            # if its expired, remove the data for safety and delete the cache entry
             self.data = None
-            self.path.unlink()
+            self.delete()
 
     def __bool__(self) -> bool:
         return bool(self.data)
 
     @property
     def path(self) -> Path:
-        """Get the path at which the cache will be read and written."""
+        """Get the path at which the json backend reads and writes the cache."""
         return (config.directories.cache / self.service_tag / self.key).with_suffix(".json")
 
     @property
@@ -56,22 +367,19 @@ class Cacher:
         :returns: Cache object containing the cached data or None if the file does not exist.
         """
         cache = Cacher(self.service_tag, key, version)
-        if cache.path.is_file():
-            data = jsonpickle.loads(cache.path.read_text(encoding="utf8"))
-            payload = data.copy()
-            del payload["crc32"]
-            checksum = data["crc32"]
-            calculated = zlib.crc32(jsonpickle.dumps(payload).encode("utf8"))
-            if calculated != checksum:
-                raise ValueError(
-                    f"The checksum of the Cache payload mismatched. Checksum: {checksum} !== Calculated: {calculated}"
-                )
-            cache.data = data["data"]
-            cache.expiration = data["expiration"]
-            cache.version = data["version"]
+        backend = get_cache_backend()
+        entry = backend.read(self.service_tag, key)
+        if entry is None and not isinstance(backend, JSONBackend) and cache.path.is_file():
+            # move it from the json file of earlier versions, e.g., so logins are kept
+            entry = JSONBackend(config.directories.cache).read(self.service_tag, key)
+            backend.write(self.service_tag, key, *entry)
+            cache.path.unlink()
+        if entry:
+            cache.data, cache.expiration, cache.version = entry
             if cache.version != version:
                 raise ValueError(
-                    f"The version of your {self.service_tag} {key} cache is outdated. Please delete: {cache.path}"
+                    f"The version of your {self.service_tag} {key} cache is outdated. "
+                    f"Please clear it: unshackle env clear cache {self.service_tag}"
                 )
         return cache
 
@@ -93,19 +401,29 @@ class Cacher:
 
         self.expiration = self.resolve_datetime(expiration) if expiration else None
 
-        payload = {"data": self.data, "expiration": self.expiration, "version": self.version}
-        payload["crc32"] = zlib.crc32(jsonpickle.dumps(payload).encode("utf8"))
-
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.path.write_text(jsonpickle.dumps(payload))
+        get_cache_backend().write(self.service_tag, self.key, self.data, self.expiration, self.version)
 
         return self.data
 
+    def delete(self) -> None:
+        """Delete the Cached data of this Key."""
+        get_cache_backend().delete(self.service_tag, self.key)
+        # and the json file of earlier versions, so it's not moved to the backend again
+        self.path.unlink(missing_ok=True)
+
+    def keys(self) -> list[str]:
+        """Get the Keys of all Cached data for the Service."""
+        return get_cache_backend().keys(self.service_tag)
+
     def stat(self) -> stat_result:
         """
         Get Cache file OS Stat data like Creation Time, Modified Time, and such.
+        Only the json backend has a file per Key, the sqlite backend stats its database.
         :returns: an os.stat_result tuple
         """
+        backend = get_cache_backend()
+        if isinstance(backend, SQLiteBackend):
+            return backend.path.stat()
         return self.path.stat()
 
     @staticmethod
@@ -154,3 +472,6 @@ class Cacher:
             # or, it's an already expired timestamp which is unlikely
             timestamp = timestamp + timedelta(seconds=datetime.now().timestamp())
         return timestamp
+
+
+__all__ = ("Cacher", "CacheBackend", "JSONBackend", "SQLiteBackend", "get_cache_backend")
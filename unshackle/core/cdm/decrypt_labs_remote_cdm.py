@@ -397,20 +397,29 @@ class DecryptLabsRemoteCDM:
         already_tried_cache = session.get("tried_cache", False)
 
         if self.vaults and self._required_kids:
-            vault_keys = []
+            kid_uuids = {}
             for kid_str in self._required_kids:
                 try:
                     clean_kid = kid_str.replace("-", "")
                     if len(clean_kid) == 32:
-                        kid_uuid = UUID(hex=clean_kid)
+                        kid_uuids[kid_str] = UUID(hex=clean_kid)
                     else:
-                        kid_uuid = UUID(hex=clean_kid.ljust(32, "0"))
-                    key, _ = self.vaults.get_key(kid_uuid)
-                    if key and key.count("0") != len(key):
-                        vault_keys.append({"kid": kid_str, "key": key, "type": "CONTENT"})
+                        kid_uuids[kid_str] = UUID(hex=clean_kid.ljust(32, "0"))
                 except (ValueError, TypeError):
                     continue
 
+            # every required KID is looked up in the vaults at once
+            try:
+                found_keys = self.vaults.get_keys(kid_uuids.values())
+            except (ValueError, TypeError):
+                found_keys = {}
+
+            vault_keys = []
+            for kid_str, kid_uuid in kid_uuids.items():
+                key, _ = found_keys.get(kid_uuid, (None, None))
+                if key and key.count("0") != len(key):
+                    vault_keys.append({"kid": kid_str, "key": key, "type": "CONTENT"})
+
             if vault_keys:
                 vault_kids = set(k["kid"] for k in vault_keys)
                 required_kids = set(self._required_kids)
@@ -1,3 +1,4 @@
+import threading
 from typing import Optional
 
 import click
@@ -9,7 +10,9 @@ _COMMANDS = sorted(
     (path for path in config.directories.commands.glob("*.py") if path.stem.lower() != "__init__"), key=lambda x: x.stem
 )
 
-_MODULES = {path.stem: getattr(import_module_by_path(path), path.stem) for path in _COMMANDS}
+# commands are only imported once used, as some import large dependencies, e.g., dl
+_MODULES: dict[str, click.Command] = {}
+_lock = threading.RLock()
 
 
 class Commands(click.MultiCommand):
@@ -21,10 +24,15 @@ class Commands(click.MultiCommand):
 
     def get_command(self, ctx: click.Context, name: str) -> Optional[click.Command]:
         """Load the command code and return the main click command function."""
-        module = _MODULES.get(name)
-        if not module:
+        path = next((x for x in _COMMANDS if x.stem == name), None)
+        if not path:
             raise click.ClickException(f"Unable to find command by the name '{name}'")
 
+        with _lock:
+            module = _MODULES.get(name)
+            if not module:
+                module = _MODULES[name] = getattr(import_module_by_path(path), path.stem)
+
         if hasattr(module, "cli"):
             return module.cli
 
@@ -41,7 +41,9 @@ class Config:
 
     def __init__(self, **kwargs: Any):
         self.dl: dict = kwargs.get("dl") or {}
+        self.aiohttp: dict = kwargs.get("aiohttp") or {}
         self.aria2c: dict = kwargs.get("aria2c") or {}
+        self.bandwidth: dict = kwargs.get("bandwidth") or {}
         self.n_m3u8dl_re: dict = kwargs.get("n_m3u8dl_re") or {}
         self.cdm: dict = kwargs.get("cdm") or {}
         self.chapter_fallback_name: str = kwargs.get("chapter_fallback_name") or ""
@@ -72,8 +74,10 @@ class Config:
         for name, filename in (kwargs.get("filenames") or {}).items():
             setattr(self.filenames, name, filename)
 
+        self.cache: dict = kwargs.get("cache") or {}
         self.headers: dict = kwargs.get("headers") or {}
         self.key_vaults: list[dict[str, Any]] = kwargs.get("key_vaults", [])
+        self.manifest_cache: dict = kwargs.get("manifest_cache") or {}
         self.muxing: dict = kwargs.get("muxing") or {}
         self.proxy_providers: dict = kwargs.get("proxy_providers") or {}
         self.serve: dict = kwargs.get("serve") or {}
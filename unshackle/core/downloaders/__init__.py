@@ -1,6 +1,7 @@
+from .aiohttp import aiohttp
 from .aria2c import aria2c
 from .curl_impersonate import curl_impersonate
 from .n_m3u8dl_re import n_m3u8dl_re
 from .requests import requests
 
-__all__ = ("aria2c", "curl_impersonate", "requests", "n_m3u8dl_re")
+__all__ = ("aiohttp", "aria2c", "curl_impersonate", "requests", "n_m3u8dl_re")
@@ -0,0 +1,480 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from collections.abc import Sequence
+from http.cookiejar import CookieJar
+from pathlib import Path
+from typing import Any, AsyncGenerator, Generator, Iterator, MutableMapping, Optional, Union
+
+import requests
+from aiohttp import ClientSession, ClientTimeout, DummyCookieJar, TCPConnector
+from requests.cookies import cookiejar_from_dict, get_cookie_header
+
+from unshackle.core.config import config
+from unshackle.core.constants import DOWNLOAD_CANCELLED
+from unshackle.core.downloaders import bandwidth
+from unshackle.core.downloaders.bandwidth import Throttle
+from unshackle.core.downloaders.batch import DownloadBatch
+from unshackle.core.downloaders.control import ControlFile
+from unshackle.core.downloaders.streaming import COMPRESSED_ENCODINGS, astream_to_file
+from unshackle.core.downloaders.telemetry import Telemetry, get_telemetry
+from unshackle.core.utilities import get_debug_logger
+
+MAX_ATTEMPTS = 5
+RETRY_WAIT = 2
+CHECKPOINT_SIZE = 16 * 1024 * 1024
+PROGRESS_WINDOW = 1
+MAX_WORKERS = 100
+POLL_INTERVAL = 1  # seconds between checks of DOWNLOAD_CANCELLED while no updates come in
+TIMEOUT = ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+
+async def download(
+    url: str,
+    save_path: Path,
+    session: ClientSession,
+    segmented: bool = False,
+    throttle: Optional[Throttle] = None,
+    telemetry: Optional[Telemetry] = None,
+    **kwargs: Any,
+) -> AsyncGenerator[dict[str, Any], None]:
+    """
+    Download a file using aiohttp.
+    https://docs.aiohttp.org
+
+    Yields the following download status updates while data is downloading:
+
+    - {total: 123} (there are 123 bytes to download)
+    - {total: None} (there are an unknown number of bytes to download)
+    - {advance: 1024} (1024 more bytes were downloaded)
+    - {file_downloaded: Path(...), written: 1024} (download finished, has the save path and size)
+
+    Data is coalesced and written to disk in large adaptive blocks, see
+    `streaming.astream_to_file`. Like the requests downloader, a control file
+    (`{name}.!dev`) records how much of the file has been written, so that an
+    interrupted or cancelled download continues from it with a `Range` request.
+
+    Parameters:
+        url: Web URL of a file to download.
+        save_path: The path to save the file to. If the save path's directory does not
+            exist then it will be made automatically.
+        session: The aiohttp ClientSession to make HTTP requests with. Connections are
+            saved and re-used with the session so long as the server keeps them alive.
+        segmented: If downloads are segments or parts of one bigger file.
+        throttle: The bandwidth scheduler's throttle to pass each downloaded chunk to.
+            It blocks, so it's waited for on another thread.
+        telemetry: The telemetry of the track to add the downloaded bytes to.
+        kwargs: Any extra keyword arguments to pass to the session.get() call. Use this
+            for one-time request changes like a header. For example, to request
+            Byte-ranges use e.g., `headers={"Range": "bytes=0-128"}`.
+    """
+    telemetry = telemetry or Telemetry()
+
+    save_dir = save_path.parent
+    control = ControlFile(save_path)
+
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    if control.exists():
+        # a previous attempt was interrupted, continue from it if it can be trusted
+        if not control.load() or not control.matches(url):
+            control.reset(url)
+    elif save_path.exists():
+        # if it exists, and no control file, then it should be safe
+        size = save_path.stat().st_size
+        telemetry.add_existing(size)
+        if segmented:
+            telemetry.add_segment(size)
+        yield dict(file_downloaded=save_path, written=size)
+        return
+    else:
+        control.reset(url)
+
+    control.save()
+
+    attempts = 1
+    while True:
+        offset = control.resume_offset()
+        written = offset
+        if attempts == 1:
+            # data from earlier attempts was counted as it was downloaded
+            telemetry.add_existing(offset)
+
+        try:
+            # if everything was written, but we were stopped before finishing up, there's nothing to request
+            if not (offset and control.length and offset >= control.length):
+                async with session.get(url, **(control.range_kwargs(kwargs, offset) if offset else kwargs)) as stream:
+                    stream.raise_for_status()
+
+                    if offset and stream.status != 206:
+                        # the range was ignored, or the resource changed, so it's being sent in full
+                        offset = written = 0
+
+                    # aiohttp decompresses the response, but Content-Length is of the compressed data
+                    compressed = stream.headers.get("Content-Encoding", "").lower() in COMPRESSED_ENCODINGS
+                    content_length = 0 if compressed else stream.content_length or 0
+
+                    # byte offsets of decompressed data cannot be used to continue a compressed response
+                    control.resumable = not compressed
+                    control.length = offset + content_length if content_length else None
+                    control.validator = stream.headers.get("ETag") or stream.headers.get("Last-Modified")
+                    control.checkpoint(offset)
+
+                    if content_length > 0:
+                        if not segmented:
+                            telemetry.expect(total=offset + content_length)
+                        yield dict(total=offset + content_length, completed=offset)
+                    else:
+                        # we have no data to calculate total bytes
+                        yield dict(total=None)  # indeterminate mode
+
+                    with open(save_path, "ab" if offset else "wb") as f:
+                        async for download_size in astream_to_file(stream, f, content_length):
+                            written += download_size
+                            telemetry.add(download_size)
+
+                            if throttle:
+                                await asyncio.to_thread(throttle, download_size)
+
+                            if written - control.offset >= CHECKPOINT_SIZE:
+                                f.flush()
+                                control.checkpoint(written)
+
+                            yield dict(advance=download_size)
+
+                if content_length and written < offset + content_length:
+                    raise IOError(f"Failed to read {content_length} bytes from the track URI.")
+
+            control.delete()
+            if segmented:
+                telemetry.add_segment(written)
+            yield dict(file_downloaded=save_path, written=written)
+            break
+        except asyncio.CancelledError:
+            # keep what made it to disk so the next run can continue from it
+            if control.resumable and save_path.exists():
+                control.checkpoint(save_path.stat().st_size)
+            raise
+        except Exception as e:
+            # keep what made it to disk so the next attempt, or the next run, can continue from it
+            if control.resumable and save_path.exists():
+                control.checkpoint(save_path.stat().st_size)
+            else:
+                control.reset(url)
+                control.save()
+            if DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS:
+                raise e
+            await asyncio.sleep(RETRY_WAIT)
+            attempts += 1
+
+
+class _EventLoopDownloads(threading.Thread):
+    """
+    Download a list of URLs on an asyncio event loop in its own thread.
+
+    A fixed amount of worker tasks take URLs from a shared iterator, in order, so
+    that many requests can be in-flight without a thread for each of them. Status
+    updates are passed back through a queue, which ends with None once the thread
+    has finished. If a download failed, the error is then available as `error`.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[dict[str, Any]],
+        headers: dict[str, str],
+        cookies: Optional[CookieJar],
+        proxy: Optional[str],
+        max_workers: int,
+        segmented: bool,
+        throttle: Optional[Throttle] = None,
+        telemetry: Optional[Telemetry] = None,
+    ):
+        super().__init__(name="aiohttp-downloads", daemon=True)
+        self.urls = urls
+        self.headers = headers
+        self.cookies = cookies
+        self.proxy = proxy
+        self.max_workers = max_workers
+        self.segmented = segmented
+        self.throttle = throttle
+        self.telemetry = telemetry or Telemetry()
+
+        self.updates: queue.Queue[Optional[dict[str, Any]]] = queue.Queue()
+        self.error: Optional[BaseException] = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._cancelled = False
+
+    def run(self) -> None:
+        try:
+            asyncio.run(self._main())
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.updates.put(None)
+
+    def cancel(self) -> None:
+        """Stop all downloads, keeping their partial data to continue from later."""
+        self._cancelled = True
+        loop, task = self._loop, self._task
+        if loop and task:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # the loop has already finished
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        if self._cancelled:
+            return
+
+        urls = iter(self.urls)
+        async with ClientSession(
+            connector=TCPConnector(limit=self.max_workers, ttl_dns_cache=300),
+            headers=self.headers,
+            cookie_jar=DummyCookieJar(),
+            timeout=TIMEOUT,
+            proxy=self.proxy,
+        ) as session:
+            workers = [
+                asyncio.create_task(self._worker(session, urls)) for _ in range(min(self.max_workers, len(self.urls)))
+            ]
+            try:
+                done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+                for worker in done:
+                    worker.result()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, session: ClientSession, urls: Iterator[dict[str, Any]]) -> None:
+        for url in urls:
+            if DOWNLOAD_CANCELLED.is_set():
+                return
+
+            if self.cookies:
+                cookie_header = get_cookie_header(self.cookies, requests.Request(url=url["url"]))
+                if cookie_header:
+                    url = dict(url, headers={**(url.get("headers") or {}), "Cookie": cookie_header})
+
+            async for status_update in download(
+                session=session, segmented=self.segmented, throttle=self.throttle, telemetry=self.telemetry, **url
+            ):
+                if not self.segmented:
+                    self.updates.put(status_update)
+                elif status_update.get("file_downloaded"):
+                    # per-chunk updates are only useful if it's one big file
+                    self.updates.put(status_update)
+                    self.updates.put(dict(advance=1))
+
+
+def aiohttp(
+    urls: Union[str, list[str], dict[str, Any], list[dict[str, Any]]],
+    output_dir: Path,
+    filename: str,
+    headers: Optional[MutableMapping[str, Union[str, bytes]]] = None,
+    cookies: Optional[Union[MutableMapping[str, str], CookieJar]] = None,
+    proxy: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> Generator[dict[str, Any], None, None]:
+    """
+    Download files using aiohttp on an asyncio event loop.
+    https://docs.aiohttp.org
+
+    Yields the following download status updates while chunks are downloading:
+
+    - {total: 123} (there are 123 chunks to download)
+    - {total: None} (there are an unknown number of chunks to download)
+    - {advance: 1} (one chunk was downloaded)
+    - {downloaded: "10.1 MB/s"} (currently downloading at a rate of 10.1 MB/s)
+    - {file_downloaded: Path(...), written: 1024} (download finished, has the save path and size)
+
+    The rate is the throughput of the track's telemetry (see `telemetry.Telemetry`), which
+    every downloaded byte is added to, along with its total and the segment sizes.
+
+    The data is in the same format accepted by rich's progress.update() function.
+    However, The `downloaded`, `file_downloaded` and `written` keys are custom and not
+    natively accepted by rich progress bars.
+
+    Unlike the requests and curl_impersonate downloaders, each in-flight download is a
+    task on a single event loop rather than a thread, so hundreds of segments can be
+    requested at once. Only HTTP(S) proxies are supported.
+
+    Parameters:
+        urls: Web URL(s) to file(s) to download. You can use a dictionary with the key
+            "url" for the URI, and other keys for extra arguments to use per-URL.
+        output_dir: The folder to save the file into. If the save path's directory does
+            not exist then it will be made automatically.
+        filename: The filename or filename template to use for each file. The variables
+            you can use are `i` for the URL index and `ext` for the URL extension.
+        headers: A mapping of HTTP Header Key/Values to use for all downloads.
+        cookies: A mapping of Cookie Key/Values or a Cookie Jar to use for all downloads.
+        proxy: An optional proxy URI to route connections through for all downloads.
+        max_workers: The maximum amount of downloads to have in-flight at once. Defaults
+            to the `max_concurrent_downloads` aiohttp config, or 100.
+    """
+    if not urls:
+        raise ValueError("urls must be provided and not empty")
+    elif not isinstance(urls, (str, dict, Sequence)):
+        raise TypeError(f"Expected urls to be {str} or {dict} or a list of one of them, not {type(urls)}")
+
+    if not output_dir:
+        raise ValueError("output_dir must be provided")
+    elif not isinstance(output_dir, Path):
+        raise TypeError(f"Expected output_dir to be {Path}, not {type(output_dir)}")
+
+    if not filename:
+        raise ValueError("filename must be provided")
+    elif not isinstance(filename, str):
+        raise TypeError(f"Expected filename to be {str}, not {type(filename)}")
+
+    if not isinstance(headers, (MutableMapping, type(None))):
+        raise TypeError(f"Expected headers to be {MutableMapping}, not {type(headers)}")
+
+    if not isinstance(cookies, (MutableMapping, CookieJar, type(None))):
+        raise TypeError(f"Expected cookies to be {MutableMapping} or {CookieJar}, not {type(cookies)}")
+
+    if not isinstance(proxy, (str, type(None))):
+        raise TypeError(f"Expected proxy to be {str}, not {type(proxy)}")
+    elif proxy and not proxy.lower().startswith(("http://", "https://")):
+        raise ValueError(f"The aiohttp downloader only supports HTTP(S) proxies, not {proxy.split(':')[0]}")
+
+    if not isinstance(max_workers, (int, type(None))):
+        raise TypeError(f"Expected max_workers to be {int}, not {type(max_workers)}")
+
+    debug_logger = get_debug_logger()
+
+    if isinstance(urls, (str, dict)):
+        urls = [urls]
+
+    if not max_workers:
+        max_workers = int(config.aiohttp.get("max_concurrent_downloads", MAX_WORKERS))
+
+    # each URL's dict and save path is only made once it's downloaded
+    urls = DownloadBatch(urls, output_dir, filename)
+
+    headers = {
+        k: v.decode() if isinstance(v, bytes) else str(v)
+        for k, v in (headers or {}).items()
+        if k.lower() != "accept-encoding"
+    }
+
+    if cookies and not isinstance(cookies, CookieJar):
+        cookies = cookiejar_from_dict(cookies)
+
+    if debug_logger:
+        first_url = urls[0].get("url", "") if urls else ""
+        url_display = first_url[:200] + "..." if len(first_url) > 200 else first_url
+        debug_logger.log(
+            level="DEBUG",
+            operation="downloader_aiohttp_start",
+            message="Starting aiohttp download",
+            context={
+                "url_count": len(urls),
+                "first_url": url_display,
+                "output_dir": str(output_dir),
+                "filename": filename,
+                "max_workers": max_workers,
+                "has_proxy": bool(proxy),
+            },
+        )
+
+    # see the requests downloader, single-URL downloads report bytes rather than files
+    segmented_batch = len(urls) > 1
+    if segmented_batch:
+        yield dict(total=len(urls))
+
+    telemetry = get_telemetry()
+    if segmented_batch:
+        telemetry.expect(segments=len(urls))
+
+    downloads = _EventLoopDownloads(
+        urls,
+        headers,
+        cookies,
+        proxy,
+        max_workers,
+        segmented_batch,
+        throttle=bandwidth.get_throttle(),
+        telemetry=telemetry,
+    )
+    downloads.start()
+
+    last_speed_refresh = time.monotonic()
+
+    try:
+        try:
+            while True:
+                if DOWNLOAD_CANCELLED.is_set():
+                    # another track failed or was cancelled
+                    raise KeyboardInterrupt()
+
+                try:
+                    status_update = downloads.updates.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    status_update = {}
+                if status_update is None:
+                    break
+                if status_update:
+                    yield status_update
+
+                now = time.monotonic()
+                if now - last_speed_refresh >= PROGRESS_WINDOW:
+                    yield dict(downloaded=telemetry.get_speed_text())
+                    last_speed_refresh = now
+
+            if downloads.error:
+                raise downloads.error
+        except KeyboardInterrupt:
+            DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+            yield dict(downloaded="[yellow]CANCELLING")
+            downloads.cancel()
+            downloads.join()
+            yield dict(downloaded="[yellow]CANCELLED")
+            # tell dl that it was cancelled
+            raise
+        except Exception as e:
+            DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+            yield dict(downloaded="[red]FAILING")
+            downloads.cancel()
+            downloads.join()
+            yield dict(downloaded="[red]FAILED")
+            if debug_logger:
+                debug_logger.log(
+                    level="ERROR",
+                    operation="downloader_aiohttp_failed",
+                    message=f"aiohttp download failed: {e}",
+                    error=e,
+                    context={
+                        "url_count": len(urls),
+                        "output_dir": str(output_dir),
+                    },
+                )
+            # tell dl that it failed
+            raise
+    finally:
+        # also stops the downloads if the generator was closed early
+        downloads.cancel()
+        downloads.join()
+
+    if debug_logger:
+        debug_logger.log(
+            level="DEBUG",
+            operation="downloader_aiohttp_complete",
+            message="aiohttp download completed successfully",
+            context={
+                "url_count": len(urls),
+                "output_dir": str(output_dir),
+                "filename": filename,
+                "telemetry": telemetry.as_dict(),
+            },
+        )
+
+
+__all__ = ("aiohttp",)
@@ -4,6 +4,7 @@ import subprocess
 import textwrap
 import threading
 import time
+from collections.abc import Sequence
 from functools import partial
 from http.cookiejar import CookieJar
 from pathlib import Path
@@ -255,7 +256,7 @@ def download(
 
     if not urls:
         raise ValueError("urls must be provided and not empty")
-    elif not isinstance(urls, (str, dict, list)):
+    elif not isinstance(urls, (str, dict, Sequence)):
         raise TypeError(f"Expected urls to be {str} or {dict} or a list of one of them, not {type(urls)}")
 
     if not output_dir:
@@ -282,7 +283,7 @@ def download(
     elif not isinstance(max_workers, int):
         raise TypeError(f"Expected max_workers to be {int}, not {type(max_workers)}")
 
-    if not isinstance(urls, list):
+    if isinstance(urls, (str, dict)):
         urls = [urls]
 
     if cookies and not isinstance(cookies, CookieJar):
@@ -309,6 +310,8 @@ def download(
 
     # Build options for each URI and add via RPC
     gids: list[str] = []
+    save_paths: dict[str, Path] = {}
+    existing: list[Path] = []
 
     for i, url in enumerate(urls):
         if isinstance(url, str):
@@ -318,6 +321,12 @@ def download(
 
         url_filename = filename.format(i=i, ext=get_extension(url_data["url"]))
 
+        save_path = output_dir / url_filename
+        if save_path.exists() and not save_path.with_name(f"{save_path.name}.aria2").exists():
+            # if it exists, and no control file, then it should be safe, e.g., a segment kept to resume with
+            existing.append(save_path)
+            continue
+
         opts: dict[str, Any] = {
             "dir": str(output_dir),
             "out": url_filename,
@@ -359,8 +368,14 @@ def download(
         gid = _manager.add_uris([url_data["url"]], opts)
         if gid:
             gids.append(gid)
+            save_paths[gid] = save_path
+
+    yield dict(total=len(gids) + len(existing))
 
-    yield dict(total=len(gids))
+    for save_path in existing:
+        yield dict(file_downloaded=save_path, written=save_path.stat().st_size)
+    if existing:
+        yield dict(completed=len(existing))
 
     completed: set[str] = set()
 
@@ -398,7 +413,9 @@ def download(
                 state = status.get("status")
                 if state in ("complete", "error"):
                     completed.add(gid)
-                    yield dict(completed=len(completed))
+                    yield dict(completed=len(completed) + len(existing))
+                    if state == "complete":
+                        yield dict(file_downloaded=save_paths[gid])
 
                     if state == "error":
                         used_uri = None
@@ -433,10 +450,10 @@ def download(
             # Yield aggregate progress for this call's downloads
             progress_data = {"advance": 0}
 
-            if len(gids) > 1:
+            if len(urls) > 1:
                 # Multi-file mode (e.g., HLS): Return the count of completed segments
-                progress_data["completed"] = len(completed)
-                progress_data["total"] = len(gids)
+                progress_data["completed"] = len(completed) + len(existing)
+                progress_data["total"] = len(gids) + len(existing)
             else:
                 # Single-file mode: Return the total bytes downloaded
                 progress_data["completed"] = total_completed
@@ -489,8 +506,14 @@ def aria2c(
     - {total: 100} (100% download total)
     - {completed: 1} (1% download progress out of 100%)
     - {downloaded: "10.1 MB/s"} (currently downloading at a rate of 10.1 MB/s)
+    - {file_downloaded: Path(...)} (a file finished, has the save path)
 
     The data is in the same format accepted by rich's progress.update() function.
+    However, the `downloaded` and `file_downloaded` keys are custom and not natively
+    accepted by rich progress bars.
+
+    Files that already exist without an aria2 control file are not downloaded again,
+    e.g., the segments kept to resume an interrupted download with.
 
     Parameters:
         urls: Web URL(s) to file(s) to download. You can use a dictionary with the key
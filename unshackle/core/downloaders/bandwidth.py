@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import secrets
+import socket
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Optional, Union
+
+from unshackle.core.config import config
+
+BURST = 1.0  # seconds of bandwidth that may be used at once after being idle
+DEFER_WAIT = 0.05  # seconds to give a waiting higher priority download to take free bandwidth
+# lower is sooner, audio and subtitles are small and needed before muxing can start
+PRIORITIES = {"Subtitle": 0, "Audio": 0, "Attachment": 0, "Video": 1}
+DEFAULT_PRIORITY = 1
+
+ADDRESS_ENV = "UNSHACKLE_BANDWIDTH"  # host:port:secret of the scheduler of the parent process
+JOB_ENV = "UNSHACKLE_BANDWIDTH_JOB"
+
+UNITS = {
+    "": 1,
+    "b": 1,
+    "k": 1000,
+    "kb": 1000,
+    "kib": 1024,
+    "m": 1000**2,
+    "mb": 1000**2,
+    "mib": 1024**2,
+    "g": 1000**3,
+    "gb": 1000**3,
+    "gib": 1024**3,
+}
+
+log = logging.getLogger("bandwidth")
+
+_priority: ContextVar[int] = ContextVar("bandwidth_priority", default=DEFAULT_PRIORITY)
+_lock = threading.Lock()
+_scheduler: Optional[Union[BandwidthScheduler, RemoteScheduler]] = None
+_server: Optional[BandwidthServer] = None
+
+
+def parse_rate(value: Union[int, float, str, None]) -> Optional[int]:
+    """
+    Parse a bandwidth rate to bytes per second, e.g., `5000000`, `"5 MB/s"` or `"4.5MiB"`.
+
+    Units are decimal (KB, MB, GB) like the speeds shown while downloading, or binary
+    (KiB, MiB, GiB). Returns None if there is no rate, i.e., it's unlimited.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        rate = value
+    elif isinstance(value, str):
+        match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmg]?i?b?)(?:/s)?\s*", value, re.IGNORECASE)
+        if not match or match.group(2).lower() not in UNITS:
+            raise ValueError(f"Invalid bandwidth rate {value!r}, expected e.g. 5000000 or '5 MB/s'")
+        rate = float(match.group(1)) * UNITS[match.group(2).lower()]
+    else:
+        raise TypeError(f"Expected rate to be {int} or {str}, not {type(value)}")
+    if rate <= 0:
+        raise ValueError(f"Bandwidth rate must be positive, not {value!r}")
+    return int(rate)
+
+
+class TokenBucket:
+    """Bytes that may be downloaded, refilled at a fixed rate up to BURST seconds worth."""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.capacity = rate * BURST
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waiting: Counter[int] = Counter()  # priorities of the downloads waiting on it
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Get the seconds until there are tokens to take."""
+        return max(0.0, -self.tokens / self.rate)
+
+    def is_deferred(self, priority: int) -> bool:
+        """Check if a download of a higher priority is waiting to take tokens first."""
+        return any(waiting for p, waiting in self.waiting.items() if p < priority)
+
+
+class BandwidthScheduler:
+    """
+    Token-bucket scheduler of download bandwidth shared by all downloads of a process.
+
+    There's a global bucket for the overall rate, and a bucket per job for the rate
+    of each job (a dl run, or an API download job). Downloaded chunks take tokens
+    from the buckets after they're read, so when a bucket is empty the next chunk
+    isn't read until it has refilled.
+
+    Each download has a priority class, see PRIORITIES. When a bucket is contended,
+    the downloads of a higher priority (lower number) class get its tokens first,
+    e.g., audio and subtitles finish before video, so muxing can start sooner.
+
+    Downloads can be throttled at chunk granularity only, so a rate is a long-term
+    average, and a single chunk may put a bucket in debt which is then paid back.
+    """
+
+    def __init__(self, limit: Optional[int] = None, job_limit: Optional[int] = None):
+        """
+        Parameters:
+            limit: The overall rate in bytes per second, if any.
+            job_limit: The default rate of each job in bytes per second, if any.
+        """
+        self.limit = limit
+        self.job_limit = job_limit
+        self._cond = threading.Condition()
+        self._global = TokenBucket(limit) if limit else None
+        self._jobs: dict[Optional[str], Optional[TokenBucket]] = {}
+
+    def set_job_limit(self, job: Optional[str], limit: Optional[int]) -> None:
+        """Set the rate of a job in bytes per second, overriding the default job limit."""
+        with self._cond:
+            self._jobs[job] = TokenBucket(limit) if limit else None
+
+    def remove_job(self, job: Optional[str]) -> None:
+        with self._cond:
+            self._jobs.pop(job, None)
+
+    def _get_buckets(self, job: Optional[str]) -> list[TokenBucket]:
+        if job not in self._jobs:
+            self._jobs[job] = TokenBucket(self.job_limit) if self.job_limit else None
+        return [bucket for bucket in (self._jobs[job], self._global) if bucket]
+
+    def acquire(self, size: int, priority: int = DEFAULT_PRIORITY, job: Optional[str] = None) -> None:
+        """
+        Take size bytes worth of tokens from the buckets of a job, waiting for them if needed.
+
+        Parameters:
+            size: The amount of bytes that were downloaded.
+            priority: The priority class of the download, see PRIORITIES.
+            job: The job the download is for, None being the current process.
+        """
+        with self._cond:
+            buckets = self._get_buckets(job)
+            waiting_on: list[TokenBucket] = []
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = 0.0
+                    for bucket in buckets:
+                        bucket.refill(now)
+                        bucket_wait = bucket.wait_time()
+                        if not bucket_wait and bucket.is_deferred(priority):
+                            bucket_wait = DEFER_WAIT
+                        if bucket_wait:
+                            if bucket not in waiting_on:
+                                bucket.waiting[priority] += 1
+                                waiting_on.append(bucket)
+                            wait = max(wait, bucket_wait)
+                    if not wait:
+                        for bucket in buckets:
+                            bucket.tokens -= size
+                        return
+                    self._cond.wait(wait)
+            finally:
+                for bucket in waiting_on:
+                    bucket.waiting[priority] -= 1
+                if waiting_on:
+                    # lower priority downloads may have been deferring to this one
+                    self._cond.notify_all()
+
+
+class RemoteScheduler:
+    """
+    Client of the BandwidthScheduler of another process, see BandwidthServer.
+
+    Each thread has its own connection, so that downloads wait on their own.
+    """
+
+    def __init__(self, address: str, job: Optional[str] = None):
+        host, port, self.secret = address.rsplit(":", maxsplit=2)
+        self.address = (host, int(port))
+        self.job = job
+        self._local = threading.local()
+        self._failed = False
+
+    def _connect(self) -> Any:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection(self.address)
+            sock.sendall(f"{self.secret}\n".encode())
+            conn = self._local.conn = sock.makefile("rwb")
+        return conn
+
+    def acquire(self, size: int, priority: int = DEFAULT_PRIORITY, job: Optional[str] = None) -> None:
+        if self._failed:
+            return
+        try:
+            conn = self._connect()
+            conn.write(f"{size} {priority} {job or self.job or '-'}\n".encode())
+            conn.flush()
+            if not conn.readline():
+                raise ConnectionError("The bandwidth scheduler closed the connection")
+        except OSError as e:
+            # the parent process is likely shutting down, downloading unthrottled is better than failing
+            self._failed = True
+            log.warning(f"Lost the connection to the bandwidth scheduler, downloading unthrottled: {e}")
+
+
+class BandwidthServer:
+    """
+    Share a BandwidthScheduler with child processes (e.g., API download workers) over a local socket.
+
+    The address has a random secret that clients must send first, and is given to
+    child processes with the env() variables. Each connection has its own thread,
+    sending a line for every chunk of `{size} {priority} {job}`, which is answered
+    with an empty line once the chunk's tokens were taken.
+    """
+
+    def __init__(self, scheduler: BandwidthScheduler):
+        self.scheduler = scheduler
+        self.secret = secrets.token_hex(16)
+        self._sock = socket.create_server(("127.0.0.1", 0))
+        self.address = f"127.0.0.1:{self._sock.getsockname()[1]}:{self.secret}"
+        threading.Thread(target=self._serve, name="bandwidth-server", daemon=True).start()
+
+    def env(self, job: Optional[str] = None) -> dict[str, str]:
+        """Get the environment variables a child process needs to use the scheduler, as a job."""
+        env = {ADDRESS_ENV: self.address}
+        if job:
+            env[JOB_ENV] = job
+        return env
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return  # closed
+            threading.Thread(target=self._handle, args=(client,), name="bandwidth-client", daemon=True).start()
+
+    def _handle(self, client: socket.socket) -> None:
+        with client, client.makefile("rwb") as conn:
+            try:
+                if conn.readline().strip().decode() != self.secret:
+                    return
+                for line in conn:
+                    size, priority, job = line.decode().split()
+                    self.scheduler.acquire(int(size), int(priority), None if job == "-" else job)
+                    conn.write(b"\n")
+                    conn.flush()
+            except (OSError, ValueError):
+                pass  # the client went away or is broken, either way it's done
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+def get_scheduler() -> Optional[Union[BandwidthScheduler, RemoteScheduler]]:
+    """
+    Get the bandwidth scheduler of this process.
+
+    If the process was started by one with a BandwidthServer, it's a client of
+    that. Otherwise it's made from the `bandwidth` config, or None if there are
+    no limits and therefore nothing to schedule.
+    """
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            if os.environ.get(ADDRESS_ENV):
+                _scheduler = RemoteScheduler(os.environ[ADDRESS_ENV], os.environ.get(JOB_ENV))
+            else:
+                limit = parse_rate(config.bandwidth.get("limit"))
+                job_limit = parse_rate(config.bandwidth.get("job_limit"))
+                if limit or job_limit:
+                    _scheduler = BandwidthScheduler(limit, job_limit)
+        return _scheduler
+
+
+def get_server() -> BandwidthServer:
+    """Get the BandwidthServer of this process's scheduler, starting both if needed."""
+    global _scheduler, _server
+    scheduler = get_scheduler()
+    with _lock:
+        if _server is None:
+            if not isinstance(scheduler, BandwidthScheduler):
+                # jobs may have their own limits, even if the process has none
+                scheduler = _scheduler = BandwidthScheduler()
+            _server = BandwidthServer(scheduler)
+        return _server
+
+
+def get_priority(track: Any) -> int:
+    """Get the priority class of a track, see PRIORITIES."""
+    priorities = {**PRIORITIES, **(config.bandwidth.get("priorities") or {})}
+    return int(priorities.get(track.__class__.__name__, DEFAULT_PRIORITY))
+
+
+def set_priority(track: Any) -> None:
+    """Set the priority class of the downloads made by the current thread (or task) to a track's."""
+    _priority.set(get_priority(track))
+
+
+class Throttle:
+    """Throttle the chunks of a download with the scheduler, using the priority class it was made with."""
+
+    def __init__(self, scheduler: Union[BandwidthScheduler, RemoteScheduler], priority: int):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def __call__(self, size: int) -> None:
+        self.scheduler.acquire(size, self.priority)
+
+
+def get_throttle() -> Optional[Throttle]:
+    """
+    Get a Throttle for a download made by the current thread, or None if there are no limits.
+
+    It must be got on the thread of the track's download, as the priority class is
+    taken from it, but it may then be used by any thread.
+    """
+    scheduler = get_scheduler()
+    if not scheduler:
+        return None
+    return Throttle(scheduler, _priority.get())
+
+
+__all__ = (
+    "BandwidthScheduler",
+    "RemoteScheduler",
+    "BandwidthServer",
+    "Throttle",
+    "parse_rate",
+    "get_scheduler",
+    "get_server",
+    "get_priority",
+    "set_priority",
+    "get_throttle",
+)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Union
+
+from unshackle.core.utilities import get_extension
+
+
+class DownloadBatch(Sequence):
+    """
+    The URLs of a download with the path each one is saved to, made when they're read.
+
+    The URLs may be any sequence, e.g., a lazily formatted segment index, so a
+    download of many segments doesn't need a dict and path of each in memory at once.
+    """
+
+    def __init__(self, urls: Sequence[Union[str, dict[str, Any]]], output_dir: Path, filename: str):
+        """
+        Parameters:
+            urls: Web URL(s) of the files, or dicts with a `url` key and other arguments of a download.
+            output_dir: The folder to save the files into.
+            filename: The filename of each file, formatted with its index `{i}` and extension `{ext}`.
+        """
+        self.urls = urls
+        self.output_dir = output_dir
+        self.filename = filename
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict[str, Any], list[dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        url = self.urls[index]
+        url = dict(url) if isinstance(url, dict) else dict(url=url)
+        url["save_path"] = self.output_dir / self.filename.format(i=index, ext=get_extension(url["url"]))
+        return url
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def iter_completed(pool: Executor, fn: Callable[[Any], Any], items: Iterable[Any], window: int) -> Iterator[Future]:
+    """
+    Submit fn for each item to a pool, yielding each future as it completes.
+
+    Unlike `as_completed()` of all submitted futures, only up to window items are
+    submitted at once, the next ones as earlier ones complete, so the futures of a
+    large batch don't all have to be made and held upfront.
+    """
+    items = iter(items)
+    pending = {pool.submit(fn, item) for item in islice(items, max(1, window))}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        pending |= {pool.submit(fn, item) for item in islice(items, len(done))}
+        yield from done
+
+
+__all__ = ("DownloadBatch", "iter_completed")
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from unshackle.core.downloaders import connections
+from unshackle.core.utilities import get_debug_logger
+
+INITIAL_LIMIT = 4
+MIN_GAIN = 0.05  # a round's throughput must beat the last one by 5% for the limit to keep growing
+BACKOFF = 0.5
+THROTTLE_STATUSES = (429, 503)
+MAX_HISTORY = 1000
+
+_lock = threading.Lock()
+_hosts: dict[str, HostConcurrency] = {}
+
+
+class HostConcurrency:
+    """
+    Adaptive (AIMD) limit of the in-flight segment requests to a single host.
+
+    The limit starts at INITIAL_LIMIT and is re-evaluated after every "round", i.e.,
+    once as many requests as the limit have finished. While a round's throughput
+    improves on the last one, the limit grows, doubling at first and by one after
+    the first time it didn't improve or was throttled. It never grows past the
+    amount of connections kept to the host (see `connections.get_pool_size()`).
+
+    When the host throttles us (429, 503 or a timeout), the limit is halved, and
+    if it asked us to with a Retry-After header, no requests are started until
+    then. Only a request that started after the last back off can cause another,
+    so a burst of rejected requests only halves the limit once.
+
+    Every change is kept in `history`, the concurrency and throughput curve.
+    """
+
+    def __init__(self, host: str, max_limit: int):
+        self.host = host
+        self.max_limit = max(1, max_limit)
+        self.limit = min(INITIAL_LIMIT, self.max_limit)
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.history: list[dict[str, Any]] = []
+
+        self._cond = threading.Condition()
+        self._slow_start = True
+        self._generation = 0
+        self._start = time.monotonic()
+        self._last_throughput = 0.0
+        self._reset_round()
+
+    def _reset_round(self) -> None:
+        self._round_start = time.monotonic()
+        self._round_bytes = 0
+        self._round_requests = 0
+
+    def _record(self, reason: str, throughput: Optional[float] = None) -> None:
+        entry = {
+            "time": round(time.monotonic() - self._start, 3),
+            "limit": self.limit,
+            "throughput": round(throughput) if throughput is not None else None,
+            "reason": reason,
+        }
+        self.history.append(entry)
+        del self.history[:-MAX_HISTORY]
+
+        debug_logger = get_debug_logger()
+        if debug_logger:
+            debug_logger.log(
+                level="DEBUG",
+                operation="downloader_concurrency_change",
+                message=f"Concurrency to {self.host} is now {self.limit} ({reason})",
+                context={"host": self.host, "max_limit": self.max_limit, **entry},
+            )
+
+    def acquire(self) -> int:
+        """
+        Wait for a free slot, and take it.
+
+        Returns the slot's generation, which must be passed back to release().
+        """
+        with self._cond:
+            while True:
+                wait = self.resume_at - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.in_flight >= self.limit:
+                    self._cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+            return self._generation
+
+    def release(
+        self, generation: int, size: int = 0, throttled: bool = False, retry_after: Optional[float] = None
+    ) -> None:
+        """
+        Give back a slot once its request has finished.
+
+        Parameters:
+            generation: The generation returned by acquire().
+            size: The amount of bytes that were downloaded, if it succeeded.
+            throttled: If the host rejected or timed out the request.
+            retry_after: The seconds the host asked to wait for, if it did.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if retry_after and retry_after > 0:
+                self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+            if throttled:
+                if generation == self._generation:
+                    self._back_off()
+            elif size:
+                self._round_bytes += size
+                self._round_requests += 1
+                if self._round_requests >= self.limit:
+                    self._end_round()
+            self._cond.notify_all()
+
+    def _back_off(self) -> None:
+        self._generation += 1
+        self._slow_start = False
+        self.limit = max(1, int(self.limit * BACKOFF))
+        self._last_throughput = 0.0
+        self._reset_round()
+        self._record("throttled")
+
+    def _end_round(self) -> None:
+        throughput = self._round_bytes / max(time.monotonic() - self._round_start, 1e-3)
+        improved = throughput > self._last_throughput * (1 + MIN_GAIN)
+        self._last_throughput = throughput
+        self._reset_round()
+
+        if not improved:
+            self._slow_start = False
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit * 2 if self._slow_start else self.limit + 1)
+            self._record("improved", throughput)
+
+    def as_dict(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "host": self.host,
+                "limit": self.limit,
+                "max_limit": self.max_limit,
+                "history": list(self.history),
+            }
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def get_limiter(url: str, max_workers: int) -> HostConcurrency:
+    """
+    Get the process-wide concurrency limit of the host of a URL.
+
+    Every download to the same host shares it. If a download allows more workers
+    than it was made with, its maximum is raised to suit.
+
+    Parameters:
+        url: A URL on the host.
+        max_workers: The amount of threads the download will use.
+    """
+    host = get_host(url)
+    max_limit = connections.get_pool_size(max_workers)
+    with _lock:
+        limiter = _hosts.get(host)
+        if not limiter:
+            limiter = _hosts[host] = HostConcurrency(host, max_limit)
+    if limiter.max_limit < max_limit:
+        with limiter._cond:
+            limiter.max_limit = max(limiter.max_limit, max_limit)
+    return limiter
+
+
+def get_stats() -> list[dict[str, Any]]:
+    """Get the current limit, and the curve of concurrency and throughput, of every host used so far."""
+    with _lock:
+        limiters = list(_hosts.values())
+    return [x.as_dict() for x in limiters]
+
+
+__all__ = ("HostConcurrency", "THROTTLE_STATUSES", "get_limiter", "get_stats")
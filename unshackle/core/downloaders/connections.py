@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+POOL_HOSTS = 32  # per-host pools to keep, so CDNs that spread segments over many hosts keep them warm
+
+_lock = threading.Lock()
+_adapters: dict[Optional[str], SharedHTTPAdapter] = {}
+_stats: dict[tuple[str, Optional[str]], PoolStats] = {}
+_concurrent_downloads = 1
+
+
+class PoolStats:
+    """
+    Counters of the pooled connections to a single (host, proxy) pair.
+
+    - hits: requests that re-used an idle connection that was still open.
+    - misses: requests that had to open a connection, or re-open a dropped one.
+    - handshakes: connections made, each a TCP and, for HTTPS, a TLS handshake.
+    """
+
+    def __init__(self, host: str, proxy: Optional[str]):
+        self.host = host
+        self.proxy = proxy
+        self.hits = 0
+        self.misses = 0
+        self.handshakes = 0
+
+    def count(self, name: str) -> None:
+        with _lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "host": self.host,
+            "proxy": self.proxy,
+            "requests": self.hits + self.misses,
+            "hits": self.hits,
+            "misses": self.misses,
+            "handshakes": self.handshakes,
+        }
+
+
+def _strip_credentials(proxy: str) -> str:
+    """Remove the username and password from a proxy URI, so it can be logged."""
+    parts = urlsplit(proxy)
+    if not parts.username and not parts.password:
+        return proxy
+    netloc = parts.hostname or ""
+    if parts.port:
+        netloc += f":{parts.port}"
+    return parts._replace(netloc=netloc).geturl()
+
+
+def _get_stats(host: str, port: Optional[int], proxy: Optional[str]) -> PoolStats:
+    if port:
+        host = f"{host}:{port}"
+    if proxy:
+        proxy = _strip_credentials(proxy)
+    with _lock:
+        stats = _stats.get((host, proxy))
+        if not stats:
+            stats = _stats[(host, proxy)] = PoolStats(host, proxy)
+    return stats
+
+
+class _CountingConnection:
+    stats: Optional[PoolStats] = None
+
+    def connect(self) -> None:
+        super().connect()  # type: ignore[misc]
+        if self.stats:
+            self.stats.count("handshakes")
+
+
+class _CountingHTTPConnection(_CountingConnection, HTTPConnection):
+    pass
+
+
+class _CountingHTTPSConnection(_CountingConnection, HTTPSConnection):
+    pass
+
+
+class _CountingPool:
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)  # type: ignore[call-arg]
+        self.stats = _get_stats(self.host, self.port, self.proxy.url if self.proxy else None)  # type: ignore
+
+    def _get_conn(self, timeout: Optional[float] = None) -> Any:
+        conn = super()._get_conn(timeout)  # type: ignore[misc]
+        conn.stats = self.stats
+        # a connection from the pool keeps its socket, new or dropped ones have none
+        self.stats.count("hits" if conn.sock is not None else "misses")
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPool, HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(_CountingPool, HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+POOL_CLASSES = {"http": _CountingHTTPConnectionPool, "https": _CountingHTTPSConnectionPool}
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose urllib3 connection pools count their hits, misses and handshakes.
+
+    SOCKS proxies use urllib3's own SOCKS pool classes, so they aren't counted.
+    """
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = POOL_CLASSES
+
+    def proxy_manager_for(self, proxy: str, **proxy_kwargs: Any) -> Any:
+        new = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if new and not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = POOL_CLASSES
+        return manager
+
+
+def set_concurrent_downloads(downloads: int) -> None:
+    """Set the amount of tracks that may download at once, to size the shared pools with."""
+    global _concurrent_downloads
+    if not isinstance(downloads, int):
+        raise TypeError(f"Expected downloads to be {int}, not {type(downloads)}")
+    _concurrent_downloads = max(1, downloads)
+
+
+def get_pool_size(max_workers: int) -> int:
+    """Get the amount of connections to keep per host, for every track that may download at once."""
+    return max_workers * _concurrent_downloads
+
+
+def get_adapter(proxy: Optional[str], max_workers: int) -> HTTPAdapter:
+    """
+    Get the process-wide HTTPAdapter for a proxy (or no proxy).
+
+    Every download using the same proxy shares the adapter, and with it the open
+    connections to each host. Each host's pool holds up to max_workers connections
+    for every track that may download at once (see set_concurrent_downloads()). If
+    a download needs more than that, a larger adapter replaces it for any downloads
+    started after it, while running downloads finish on the old one.
+
+    Parameters:
+        proxy: The proxy URI that will be used with the adapter, if any.
+        max_workers: The amount of threads the download will use.
+    """
+    maxsize = get_pool_size(max_workers)
+    with _lock:
+        adapter = _adapters.get(proxy)
+        if not adapter or adapter._pool_maxsize < maxsize:
+            adapter = _adapters[proxy] = SharedHTTPAdapter(
+                pool_connections=POOL_HOSTS, pool_maxsize=maxsize, pool_block=True
+            )
+    return adapter
+
+
+def get_stats() -> list[dict[str, Any]]:
+    """Get the hit, miss and handshake counts of every (host, proxy) pair used so far."""
+    with _lock:
+        stats = list(_stats.values())
+    return [x.as_dict() for x in stats]
+
+
+__all__ = ("PoolStats", "SharedHTTPAdapter", "set_concurrent_downloads", "get_pool_size", "get_adapter", "get_stats")
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Iterable, Optional
+from zlib import crc32
+
+CONTROL_SUFFIX = ".!dev"
+JOURNAL_NAME = f".segments{CONTROL_SUFFIX}"
+CONTROL_VERSION = 1
+
+
+def _strip_query(url: str) -> str:
+    """Remove the query from a URL, as tokens and signatures may change between runs."""
+    return url.split("?", maxsplit=1)[0]
+
+
+class ControlFile:
+    """
+    Download control data of a single file, stored next to it as `{name}.!dev`.
+
+    The control file exists for as long as the file is incomplete. It records the URL
+    being downloaded, the byte offset that is known to be written to disk, the final
+    size (if known), and the response validator (ETag or Last-Modified) so that the
+    download can be continued with a `Range` request instead of starting over.
+
+    An empty or unreadable control file (e.g., from older versions) means the file
+    cannot be trusted and must be downloaded again.
+    """
+
+    def __init__(self, save_path: Path):
+        self.save_path = save_path
+        self.path = save_path.with_name(f"{save_path.name}{CONTROL_SUFFIX}")
+        self.url: Optional[str] = None
+        self.offset = 0
+        self.length: Optional[int] = None
+        self.validator: Optional[str] = None
+        self.resumable = True
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> bool:
+        """Load the control data from disk. Returns False if it's missing or unusable."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf8"))
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get("version") != CONTROL_VERSION:
+            return False
+
+        self.url = data.get("url")
+        self.offset = int(data.get("offset") or 0)
+        self.length = data.get("length")
+        self.validator = data.get("validator")
+        self.resumable = bool(data.get("resumable", True))
+        return True
+
+    def save(self) -> None:
+        """Atomically write the control data to disk."""
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        temp_path.write_text(
+            json.dumps(
+                {
+                    "version": CONTROL_VERSION,
+                    "url": self.url,
+                    "offset": self.offset,
+                    "length": self.length,
+                    "validator": self.validator,
+                    "resumable": self.resumable,
+                }
+            ),
+            encoding="utf8",
+        )
+        os.replace(temp_path, self.path)
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def reset(self, url: str) -> None:
+        """Start over, discarding any partial data."""
+        self.save_path.unlink(missing_ok=True)
+        self.url = url
+        self.offset = 0
+        self.length = None
+        self.validator = None
+        self.resumable = True
+
+    def matches(self, url: str) -> bool:
+        """Check if the control data is for the given URL."""
+        return bool(self.url) and _strip_query(self.url) == _strip_query(url)
+
+    def resume_offset(self) -> int:
+        """
+        Get the offset to continue downloading from.
+
+        The partial file is truncated to the last offset recorded as safely written,
+        as anything past it may be incomplete. Returns 0 if it cannot be continued.
+        """
+        if not self.resumable or not self.save_path.exists():
+            self.offset = 0
+            return 0
+
+        offset = min(self.offset, self.save_path.stat().st_size)
+        with open(self.save_path, "r+b") as f:
+            f.truncate(offset)
+        self.offset = offset
+        return offset
+
+    def checkpoint(self, offset: int) -> None:
+        """Record that all data up to offset has been written to disk."""
+        self.offset = offset
+        self.save()
+
+    def range_kwargs(self, kwargs: dict[str, Any], offset: int) -> dict[str, Any]:
+        """
+        Get the session.get() keyword arguments to request the data from offset onwards.
+
+        An existing `Range` header (e.g., for byte-range segments) is shifted forward
+        rather than replaced. An `If-Range` header is used when a validator is known so
+        that a changed resource is sent in full instead of being spliced together.
+        """
+        headers = dict(kwargs.get("headers") or {})
+        range_header = next((k for k in headers if k.lower() == "range"), None)
+        if range_header:
+            start, _, end = headers.pop(range_header).removeprefix("bytes=").partition("-")
+            headers["Range"] = f"bytes={int(start or 0) + offset}-{end}"
+        else:
+            headers["Range"] = f"bytes={offset}-"
+        if self.validator:
+            headers["If-Range"] = self.validator
+
+        return {**kwargs, "headers": headers}
+
+
+class SegmentJournal:
+    """
+    Append-only record of the finished segments of a segmented track download.
+
+    The journal is stored as `.segments.!dev` in the track's segment directory. The
+    first line is a JSON header with a fingerprint of the segment list, and each
+    following line is `{index} {size}` for a segment that has finished downloading.
+
+    Segments that are assembled while downloading also get an assembly checkpoint,
+    `@{index} {range_size} {discontinuity_size}`, stating the last segment that was
+    assembled and the size of the output files at that point. A `@-` line marks the
+    start of an operation that rewrites an output file (e.g., decryption), and until
+    the next checkpoint the assembled data cannot be trusted.
+
+    A journal with a different fingerprint (e.g., the manifest was changed) is thrown
+    away along with all the segment data it was protecting.
+    """
+
+    def __init__(self, directory: Path, urls: Iterable[dict[str, Any]]):
+        self.directory = directory
+        self.path = directory / JOURNAL_NAME
+        self.fingerprint = self.get_fingerprint(urls)
+        self.finished: dict[int, int] = {}
+        self.assembled: Optional[tuple[int, int, int]] = None
+        self.assembly_lost = False
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (directory / JOURNAL_NAME).exists()
+
+    @staticmethod
+    def get_fingerprint(urls: Iterable[dict[str, Any]]) -> str:
+        checksum = 0
+        for url in urls:
+            byte_range = next((v for k, v in (url.get("headers") or {}).items() if k.lower() == "range"), "")
+            checksum = crc32(f"{_strip_query(url['url'])}|{byte_range}\n".encode(), checksum)
+        return f"{checksum:08x}"
+
+    def open(self) -> dict[int, int]:
+        """
+        Load the finished segments of a previous run, or start a new journal.
+
+        Returns a mapping of finished segment indices to their sizes.
+        """
+        self.finished = {}
+        self.assembled = None
+        self.assembly_lost = False
+        header: Optional[dict] = None
+
+        if self.path.exists():
+            lines = self.path.read_text(encoding="utf8").splitlines()
+            try:
+                header = json.loads(lines[0]) if lines else None
+            except ValueError:
+                header = None
+            if isinstance(header, dict) and header.get("fingerprint") == self.fingerprint:
+                for line in lines[1:]:
+                    if line == "@-":
+                        self.assembled = None
+                        self.assembly_lost = True
+                        continue
+                    if line.startswith("@"):
+                        try:
+                            index, range_size, discontinuity_size = (int(x) for x in line[1:].split(" "))
+                        except ValueError:
+                            continue  # likely a partially written line
+                        self.assembled = (index, range_size, discontinuity_size)
+                        self.assembly_lost = False
+                        continue
+                    try:
+                        index, size = (int(x) for x in line.split(" "))
+                    except ValueError:
+                        continue  # likely a partially written line
+                    self.finished[index] = size
+            else:
+                header = None
+
+        if header is None:
+            # nothing we can verify, so start from nothing
+            self.reset()
+
+        return self.finished
+
+    def reset(self) -> None:
+        """Delete everything in the journal's directory and start a new journal."""
+        self.finished = {}
+        self.assembled = None
+        self.assembly_lost = False
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps({"version": CONTROL_VERSION, "fingerprint": self.fingerprint}) + "\n", encoding="utf8"
+        )
+
+    def prune(self, segment_dir: Path) -> int:
+        """
+        Delete segment files that cannot be verified as finished or continued.
+
+        Finished segments must be journaled with a matching size, and unfinished
+        segments must have a control file to continue from. Returns the amount of
+        verified finished segments that were kept.
+        """
+        if not segment_dir.exists():
+            return 0
+
+        verified = 0
+        for file in segment_dir.iterdir():
+            if not file.is_file() or file == self.path or file.name.endswith((CONTROL_SUFFIX, f"{CONTROL_SUFFIX}.tmp")):
+                continue
+            if ControlFile(file).exists():
+                continue
+            index = self.get_index(file)
+            if index is not None and self.finished.get(index) == file.stat().st_size:
+                verified += 1
+                continue
+            file.unlink()
+
+        return verified
+
+    def record(self, file: Path) -> None:
+        """Record a segment file as finished."""
+        index = self.get_index(file)
+        if index is None or not file.exists():
+            return
+        size = file.stat().st_size
+        if self.finished.get(index) == size:
+            return
+        self.finished[index] = size
+        self._append(f"{index} {size}")
+
+    def record_assembled(self, index: int, range_size: int, discontinuity_size: int) -> None:
+        """Record that all segments up to index have been assembled into the output files."""
+        self.assembled = (index, range_size, discontinuity_size)
+        self.assembly_lost = False
+        self._append(f"@{index} {range_size} {discontinuity_size}")
+
+    def record_rewrite(self) -> None:
+        """Record that an output file is about to be rewritten, e.g., decrypted."""
+        self.assembly_lost = True
+        self._append("@-")
+
+    def _append(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf8") as f:
+            f.write(f"{line}\n")
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    @staticmethod
+    def get_index(file: Path) -> Optional[int]:
+        stem = file.name.split(".", maxsplit=1)[0]
+        return int(stem) if stem.isdigit() else None
+
+
+__all__ = ("ControlFile", "SegmentJournal", "CONTROL_SUFFIX", "JOURNAL_NAME")
@@ -1,40 +1,57 @@
-import math
+import os
+import threading
 import time
-from concurrent import futures
+from collections.abc import Sequence
 from concurrent.futures.thread import ThreadPoolExecutor
 from http.cookiejar import CookieJar
 from pathlib import Path
-from typing import Any, Generator, MutableMapping, Optional, Union
+from typing import Any, Generator, Iterable, MutableMapping, Optional, Union
 
-from curl_cffi.requests import Session
-from rich import filesize
+from curl_cffi.requests import Response, Session
+from curl_cffi.requests.exceptions import Timeout
 
 from unshackle.core.config import config
 from unshackle.core.constants import DOWNLOAD_CANCELLED
-from unshackle.core.utilities import get_debug_logger, get_extension
+from unshackle.core.downloaders import bandwidth, concurrency
+from unshackle.core.downloaders.bandwidth import Throttle
+from unshackle.core.downloaders.batch import DownloadBatch, iter_completed
+from unshackle.core.downloaders.concurrency import THROTTLE_STATUSES, HostConcurrency
+from unshackle.core.downloaders.streaming import stream_to_file
+from unshackle.core.downloaders.telemetry import Telemetry, get_telemetry
+from unshackle.core.session import get_retry_after
+from unshackle.core.utilities import get_debug_logger
 
 MAX_ATTEMPTS = 5
 RETRY_WAIT = 2
-CHUNK_SIZE = 1024
-PROGRESS_WINDOW = 5
+PROGRESS_WINDOW = 1
 BROWSER = config.curl_impersonate.get("browser", "chrome124")
 
 
-def download(url: str, save_path: Path, session: Session, **kwargs: Any) -> Generator[dict[str, Any], None, None]:
+def download(
+    url: str,
+    save_path: Path,
+    session: Session,
+    segmented: bool = False,
+    limiter: Optional[HostConcurrency] = None,
+    throttle: Optional[Throttle] = None,
+    telemetry: Optional[Telemetry] = None,
+    **kwargs: Any,
+) -> Generator[dict[str, Any], None, None]:
     """
     Download files using Curl Impersonate.
     https://github.com/lwthiker/curl-impersonate
 
-    Yields the following download status updates while chunks are downloading:
+    Yields the following download status updates while data is downloading:
 
-    - {total: 123} (there are 123 chunks to download)
-    - {total: None} (there are an unknown number of chunks to download)
-    - {advance: 1} (one chunk was downloaded)
-    - {downloaded: "10.1 MB/s"} (currently downloading at a rate of 10.1 MB/s)
+    - {total: 123} (there are 123 bytes to download)
+    - {total: None} (there are an unknown number of bytes to download)
+    - {advance: 1024} (1024 more bytes were downloaded)
     - {file_downloaded: Path(...), written: 1024} (download finished, has the save path and size)
 
-    The data is in the same format accepted by rich's progress.update() function. The
-    `downloaded` key is custom and is not natively accepted by all rich progress bars.
+    The data is in the same format accepted by rich's progress.update() function.
+    The download speed is not yielded, it's measured by the telemetry instead.
+
+    Data is streamed to disk in large adaptive blocks, see `streaming.stream_to_file`.
 
     Parameters:
         url: Web URL of a file to download.
@@ -43,10 +60,17 @@ def download(url: str, save_path: Path, session: Session, **kwargs: Any) -> Gene
         session: The Requests or Curl-Impersonate Session to make HTTP requests with.
             Useful to set Header, Cookie, and Proxy data. Connections are saved and
             re-used with the session so long as the server keeps the connection alive.
+        segmented: If downloads are segments or parts of one bigger file.
+        limiter: The concurrency limit of the URL's host to wait for before each
+            request, and to report throughput and throttling back to.
+        throttle: The bandwidth scheduler's throttle to pass each downloaded chunk to.
+        telemetry: The telemetry of the track to add the downloaded bytes to.
         kwargs: Any extra keyword arguments to pass to the session.get() call. Use this
             for one-time request changes like a header, cookie, or proxy. For example,
             to request Byte-ranges use e.g., `headers={"Range": "bytes=0-128"}`.
     """
+    telemetry = telemetry or Telemetry()
+
     save_dir = save_path.parent
     control_file = save_path.with_name(f"{save_path.name}.!dev")
 
@@ -58,7 +82,12 @@ def download(url: str, save_path: Path, session: Session, **kwargs: Any) -> Gene
         control_file.unlink()
     elif save_path.exists():
         # if it exists, and no control file, then it should be safe
-        yield dict(file_downloaded=save_path, written=save_path.stat().st_size)
+        size = save_path.stat().st_size
+        telemetry.add_existing(size)
+        if segmented:
+            telemetry.add_segment(size)
+        yield dict(file_downloaded=save_path, written=size)
+        return
 
     # TODO: Design a control file format so we know how much of the file is missing
     control_file.write_bytes(b"")
@@ -67,10 +96,29 @@ def download(url: str, save_path: Path, session: Session, **kwargs: Any) -> Gene
     try:
         while True:
             written = 0
-            download_sizes = []
-            last_speed_refresh = time.time()
 
+            stream = None
+            slot = limiter.acquire() if limiter else None
             try:
+                if segmented:
+                    # a streamed request can deadlock curl_cffi when the response ends before its
+                    # reader thread is set up, which small segments on busy pools often do, so
+                    # segments are written as curl receives them on this thread instead
+                    stream, written = _download_body(url, save_path, session, throttle, telemetry, **kwargs)
+                    stream.raise_for_status()
+                    content_length = int(stream.headers.get("Content-Length") or 0)
+                    if stream.headers.get("Content-Encoding", "").lower() in ["gzip", "deflate", "br"]:
+                        content_length = 0
+                    if content_length and written < content_length:
+                        raise IOError(f"Failed to read {content_length} bytes from the track URI.")
+                    if slot is not None:
+                        limiter.release(slot, size=written)
+                        slot = None
+                    telemetry.add_segment(written)
+                    yield dict(advance=written)
+                    yield dict(file_downloaded=save_path, written=written)
+                    break
+
                 stream = session.get(url, stream=True, **kwargs)
                 stream.raise_for_status()
 
@@ -85,45 +133,76 @@ def download(url: str, save_path: Path, session: Session, **kwargs: Any) -> Gene
                     content_length = 0
 
                 if content_length > 0:
-                    yield dict(total=math.ceil(content_length / CHUNK_SIZE))
+                    if not segmented:
+                        telemetry.expect(total=content_length)
+                    yield dict(total=content_length)
                 else:
-                    # we have no data to calculate total chunks
+                    # we have no data to calculate total bytes
                     yield dict(total=None)  # indeterminate mode
 
                 with open(save_path, "wb") as f:
-                    for chunk in stream.iter_content(chunk_size=CHUNK_SIZE):
-                        download_size = len(chunk)
-                        f.write(chunk)
+                    for download_size in stream_to_file(stream, f, content_length):
                         written += download_size
+                        telemetry.add(download_size)
 
-                        yield dict(advance=1)
+                        if throttle:
+                            throttle(download_size)
 
-                        now = time.time()
-                        time_since = now - last_speed_refresh
-
-                        download_sizes.append(download_size)
-                        if time_since > PROGRESS_WINDOW or download_size < CHUNK_SIZE:
-                            data_size = sum(download_sizes)
-                            download_speed = math.ceil(data_size / (time_since or 1))
-                            yield dict(downloaded=f"{filesize.decimal(download_speed)}/s")
-                            last_speed_refresh = now
-                            download_sizes.clear()
+                        yield dict(advance=download_size)
 
                 if content_length and written < content_length:
                     raise IOError(f"Failed to read {content_length} bytes from the track URI.")
 
+                if slot is not None:
+                    limiter.release(slot, size=written)
+                    slot = None
+
+                if segmented:
+                    telemetry.add_segment(written)
                 yield dict(file_downloaded=save_path, written=written)
                 break
             except Exception as e:
+                if slot is not None:
+                    throttled = isinstance(e, Timeout) or getattr(stream, "status_code", None) in THROTTLE_STATUSES
+                    retry_after = get_retry_after(stream.headers) if stream is not None else None
+                    limiter.release(slot, throttled=throttled, retry_after=retry_after)
+                    slot = None
                 save_path.unlink(missing_ok=True)
                 if DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS:
                     raise e
                 time.sleep(RETRY_WAIT)
                 attempts += 1
+            finally:
+                if slot is not None:
+                    limiter.release(slot)
     finally:
         control_file.unlink()
 
 
+def _download_body(
+    url: str,
+    save_path: Path,
+    session: Session,
+    throttle: Optional[Throttle],
+    telemetry: Telemetry,
+    **kwargs: Any,
+) -> tuple[Response, int]:
+    """Download a URL to a file as curl receives it, returning the response and bytes written."""
+    written = 0
+    with open(save_path, "wb") as f:
+
+        def on_chunk(chunk: bytes) -> None:
+            nonlocal written
+            f.write(chunk)
+            written += len(chunk)
+            telemetry.add(len(chunk))
+            if throttle:
+                throttle(len(chunk))
+
+        res = session.get(url, content_callback=on_chunk, **kwargs)
+    return res, written
+
+
 def curl_impersonate(
     urls: Union[str, list[str], dict[str, Any], list[dict[str, Any]]],
     output_dir: Path,
@@ -145,6 +224,9 @@ def curl_impersonate(
     - {downloaded: "10.1 MB/s"} (currently downloading at a rate of 10.1 MB/s)
     - {file_downloaded: Path(...), written: 1024} (download finished, has the save path and size)
 
+    The rate is the throughput of the track's telemetry (see `telemetry.Telemetry`), which
+    every downloaded byte is added to, along with its total and the segment sizes.
+
     The data is in the same format accepted by rich's progress.update() function.
     However, The `downloaded`, `file_downloaded` and `written` keys are custom and not
     natively accepted by rich progress bars.
@@ -160,11 +242,12 @@ def curl_impersonate(
         cookies: A mapping of Cookie Key/Values or a Cookie Jar to use for all downloads.
         proxy: An optional proxy URI to route connections through for all downloads.
         max_workers: The maximum amount of threads to use for downloads. Defaults to
-            min(32,(cpu_count+4)).
+            min(32,(cpu_count+4)). How many of them request segments from a host at
+            once adapts to its throughput and throttling, see `HostConcurrency`.
     """
     if not urls:
         raise ValueError("urls must be provided and not empty")
-    elif not isinstance(urls, (str, dict, list)):
+    elif not isinstance(urls, (str, dict, Sequence)):
         raise TypeError(f"Expected urls to be {str} or {dict} or a list of one of them, not {type(urls)}")
 
     if not output_dir:
@@ -191,25 +274,56 @@ def curl_impersonate(
 
     debug_logger = get_debug_logger()
 
-    if not isinstance(urls, list):
+    if isinstance(urls, (str, dict)):
         urls = [urls]
 
-    urls = [
-        dict(save_path=save_path, **url) if isinstance(url, dict) else dict(url=url, save_path=save_path)
-        for i, url in enumerate(urls)
-        for save_path in [
-            output_dir / filename.format(i=i, ext=get_extension(url["url"] if isinstance(url, dict) else url))
-        ]
-    ]
+    if not max_workers:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+    # each URL's dict and save path is only made once it's downloaded
+    urls = DownloadBatch(urls, output_dir, filename)
 
-    session = Session(impersonate=BROWSER)
     if headers:
         headers = {k: v for k, v in headers.items() if k.lower() != "accept-encoding"}
-        session.headers.update(headers)
-    if cookies:
-        session.cookies.update(cookies)
-    if proxy:
-        session.proxies.update({"all": proxy})
+
+    # curl sessions can't be shared between threads, so each of the pool's threads gets its own
+    sessions: list[Session] = []
+    local = threading.local()
+
+    def get_session() -> Session:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = Session(impersonate=BROWSER)
+            if headers:
+                session.headers.update(headers)
+            if cookies:
+                session.cookies.update(cookies)
+            if proxy:
+                session.proxies.update({"all": proxy})
+            sessions.append(session)
+        return session
+
+    throttle = bandwidth.get_throttle()
+    telemetry = get_telemetry()
+    if len(urls) > 1:
+        telemetry.expect(segments=len(urls))
+
+    def run(url: dict[str, Any]) -> Iterable[dict[str, Any]]:
+        if len(urls) == 1:
+            # a single file is streamed by the caller, so its progress is per-chunk
+            return download(session=get_session(), throttle=throttle, telemetry=telemetry, **url)
+        # segments download in full on the pool's threads, as many at once as their host allows
+        limiter = concurrency.get_limiter(url["url"], max_workers)
+        return list(
+            download(
+                session=get_session(),
+                segmented=True,
+                limiter=limiter,
+                throttle=throttle,
+                telemetry=telemetry,
+                **url,
+            )
+        )
 
     if debug_logger:
         first_url = urls[0].get("url", "") if urls else ""
@@ -231,66 +345,62 @@ def curl_impersonate(
 
     yield dict(total=len(urls))
 
-    download_sizes = []
-    last_speed_refresh = time.time()
+    last_speed_refresh = time.monotonic()
 
-    with ThreadPoolExecutor(max_workers=max_workers) as pool:
-        for i, future in enumerate(
-            futures.as_completed((pool.submit(download, session=session, **url) for url in urls))
-        ):
-            file_path, download_size = None, None
-            try:
-                for status_update in future.result():
-                    if status_update.get("file_downloaded") and status_update.get("written"):
-                        file_path = status_update["file_downloaded"]
-                        download_size = status_update["written"]
-                    elif len(urls) == 1:
-                        # these are per-chunk updates, only useful if it's one big file
-                        yield status_update
-            except KeyboardInterrupt:
-                DOWNLOAD_CANCELLED.set()  # skip pending track downloads
-                yield dict(downloaded="[yellow]CANCELLING")
-                pool.shutdown(wait=True, cancel_futures=True)
-                yield dict(downloaded="[yellow]CANCELLED")
-                # tell dl that it was cancelled
-                # the pool is already shut down, so exiting loop is fine
-                raise
-            except Exception as e:
-                DOWNLOAD_CANCELLED.set()  # skip pending track downloads
-                yield dict(downloaded="[red]FAILING")
-                pool.shutdown(wait=True, cancel_futures=True)
-                yield dict(downloaded="[red]FAILED")
-                if debug_logger:
-                    debug_logger.log(
-                        level="ERROR",
-                        operation="downloader_curl_impersonate_failed",
-                        message=f"curl_impersonate download failed: {e}",
-                        error=e,
-                        context={
-                            "url_count": len(urls),
-                            "output_dir": str(output_dir),
-                            "browser": BROWSER,
-                        },
-                    )
-                # tell dl that it failed
-                # the pool is already shut down, so exiting loop is fine
-                raise
-            else:
-                yield dict(file_downloaded=file_path)
-                yield dict(advance=1)
-
-                now = time.time()
-                time_since = now - last_speed_refresh
-
-                if download_size:  # no size == skipped dl
-                    download_sizes.append(download_size)
-
-                if download_sizes and (time_since > PROGRESS_WINDOW or i == len(urls)):
-                    data_size = sum(download_sizes)
-                    download_speed = math.ceil(data_size / (time_since or 1))
-                    yield dict(downloaded=f"{filesize.decimal(download_speed)}/s")
-                    last_speed_refresh = now
-                    download_sizes.clear()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for future in iter_completed(pool, run, urls, window=max_workers * 2):
+                file_path = None
+                try:
+                    for status_update in future.result():
+                        if status_update.get("file_downloaded") and status_update.get("written"):
+                            file_path = status_update["file_downloaded"]
+                        elif len(urls) == 1:
+                            # these are per-chunk updates, only useful if it's one big file
+                            yield status_update
+                            now = time.monotonic()
+                            if now - last_speed_refresh >= PROGRESS_WINDOW:
+                                yield dict(downloaded=telemetry.get_speed_text())
+                                last_speed_refresh = now
+                except KeyboardInterrupt:
+                    DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+                    yield dict(downloaded="[yellow]CANCELLING")
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    yield dict(downloaded="[yellow]CANCELLED")
+                    # tell dl that it was cancelled
+                    # the pool is already shut down, so exiting loop is fine
+                    raise
+                except Exception as e:
+                    DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+                    yield dict(downloaded="[red]FAILING")
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    yield dict(downloaded="[red]FAILED")
+                    if debug_logger:
+                        debug_logger.log(
+                            level="ERROR",
+                            operation="downloader_curl_impersonate_failed",
+                            message=f"curl_impersonate download failed: {e}",
+                            error=e,
+                            context={
+                                "url_count": len(urls),
+                                "output_dir": str(output_dir),
+                                "browser": BROWSER,
+                            },
+                        )
+                    # tell dl that it failed
+                    # the pool is already shut down, so exiting loop is fine
+                    raise
+                else:
+                    yield dict(file_downloaded=file_path)
+                    yield dict(advance=1)
+
+                    now = time.monotonic()
+                    if now - last_speed_refresh >= PROGRESS_WINDOW:
+                        yield dict(downloaded=telemetry.get_speed_text())
+                        last_speed_refresh = now
+    finally:
+        for session in sessions:
+            session.close()
 
     if debug_logger:
         debug_logger.log(
@@ -301,6 +411,8 @@ def curl_impersonate(
                 "url_count": len(urls),
                 "output_dir": str(output_dir),
                 "filename": filename,
+                "concurrency": concurrency.get_stats(),
+                "telemetry": telemetry.as_dict(),
             },
         )
 
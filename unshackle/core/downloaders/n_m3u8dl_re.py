@@ -2,6 +2,7 @@ import os
 import re
 import subprocess
 import warnings
+from collections.abc import Sequence
 from http.cookiejar import CookieJar
 from pathlib import Path
 from typing import Any, Generator, MutableMapping
@@ -258,7 +259,7 @@ def download(
 
     if not urls:
         raise ValueError("urls must be provided and not empty")
-    if not isinstance(urls, (str, dict, list)):
+    if not isinstance(urls, (str, dict, Sequence)):
         raise TypeError(f"Expected urls to be str, dict, or list, not {type(urls)}")
     if not isinstance(output_dir, Path):
         raise TypeError(f"Expected output_dir to be Path, not {type(output_dir)}")
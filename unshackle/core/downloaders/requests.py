@@ -1,45 +1,62 @@
-import math
 import os
 import time
-from concurrent.futures import as_completed
+from collections.abc import Sequence
 from concurrent.futures.thread import ThreadPoolExecutor
 from http.cookiejar import CookieJar
 from pathlib import Path
-from typing import Any, Generator, MutableMapping, Optional, Union
+from typing import Any, Generator, Iterable, MutableMapping, Optional, Union
 
 from requests import Session
-from requests.adapters import HTTPAdapter
-from rich import filesize
+from requests.exceptions import Timeout
 
 from unshackle.core.constants import DOWNLOAD_CANCELLED
-from unshackle.core.utilities import get_debug_logger, get_extension
+from unshackle.core.downloaders import bandwidth, concurrency, connections
+from unshackle.core.downloaders.bandwidth import Throttle
+from unshackle.core.downloaders.batch import DownloadBatch, iter_completed
+from unshackle.core.downloaders.concurrency import THROTTLE_STATUSES, HostConcurrency
+from unshackle.core.downloaders.control import ControlFile
+from unshackle.core.downloaders.streaming import stream_to_file
+from unshackle.core.downloaders.telemetry import Telemetry, get_telemetry
+from unshackle.core.session import get_retry_after
+from unshackle.core.utilities import get_debug_logger
 
 MAX_ATTEMPTS = 5
 RETRY_WAIT = 2
-CHUNK_SIZE = 1024
-PROGRESS_WINDOW = 5
-
-DOWNLOAD_SIZES = []
-LAST_SPEED_REFRESH = time.time()
+CHECKPOINT_SIZE = 16 * 1024 * 1024
+PROGRESS_WINDOW = 1
 
 
 def download(
-    url: str, save_path: Path, session: Optional[Session] = None, segmented: bool = False, **kwargs: Any
+    url: str,
+    save_path: Path,
+    session: Optional[Session] = None,
+    segmented: bool = False,
+    limiter: Optional[HostConcurrency] = None,
+    throttle: Optional[Throttle] = None,
+    telemetry: Optional[Telemetry] = None,
+    **kwargs: Any,
 ) -> Generator[dict[str, Any], None, None]:
     """
     Download a file using Python Requests.
     https://requests.readthedocs.io
 
-    Yields the following download status updates while chunks are downloading:
+    Yields the following download status updates while data is downloading:
 
-    - {total: 123} (there are 123 chunks to download)
-    - {total: None} (there are an unknown number of chunks to download)
-    - {advance: 1} (one chunk was downloaded)
-    - {downloaded: "10.1 MB/s"} (currently downloading at a rate of 10.1 MB/s)
+    - {total: 123} (there are 123 bytes to download)
+    - {total: None} (there are an unknown number of bytes to download)
+    - {advance: 1024} (1024 more bytes were downloaded)
     - {file_downloaded: Path(...), written: 1024} (download finished, has the save path and size)
 
-    The data is in the same format accepted by rich's progress.update() function. The
-    `downloaded` key is custom and is not natively accepted by all rich progress bars.
+    When segmented, only a single {advance: 1} is yielded once the file has finished.
+
+    The data is in the same format accepted by rich's progress.update() function.
+    The download speed is not yielded, it's measured by the telemetry instead.
+
+    Data is streamed to disk in large adaptive blocks, see `streaming.stream_to_file`.
+
+    While downloading, a control file (`{name}.!dev`) records how much of the file
+    has been written. If the download is interrupted, the partial file is kept and
+    the next attempt, or call, continues from it with a `Range` request.
 
     Parameters:
         url: Web URL of a file to download.
@@ -49,105 +66,138 @@ def download(
             Cookie, and Proxy data. Connections are saved and re-used with the session
             so long as the server keeps the connection alive.
         segmented: If downloads are segments or parts of one bigger file.
+        limiter: The concurrency limit of the URL's host to wait for before each
+            request, and to report throughput and throttling back to.
+        throttle: The bandwidth scheduler's throttle to pass each downloaded chunk to.
+        telemetry: The telemetry of the track to add the downloaded bytes to.
         kwargs: Any extra keyword arguments to pass to the session.get() call. Use this
             for one-time request changes like a header, cookie, or proxy. For example,
             to request Byte-ranges use e.g., `headers={"Range": "bytes=0-128"}`.
     """
-    global LAST_SPEED_REFRESH
-
     session = session or Session()
+    telemetry = telemetry or Telemetry()
 
     save_dir = save_path.parent
-    control_file = save_path.with_name(f"{save_path.name}.!dev")
+    control = ControlFile(save_path)
 
     save_dir.mkdir(parents=True, exist_ok=True)
 
-    if control_file.exists():
-        # consider the file corrupt if the control file exists
-        save_path.unlink(missing_ok=True)
-        control_file.unlink()
+    if control.exists():
+        # a previous attempt was interrupted, continue from it if it can be trusted
+        if not control.load() or not control.matches(url):
+            control.reset(url)
     elif save_path.exists():
         # if it exists, and no control file, then it should be safe
-        yield dict(file_downloaded=save_path, written=save_path.stat().st_size)
-        # TODO: This should return, potential recovery bug
-
-    # TODO: Design a control file format so we know how much of the file is missing
-    control_file.write_bytes(b"")
+        size = save_path.stat().st_size
+        telemetry.add_existing(size)
+        if segmented:
+            telemetry.add_segment(size)
+        yield dict(file_downloaded=save_path, written=size)
+        if segmented:
+            yield dict(advance=1)
+        return
+    else:
+        control.reset(url)
+
+    control.save()
 
     attempts = 1
-    try:
-        while True:
-            written = 0
+    while True:
+        offset = control.resume_offset()
+        written = offset
+        if attempts == 1:
+            # data from earlier attempts was counted as it was downloaded
+            telemetry.add_existing(offset)
+
+        stream = None
+        slot = limiter.acquire() if limiter else None
+        try:
+            # if everything was written, but we were stopped before finishing up, there's nothing to request
+            if not (offset and control.length and offset >= control.length):
+                stream = session.get(url, stream=True, **(control.range_kwargs(kwargs, offset) if offset else kwargs))
+                stream.raise_for_status()
 
-            # these are for single-url speed calcs only
-            download_sizes = []
-            last_speed_refresh = time.time()
+                if offset and stream.status_code != 206:
+                    # the range was ignored, or the resource changed, so it's being sent in full
+                    offset = written = 0
 
-            try:
-                stream = session.get(url, stream=True, **kwargs)
-                stream.raise_for_status()
+                compressed = stream.headers.get("Content-Encoding", "").lower() in ["gzip", "deflate", "br"]
+                try:
+                    content_length = int(stream.headers.get("Content-Length", "0"))
 
-                if not segmented:
-                    try:
-                        content_length = int(stream.headers.get("Content-Length", "0"))
-
-                        # Skip Content-Length validation for compressed responses since
-                        # requests automatically decompresses but Content-Length shows compressed size
-                        if stream.headers.get("Content-Encoding", "").lower() in ["gzip", "deflate", "br"]:
-                            content_length = 0
-                    except ValueError:
+                    # Skip Content-Length validation for compressed responses since
+                    # requests automatically decompresses but Content-Length shows compressed size
+                    if compressed:
                         content_length = 0
+                except ValueError:
+                    content_length = 0
+
+                # byte offsets of decompressed data cannot be used to continue a compressed response
+                control.resumable = not compressed
+                control.length = offset + content_length if content_length else None
+                control.validator = stream.headers.get("ETag") or stream.headers.get("Last-Modified")
+                control.checkpoint(offset)
 
+                if not segmented:
                     if content_length > 0:
-                        yield dict(total=math.ceil(content_length / CHUNK_SIZE))
+                        telemetry.expect(total=offset + content_length)
+                        yield dict(total=offset + content_length, completed=offset)
                     else:
-                        # we have no data to calculate total chunks
+                        # we have no data to calculate total bytes
                         yield dict(total=None)  # indeterminate mode
 
-                with open(save_path, "wb") as f:
-                    for chunk in stream.iter_content(chunk_size=CHUNK_SIZE):
-                        download_size = len(chunk)
-                        f.write(chunk)
+                with open(save_path, "ab" if offset else "wb") as f:
+                    for download_size in stream_to_file(stream, f, content_length):
                         written += download_size
+                        telemetry.add(download_size)
+
+                        if throttle:
+                            throttle(download_size)
+
+                        if written - control.offset >= CHECKPOINT_SIZE:
+                            f.flush()
+                            control.checkpoint(written)
 
                         if not segmented:
-                            yield dict(advance=1)
-                            now = time.time()
-                            time_since = now - last_speed_refresh
-                            download_sizes.append(download_size)
-                            if time_since > PROGRESS_WINDOW or download_size < CHUNK_SIZE:
-                                data_size = sum(download_sizes)
-                                download_speed = math.ceil(data_size / (time_since or 1))
-                                yield dict(downloaded=f"{filesize.decimal(download_speed)}/s")
-                                last_speed_refresh = now
-                                download_sizes.clear()
-
-                if not segmented and content_length and written < content_length:
+                            yield dict(advance=download_size)
+
+                if not segmented and content_length and written < offset + content_length:
                     raise IOError(f"Failed to read {content_length} bytes from the track URI.")
 
-                yield dict(file_downloaded=save_path, written=written)
-
-                if segmented:
-                    yield dict(advance=1)
-                    now = time.time()
-                    time_since = now - LAST_SPEED_REFRESH
-                    if written:  # no size == skipped dl
-                        DOWNLOAD_SIZES.append(written)
-                    if DOWNLOAD_SIZES and time_since > PROGRESS_WINDOW:
-                        data_size = sum(DOWNLOAD_SIZES)
-                        download_speed = math.ceil(data_size / (time_since or 1))
-                        yield dict(downloaded=f"{filesize.decimal(download_speed)}/s")
-                        LAST_SPEED_REFRESH = now
-                        DOWNLOAD_SIZES.clear()
-                break
-            except Exception as e:
-                save_path.unlink(missing_ok=True)
-                if DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS:
-                    raise e
-                time.sleep(RETRY_WAIT)
-                attempts += 1
-    finally:
-        control_file.unlink()
+            if slot is not None:
+                limiter.release(slot, size=written - offset)
+                slot = None
+
+            control.delete()
+            if segmented:
+                telemetry.add_segment(written)
+            yield dict(file_downloaded=save_path, written=written)
+
+            if segmented:
+                yield dict(advance=1)
+            break
+        except Exception as e:
+            if slot is not None:
+                throttled = isinstance(e, Timeout) or getattr(stream, "status_code", None) in THROTTLE_STATUSES
+                retry_after = get_retry_after(stream.headers) if stream is not None else None
+                limiter.release(slot, throttled=throttled, retry_after=retry_after)
+                slot = None
+            if stream is not None:
+                # an unread response holds on to its connection, and the pool blocks when it runs out
+                stream.close()
+            # keep what made it to disk so the next attempt, or the next run, can continue from it
+            if control.resumable and save_path.exists():
+                control.checkpoint(save_path.stat().st_size)
+            else:
+                control.reset(url)
+                control.save()
+            if DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS:
+                raise e
+            time.sleep(RETRY_WAIT)
+            attempts += 1
+        finally:
+            if slot is not None:
+                limiter.release(slot)
 
 
 def requests(
@@ -171,6 +221,9 @@ def requests(
     - {downloaded: "10.1 MB/s"} (currently downloading at a rate of 10.1 MB/s)
     - {file_downloaded: Path(...), written: 1024} (download finished, has the save path and size)
 
+    The rate is the throughput of the track's telemetry (see `telemetry.Telemetry`), which
+    every downloaded byte is added to, along with its total and the segment sizes.
+
     The data is in the same format accepted by rich's progress.update() function.
     However, The `downloaded`, `file_downloaded` and `written` keys are custom and not
     natively accepted by rich progress bars.
@@ -186,11 +239,12 @@ def requests(
         cookies: A mapping of Cookie Key/Values or a Cookie Jar to use for all downloads.
         proxy: An optional proxy URI to route connections through for all downloads.
         max_workers: The maximum amount of threads to use for downloads. Defaults to
-            min(32,(cpu_count+4)).
+            min(32,(cpu_count+4)). How many of them request segments from a host at
+            once adapts to its throughput and throttling, see `HostConcurrency`.
     """
     if not urls:
         raise ValueError("urls must be provided and not empty")
-    elif not isinstance(urls, (str, dict, list)):
+    elif not isinstance(urls, (str, dict, Sequence)):
         raise TypeError(f"Expected urls to be {str} or {dict} or a list of one of them, not {type(urls)}")
 
     if not output_dir:
@@ -217,22 +271,18 @@ def requests(
 
     debug_logger = get_debug_logger()
 
-    if not isinstance(urls, list):
+    if isinstance(urls, (str, dict)):
         urls = [urls]
 
     if not max_workers:
         max_workers = min(32, (os.cpu_count() or 1) + 4)
 
-    urls = [
-        dict(save_path=save_path, **url) if isinstance(url, dict) else dict(url=url, save_path=save_path)
-        for i, url in enumerate(urls)
-        for save_path in [
-            output_dir / filename.format(i=i, ext=get_extension(url["url"] if isinstance(url, dict) else url))
-        ]
-    ]
+    # each URL's dict and save path is only made once it's downloaded
+    urls = DownloadBatch(urls, output_dir, filename)
 
+    # connections are pooled process-wide, so tracks from the same hosts share them
     session = Session()
-    session.mount("https://", HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, pool_block=True))
+    session.mount("https://", connections.get_adapter(proxy, max_workers))
     session.mount("http://", session.adapters["https://"])
 
     if headers:
@@ -267,54 +317,74 @@ def requests(
     if segmented_batch:
         yield dict(total=len(urls))
 
-    try:
-        with ThreadPoolExecutor(max_workers=max_workers) as pool:
-            for future in as_completed(
-                pool.submit(download, session=session, segmented=segmented_batch, **url) for url in urls
-            ):
-                try:
-                    yield from future.result()
-                except KeyboardInterrupt:
-                    DOWNLOAD_CANCELLED.set()  # skip pending track downloads
-                    yield dict(downloaded="[yellow]CANCELLING")
-                    pool.shutdown(wait=True, cancel_futures=True)
-                    yield dict(downloaded="[yellow]CANCELLED")
-                    # tell dl that it was cancelled
-                    # the pool is already shut down, so exiting loop is fine
-                    raise
-                except Exception as e:
-                    DOWNLOAD_CANCELLED.set()  # skip pending track downloads
-                    yield dict(downloaded="[red]FAILING")
-                    pool.shutdown(wait=True, cancel_futures=True)
-                    yield dict(downloaded="[red]FAILED")
-                    if debug_logger:
-                        debug_logger.log(
-                            level="ERROR",
-                            operation="downloader_requests_failed",
-                            message=f"Requests download failed: {e}",
-                            error=e,
-                            context={
-                                "url_count": len(urls),
-                                "output_dir": str(output_dir),
-                            },
-                        )
-                    # tell dl that it failed
-                    # the pool is already shut down, so exiting loop is fine
-                    raise
-
-        if debug_logger:
-            debug_logger.log(
-                level="DEBUG",
-                operation="downloader_requests_complete",
-                message="Requests download completed successfully",
-                context={
-                    "url_count": len(urls),
-                    "output_dir": str(output_dir),
-                    "filename": filename,
-                },
-            )
-    finally:
-        DOWNLOAD_SIZES.clear()
+    throttle = bandwidth.get_throttle()
+    telemetry = get_telemetry()
+    if segmented_batch:
+        telemetry.expect(segments=len(urls))
+
+    def run(url: dict[str, Any]) -> Iterable[dict[str, Any]]:
+        if not segmented_batch:
+            # a single file is streamed by the caller, so its progress is per-chunk
+            return download(session=session, throttle=throttle, telemetry=telemetry, **url)
+        # segments download in full on the pool's threads, as many at once as their host allows
+        limiter = concurrency.get_limiter(url["url"], max_workers)
+        return list(
+            download(session=session, segmented=True, limiter=limiter, throttle=throttle, telemetry=telemetry, **url)
+        )
+
+    last_speed_refresh = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for future in iter_completed(pool, run, urls, window=max_workers * 2):
+            try:
+                for status_update in future.result():
+                    yield status_update
+                    now = time.monotonic()
+                    if now - last_speed_refresh >= PROGRESS_WINDOW:
+                        yield dict(downloaded=telemetry.get_speed_text())
+                        last_speed_refresh = now
+            except KeyboardInterrupt:
+                DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+                yield dict(downloaded="[yellow]CANCELLING")
+                pool.shutdown(wait=True, cancel_futures=True)
+                yield dict(downloaded="[yellow]CANCELLED")
+                # tell dl that it was cancelled
+                # the pool is already shut down, so exiting loop is fine
+                raise
+            except Exception as e:
+                DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+                yield dict(downloaded="[red]FAILING")
+                pool.shutdown(wait=True, cancel_futures=True)
+                yield dict(downloaded="[red]FAILED")
+                if debug_logger:
+                    debug_logger.log(
+                        level="ERROR",
+                        operation="downloader_requests_failed",
+                        message=f"Requests download failed: {e}",
+                        error=e,
+                        context={
+                            "url_count": len(urls),
+                            "output_dir": str(output_dir),
+                        },
+                    )
+                # tell dl that it failed
+                # the pool is already shut down, so exiting loop is fine
+                raise
+
+    if debug_logger:
+        debug_logger.log(
+            level="DEBUG",
+            operation="downloader_requests_complete",
+            message="Requests download completed successfully",
+            context={
+                "url_count": len(urls),
+                "output_dir": str(output_dir),
+                "filename": filename,
+                "connection_pools": connections.get_stats(),
+                "concurrency": concurrency.get_stats(),
+                "telemetry": telemetry.as_dict(),
+            },
+        )
 
 
 __all__ = ("requests",)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import time
+from typing import Any, AsyncGenerator, BinaryIO, Generator, Optional
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+TARGET_READ_TIME = 0.25  # seconds, keeps progress responsive on slow connections
+COMPRESSED_ENCODINGS = ("gzip", "deflate", "br")
+
+
+class ChunkSize:
+    """
+    Adaptive read size for streaming a response to disk.
+
+    It starts at MIN_CHUNK_SIZE (or the content length, if smaller) and then follows
+    the measured throughput so that each read takes about TARGET_READ_TIME, within
+    MIN_CHUNK_SIZE and MAX_CHUNK_SIZE. Fast connections get fewer, larger reads and
+    writes, while slow connections still report progress regularly.
+    """
+
+    def __init__(self, content_length: Optional[int] = None):
+        self.size = MIN_CHUNK_SIZE
+        if content_length:
+            self.size = max(1, min(self.size, content_length))
+
+    def update(self, read: int, elapsed: float) -> None:
+        """Adjust the size based on how long it took to read `read` bytes."""
+        if read < self.size:
+            # short reads are the end of the stream, not a sign of speed
+            return
+        if elapsed <= 0:
+            target = MAX_CHUNK_SIZE
+        else:
+            target = int(read / elapsed * TARGET_READ_TIME)
+        self.size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, target))
+
+
+def stream_to_file(stream: Any, f: BinaryIO, content_length: Optional[int] = None) -> Generator[int, None, None]:
+    """
+    Write a streamed HTTP response to a file, yielding the amount of bytes written.
+
+    When the raw stream supports it and the response is not content-encoded, data is
+    read with readinto() into a single reusable buffer, so no per-chunk bytes objects
+    are made. Otherwise iter_content() is used, and the (likely small) chunks it gives
+    are coalesced in a buffer so that the file is still written in large blocks.
+
+    Parameters:
+        stream: A streamed Requests or Curl-Impersonate Response object.
+        f: The file object to write to.
+        content_length: The expected amount of bytes, if known, to size the first read.
+    """
+    chunk_size = ChunkSize(content_length)
+    raw = getattr(stream, "raw", None)
+    encoded = stream.headers.get("Content-Encoding", "").lower() in COMPRESSED_ENCODINGS
+
+    if raw is not None and hasattr(raw, "readinto") and not encoded:
+        buffer = memoryview(bytearray(MAX_CHUNK_SIZE))
+        while True:
+            start = time.perf_counter()
+            read = raw.readinto(buffer[: chunk_size.size])
+            if not read:
+                break
+            f.write(buffer[:read])
+            chunk_size.update(read, time.perf_counter() - start)
+            yield read
+        return
+
+    pending = bytearray()
+    start = time.perf_counter()
+    for chunk in stream.iter_content(chunk_size=chunk_size.size):
+        pending += chunk
+        if len(pending) >= chunk_size.size:
+            f.write(pending)
+            chunk_size.update(len(pending), time.perf_counter() - start)
+            yield len(pending)
+            pending.clear()
+            start = time.perf_counter()
+    if pending:
+        f.write(pending)
+        yield len(pending)
+
+
+async def astream_to_file(stream: Any, f: BinaryIO, content_length: Optional[int] = None) -> AsyncGenerator[int, None]:
+    """
+    Write a streamed aiohttp response to a file, yielding the amount of bytes written.
+
+    The chunks aiohttp gives are whatever has arrived so far, so like the iter_content()
+    path of `stream_to_file`, they are coalesced in a buffer and written in large blocks.
+
+    Parameters:
+        stream: A streamed aiohttp ClientResponse object.
+        f: The file object to write to.
+        content_length: The expected amount of bytes, if known, to size the first read.
+    """
+    chunk_size = ChunkSize(content_length)
+    pending = bytearray()
+    start = time.perf_counter()
+    async for chunk in stream.content.iter_chunked(chunk_size.size):
+        pending += chunk
+        if len(pending) >= chunk_size.size:
+            f.write(pending)
+            chunk_size.update(len(pending), time.perf_counter() - start)
+            yield len(pending)
+            pending.clear()
+            start = time.perf_counter()
+    if pending:
+        f.write(pending)
+        yield len(pending)
+
+
+__all__ = ("ChunkSize", "stream_to_file", "astream_to_file")
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from rich import filesize
+
+SAMPLE_INTERVAL = 0.5  # seconds of data to measure a throughput sample over
+SPEED_HALF_LIFE = 5.0  # seconds for a throughput sample to lose half its weight
+MIN_EXTRAPOLATE = 0.05  # fraction of segments to finish before their sizes are trusted over the estimate
+
+_current: ContextVar[Optional[Telemetry]] = ContextVar("telemetry", default=None)
+_lock = threading.Lock()
+_started: list[Telemetry] = []
+
+
+class Telemetry:
+    """
+    Thread-safe byte progress and throughput of the download of a single track.
+
+    Downloaders add every chunk of data with add(), and the data that was already
+    on disk (resumed or skipped files) with add_existing(), from any thread.
+
+    The total is exact when known (e.g., from Content-Length), otherwise it's an
+    estimate from the duration and bitrate of the track, replaced by the average
+    size of its finished segments once enough of them finished. The speed is an
+    exponentially weighted moving average (EWMA) of the throughput, so it isn't
+    thrown off by a single slow or fast segment, and the ETA is based on it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.downloaded = 0  # bytes downloaded
+        self.existing = 0  # bytes that were already on disk
+        self.total: Optional[int] = None
+        self.estimate: Optional[int] = None
+        self.segments: Optional[int] = None
+        self.segments_done = 0
+        self.segments_size = 0
+        self.speed: Optional[float] = None
+        self.started = False
+        self.finished = False
+        self._sample_time = time.monotonic()
+        self._sample_bytes = 0
+        self._average = 0.0  # EWMA starting from 0, biased towards 0 until enough time has passed
+        self._weight = 0.0  # total weight of the samples in the EWMA, to correct that bias
+
+    def start(self) -> None:
+        """Mark the download as started, adding it to the process's downloads (see `get_summary()`)."""
+        with self._lock:
+            self._sample_time = time.monotonic()
+            self._sample_bytes = self.downloaded
+            self.finished = False
+            if self.started:
+                return
+            self.started = True
+        with _lock:
+            _started.append(self)
+
+    def finish(self) -> None:
+        """Mark the download as finished, it's no longer part of the throughput of the process."""
+        with self._lock:
+            self.finished = True
+
+    def expect(
+        self,
+        total: Optional[int] = None,
+        segments: Optional[int] = None,
+        duration: Optional[float] = None,
+        bitrate: Optional[int] = None,
+    ) -> None:
+        """
+        Set what is known about the size of the download.
+
+        Parameters:
+            total: The exact size in bytes.
+            segments: The amount of segments (files) it's downloaded in.
+            duration: The duration in seconds, to estimate the size with the bitrate.
+            bitrate: The average bitrate in bits per second.
+        """
+        with self._lock:
+            if total:
+                self.total = total
+            if segments:
+                self.segments = segments
+            if duration and bitrate:
+                self.estimate = int(duration * bitrate / 8)
+
+    def add(self, size: int) -> None:
+        """Add bytes that were downloaded."""
+        with self._lock:
+            self.downloaded += size
+            now = time.monotonic()
+            elapsed = now - self._sample_time
+            if elapsed >= SAMPLE_INTERVAL:
+                self._average, self._weight = self._get_average(now)
+                self.speed = self._average / self._weight
+                self._sample_time = now
+                self._sample_bytes = self.downloaded
+
+    def add_existing(self, size: int) -> None:
+        """Add bytes that were already on disk, e.g., of a resumed download."""
+        with self._lock:
+            self.existing += size
+
+    def add_segment(self, size: int) -> None:
+        """Add a finished segment, with the size of the whole file."""
+        with self._lock:
+            self.segments_done += 1
+            self.segments_size += size
+
+    def _get_average(self, now: float) -> tuple[float, float]:
+        elapsed = now - self._sample_time
+        rate = (self.downloaded - self._sample_bytes) / elapsed
+        # the weight is by time, so the average doesn't depend on how often it's sampled
+        weight = 1 - 0.5 ** (elapsed / SPEED_HALF_LIFE)
+        return self._average + weight * (rate - self._average), self._weight + weight * (1 - self._weight)
+
+    def get_speed(self) -> Optional[float]:
+        """Get the average throughput in bytes per second, if any data was downloaded."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._sample_time < SAMPLE_INTERVAL:
+                return self.speed
+            # include the time since the last sample, so a stalled download slows down
+            average, weight = self._get_average(now)
+            return average / weight
+
+    def get_speed_text(self) -> str:
+        """Get the average throughput as text, e.g., `10.1 MB/s`."""
+        return f"{filesize.decimal(round(self.get_speed() or 0))}/s"
+
+    def get_completed(self) -> int:
+        with self._lock:
+            return self.downloaded + self.existing
+
+    def get_total(self) -> Optional[int]:
+        """Get the exact or estimated total size in bytes, if it can be known."""
+        with self._lock:
+            if self.total:
+                return self.total
+            if (
+                self.segments
+                and self.segments_done
+                and (not self.estimate or self.segments_done >= self.segments * MIN_EXTRAPOLATE)
+            ):
+                return int(self.segments_size / self.segments_done * self.segments)
+            return self.estimate
+
+    def get_eta(self) -> Optional[float]:
+        """Get the estimated seconds until the download finishes."""
+        total, completed, speed = self.get_total(), self.get_completed(), self.get_speed()
+        if not total or not speed:
+            return None
+        return max(0.0, (total - completed) / speed)
+
+    def as_dict(self) -> dict[str, Any]:
+        speed, eta = self.get_speed(), self.get_eta()
+        return {
+            "completed": self.get_completed(),
+            "total": self.get_total(),
+            "speed": round(speed) if speed is not None else None,
+            "eta": round(eta, 1) if eta is not None else None,
+        }
+
+
+def get_telemetry() -> Telemetry:
+    """
+    Get the Telemetry of the track being downloaded by the current thread (or task).
+
+    If there is none, e.g., it's not a track download, a new one is returned. It must
+    be got on the thread of the track's download, but may then be used by any thread.
+    """
+    return _current.get() or Telemetry()
+
+
+def set_telemetry(telemetry: Telemetry) -> None:
+    """Set the Telemetry of the downloads made by the current thread (or task)."""
+    _current.set(telemetry)
+
+
+def get_summary() -> dict[str, Any]:
+    """
+    Get the combined progress of every download this process has started.
+
+    The total only includes the downloads that have started, and is None until all
+    of them know their total. The speed is that of the unfinished downloads.
+    """
+    with _lock:
+        telemetries = list(_started)
+    completed, total, speed = 0, 0, 0.0
+    for telemetry in telemetries:
+        telemetry_completed = telemetry.get_completed()
+        completed += telemetry_completed
+        if telemetry.finished:
+            # its size is known now, and its estimate may have been off
+            if total is not None:
+                total += telemetry_completed
+            continue
+        telemetry_total = telemetry.get_total()
+        total = total + max(telemetry_total, telemetry_completed) if total is not None and telemetry_total else None
+        speed += telemetry.get_speed() or 0
+    eta = max(0.0, (total - completed) / speed) if total and speed else None
+    return {
+        "downloads": len(telemetries),
+        "finished": sum(telemetry.finished for telemetry in telemetries),
+        "completed": completed,
+        "total": total or None,
+        "speed": round(speed),
+        "eta": round(eta, 1) if eta is not None else None,
+    }
+
+
+__all__ = ("Telemetry", "get_telemetry", "set_telemetry", "get_summary")
@@ -7,10 +7,14 @@ import math
 import re
 import shutil
 import sys
-from copy import copy, deepcopy
+import threading
+from array import array
+from collections.abc import Sequence
+from copy import copy
 from functools import partial
+from io import BytesIO
 from pathlib import Path
-from typing import Any, Callable, Optional, Union
+from typing import Any, Callable, Iterator, Optional, Union
 from urllib.parse import urljoin, urlparse
 from uuid import UUID
 from zlib import crc32
@@ -28,13 +32,161 @@ from requests import Session
 from unshackle.core.cdm.detect import is_playready_cdm
 from unshackle.core.constants import DOWNLOAD_CANCELLED, DOWNLOAD_LICENCE_ONLY, AnyTrack
 from unshackle.core.downloaders import requests as requests_downloader
+from unshackle.core.downloaders.control import SegmentJournal
 from unshackle.core.drm import DRM_T, PlayReady, Widevine
 from unshackle.core.events import events
 from unshackle.core.tracks import Audio, Subtitle, Tracks, Video
 from unshackle.core.utilities import get_debug_logger, is_close_match, try_ensure_utf8
+from unshackle.core.utils.concat import ConcatWriter
 from unshackle.core.utils.xml import load_xml
 
 
+class SegmentIndex(Sequence):
+    """
+    Compact sequence of the segments of a Representation, as the URL dicts downloaders take.
+
+    Segments of a SegmentTemplate are only stored as their $Time$ values in an
+    array, and their URLs are formatted from the template when read, so a long
+    SegmentTimeline doesn't need a string, tuple, and dict in memory per segment.
+    Segments of a SegmentList or SegmentBase are stored as given.
+    """
+
+    def __init__(
+        self,
+        media: Optional[str] = None,
+        start_number: int = 1,
+        count: int = 0,
+        times: Optional[array] = None,
+        urls: Optional[list[tuple[str, Optional[str]]]] = None,
+    ):
+        """
+        Parameters:
+            media: The media URL template, with any fields but $Number$ and $Time$ already replaced.
+            start_number: The $Number$ of the first segment.
+            count: The amount of segments of the template.
+            times: The $Time$ of each segment of the template, or None to use its $Number$.
+            urls: The URL and byte range of each segment, instead of a template.
+        """
+        self.media = media
+        self.start_number = start_number
+        self.times = times
+        self.urls = urls or []
+        self.count = count if media else len(self.urls)
+        if times is not None:
+            self.count = min(self.count, len(times))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict[str, Any], list[dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("segment index out of range")
+        if self.media is None:
+            url, byte_range = self.urls[index]
+            return {"url": url, "headers": {"Range": f"bytes={byte_range}"} if byte_range else {}}
+        number = self.start_number + index
+        time = self.times[index] if self.times is not None else number
+        return {"url": DASH.replace_fields(self.media, Number=number, Time=time), "headers": {}}
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(self.count):
+            yield self[i]
+
+    @property
+    def has_byte_ranges(self) -> bool:
+        return any(byte_range is not None for _, byte_range in self.urls)
+
+
+class MPDNode:
+    """
+    An element of an MPD with the attributes and child elements it inherits.
+
+    A Representation inherits attributes like codecs and mimeType, and elements
+    like ContentProtection and SegmentTemplate, from its AdaptationSet. The
+    attributes are merged, and the children grouped by tag, once per element in
+    a single pass over it, instead of searching both elements for every lookup.
+    """
+
+    __slots__ = ("element", "parent", "attrib", "children")
+
+    def __init__(self, element: Element, parent: Optional[MPDNode] = None):
+        """
+        Parameters:
+            element: The element, e.g., an AdaptationSet or Representation.
+            parent: The node of the element it inherits from, e.g., the AdaptationSet of a Representation.
+        """
+        self.element = element
+        self.parent = parent
+        self.attrib: dict[str, str] = {**parent.attrib, **element.attrib} if parent else dict(element.attrib)
+        self.children: dict[str, list[Element]] = {}
+        for child in element:
+            if isinstance(child.tag, str):  # skip comments and processing instructions
+                self.children.setdefault(child.tag, []).append(child)
+
+    def get(self, item: str) -> Optional[str]:
+        """Get an attribute of the element, otherwise of its parents."""
+        return self.attrib.get(item)
+
+    def find(self, tag: str) -> Optional[Element]:
+        """Get the first child element with a tag, otherwise the first of its parent's."""
+        children = self.children.get(tag)
+        if children:
+            return children[0]
+        if self.parent:
+            return self.parent.find(tag)
+        return None
+
+    def findall(self, tag: str) -> list[Element]:
+        """Get all child elements with a tag, followed by those of its parents."""
+        children = self.children.get(tag, [])
+        if self.parent:
+            return children + self.parent.findall(tag)
+        return list(children)
+
+
+class FilteredManifest:
+    """
+    An MPD without the Periods that were filtered out of it, serialized once for all of its tracks.
+
+    The Periods are skipped while the MPD is written, so the parsed manifest
+    is neither copied nor changed.
+    """
+
+    def __init__(self, manifest: Element, period_ids: list[str]):
+        """
+        Parameters:
+            manifest: The MPD element.
+            period_ids: IDs of the Periods to leave out. It may still be added to until the data is first read.
+        """
+        self.manifest = manifest
+        self.period_ids = period_ids
+        self._data: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self) -> bytes:
+        """The filtered MPD document."""
+        with self._lock:
+            if self._data is None:
+                period_ids = set(self.period_ids)
+                buffer = BytesIO()
+                with etree.xmlfile(buffer, encoding="UTF-8") as xf:
+                    xf.write_declaration()
+                    with xf.element(self.manifest.tag, dict(self.manifest.attrib), nsmap=self.manifest.nsmap):
+                        if self.manifest.text:
+                            xf.write(self.manifest.text)
+                        for child in self.manifest:
+                            if child.tag == "Period" and child.get("id") in period_ids:
+                                continue
+                            xf.write(child)
+                self._data = buffer.getvalue()
+            return self._data
+
+
 class DASH:
     def __init__(self, manifest, url: str):
         if manifest is None:
@@ -101,8 +253,10 @@ class DASH:
         All Track URLs will be a list of segment URLs.
         """
         tracks = Tracks()
+        period_tracks: list[AnyTrack] = []
 
         filtered_period_ids: list[str] = []
+        filtered_manifest = FilteredManifest(self.manifest, filtered_period_ids)
 
         for period in self.manifest.findall("Period"):
             if callable(period_filter) and period_filter(period):
@@ -125,10 +279,12 @@ class DASH:
                     # we don't want trick mode streams (they are only used for fast-forward/rewind)
                     continue
 
-                for rep in adaptation_set.findall("Representation"):
-                    get = partial(self._get, adaptation_set=adaptation_set, representation=rep)
-                    findall = partial(self._findall, adaptation_set=adaptation_set, representation=rep, both=True)
-                    segment_base = rep.find("SegmentBase")
+                adaptation_set_node = MPDNode(adaptation_set)
+                for rep in adaptation_set_node.children.get("Representation", []):
+                    node = MPDNode(rep, adaptation_set_node)
+                    get = node.get
+                    findall = node.findall
+                    segment_base = next(iter(node.children.get("SegmentBase", [])), None)
 
                     codecs = get("codecs")
                     content_type = get("contentType")
@@ -181,9 +337,10 @@ class DASH:
                         track_args = dict(
                             bitrate=get("bandwidth") or None,
                             channels=next(
-                                iter(
-                                    rep.xpath("AudioChannelConfiguration/@value")
-                                    or adaptation_set.xpath("AudioChannelConfiguration/@value")
+                                (
+                                    x.get("value")
+                                    for x in findall("AudioChannelConfiguration")
+                                    if x.get("value") is not None
                                 ),
                                 None,
                             ),
@@ -230,7 +387,7 @@ class DASH:
                         )
                     )[2:]
 
-                    tracks.add(
+                    period_tracks.append(
                         track_type(
                             id_=track_id,
                             url=self.url,
@@ -245,6 +402,7 @@ class DASH:
                                     "adaptation_set": adaptation_set,
                                     "representation": rep,
                                     "filtered_period_ids": filtered_period_ids,
+                                    "filtered_manifest": filtered_manifest,
                                 }
                             },
                             **track_args,
@@ -254,6 +412,7 @@ class DASH:
             # only get tracks from the first main-content period
             break
 
+        tracks.add(period_tracks)
         return tracks
 
     @staticmethod
@@ -284,12 +443,12 @@ class DASH:
         adaptation_set: Element = track.data["dash"]["adaptation_set"]
         representation: Element = track.data["dash"]["representation"]
 
+        node = MPDNode(representation, MPDNode(adaptation_set))
+
         # Preserve existing DRM if it was set by the service, especially when service set Widevine
         # but manifest only contains PlayReady protection (common scenario for some services)
         existing_drm = track.drm
-        manifest_drm = DASH.get_drm(
-            representation.findall("ContentProtection") + adaptation_set.findall("ContentProtection")
-        )
+        manifest_drm = DASH.get_drm(node.findall("ContentProtection"))
 
         # Only override existing DRM if:
         # 1. No existing DRM was set, OR
@@ -322,21 +481,13 @@ class DASH:
         period_duration = period.get("duration") or manifest.get("mediaPresentationDuration")
         init_data: Optional[bytes] = None
 
-        segment_template = representation.find("SegmentTemplate")
-        if segment_template is None:
-            segment_template = adaptation_set.find("SegmentTemplate")
-
-        segment_list = representation.find("SegmentList")
-        if segment_list is None:
-            segment_list = adaptation_set.find("SegmentList")
-
-        segment_base = representation.find("SegmentBase")
-        if segment_base is None:
-            segment_base = adaptation_set.find("SegmentBase")
+        segment_template = node.find("SegmentTemplate")
+        segment_list = node.find("SegmentList")
+        segment_base = node.find("SegmentBase")
 
-        segments: list[tuple[str, Optional[str]]] = []
+        segments = SegmentIndex()
         segment_timescale: float = 0
-        segment_durations: list[int] = []
+        segment_durations = array("q")
         track_kid: Optional[UUID] = None
 
         if segment_template is not None:
@@ -371,14 +522,22 @@ class DASH:
                 init_data = res.content
                 track_kid = track.get_key_id(init_data)
 
+            # the fields that are the same for every segment are only replaced once
+            media = DASH.replace_fields(
+                segment_template.get("media"),
+                Bandwidth=representation.get("bandwidth"),
+                RepresentationID=representation.get("id"),
+            )
+
             if segment_timeline is not None:
                 current_time = 0
                 for s in segment_timeline.findall("S"):
                     if s.get("t"):
                         current_time = int(s.get("t"))
-                    for _ in range(1 + (int(s.get("r") or 0))):
-                        segment_durations.append(current_time)
-                        current_time += int(s.get("d"))
+                    repeat = 1 + int(s.get("r") or 0)
+                    duration = int(s.get("d"))
+                    segment_durations.extend(current_time + i * duration for i in range(repeat))
+                    current_time += max(repeat, 0) * duration
 
                 if not end_number:
                     end_number = len(segment_durations)
@@ -386,19 +545,9 @@ class DASH:
                 if start_number > end_number:
                     end_number = start_number + len(segment_durations) - 1
 
-                for t, n in zip(segment_durations, range(start_number, end_number + 1)):
-                    segments.append(
-                        (
-                            DASH.replace_fields(
-                                segment_template.get("media"),
-                                Bandwidth=representation.get("bandwidth"),
-                                Number=n,
-                                RepresentationID=representation.get("id"),
-                                Time=t,
-                            ),
-                            None,
-                        )
-                    )
+                segments = SegmentIndex(
+                    media, start_number, count=end_number - start_number + 1, times=segment_durations
+                )
             else:
                 if not period_duration:
                     raise ValueError("Duration of the Period was unable to be determined.")
@@ -409,21 +558,9 @@ class DASH:
                     segment_count = math.ceil(period_duration / (segment_duration / segment_timescale))
                     end_number = start_number + segment_count - 1
 
-                for s in range(start_number, end_number + 1):
-                    segments.append(
-                        (
-                            DASH.replace_fields(
-                                segment_template.get("media"),
-                                Bandwidth=representation.get("bandwidth"),
-                                Number=s,
-                                RepresentationID=representation.get("id"),
-                                Time=s,
-                            ),
-                            None,
-                        )
-                    )
-                    # TODO: Should we floor/ceil/round, or is int() ok?
-                    segment_durations.append(int(segment_duration))
+                segments = SegmentIndex(media, start_number, count=end_number - start_number + 1)
+                # TODO: Should we floor/ceil/round, or is int() ok?
+                segment_durations = array("q", [int(segment_duration)]) * len(segments)
         elif segment_list is not None:
             segment_timescale = float(segment_list.get("timescale") or 1)
 
@@ -447,6 +584,7 @@ class DASH:
                 track_kid = track.get_key_id(init_data)
 
             segment_urls = segment_list.findall("SegmentURL")
+            urls: list[tuple[str, Optional[str]]] = []
             for segment_url in segment_urls:
                 media_url = segment_url.get("media")
                 if not media_url:
@@ -454,8 +592,9 @@ class DASH:
                 elif not re.match("^https?://", media_url, re.IGNORECASE):
                     media_url = urljoin(rep_base_url, f"./{media_url}")
 
-                segments.append((media_url, segment_url.get("mediaRange")))
+                urls.append((media_url, segment_url.get("mediaRange")))
                 segment_durations.append(int(segment_url.get("duration") or 1))
+            segments = SegmentIndex(urls=urls)
         elif segment_base is not None:
             media_range = None
             init_data = None
@@ -474,9 +613,9 @@ class DASH:
                 if total_size:
                     media_range = f"{len(init_data)}-{total_size}"
 
-            segments.append((rep_base_url, media_range))
+            segments = SegmentIndex(urls=[(rep_base_url, media_range)])
         elif rep_base_url:
-            segments.append((rep_base_url, None))
+            segments = SegmentIndex(urls=[(rep_base_url, None)])
         else:
             log.error("Could not find a way to get segments from this MPD manifest.")
             log.debug(track.url)
@@ -506,7 +645,7 @@ class DASH:
                         log.warning("No Widevine or PlayReady PSSH was found for this track, is it DRM free?")
 
         if track.drm:
-            track_kid = track_kid or track.get_key_id(url=segments[0][0], session=session)
+            track_kid = track_kid or track.get_key_id(url=segments[0]["url"], session=session)
             drm = track.get_drm_for_cdm(cdm)
             if isinstance(drm, (Widevine, PlayReady)):
                 # license and grab content keys
@@ -530,16 +669,13 @@ class DASH:
         progress(total=len(segments))
 
         downloader = track.downloader
-        if downloader.__name__ == "aria2c" and any(bytes_range is not None for url, bytes_range in segments):
+        if downloader.__name__ == "aria2c" and segments.has_byte_ranges:
             # aria2(c) is shit and doesn't support the Range header, fallback to the requests downloader
             downloader = requests_downloader
             log.warning("Falling back to the requests downloader as aria2(c) doesn't support the Range header")
 
         downloader_args = dict(
-            urls=[
-                {"url": url, "headers": {"Range": f"bytes={bytes_range}"} if bytes_range else {}}
-                for url, bytes_range in segments
-            ],
+            urls=segments,
             output_dir=save_dir,
             filename="{i:0%d}.mp4" % (len(str(len(segments)))),
             headers=session.headers,
@@ -557,18 +693,13 @@ class DASH:
             # MPD with the rejected periods removed so n_m3u8dl_re downloads the correct content.
             filtered_period_ids = track.data.get("dash", {}).get("filtered_period_ids", [])
             if filtered_period_ids:
-                filtered_manifest = deepcopy(manifest)
-                for child in list(filtered_manifest):
-                    if not hasattr(child.tag, "find"):
-                        continue
-                    if child.tag == "Period" and child.get("id") in filtered_period_ids:
-                        filtered_manifest.remove(child)
-
+                # the tracks of a manifest share its filtered MPD, so it's only made once
+                filtered_manifest = track.data["dash"].get("filtered_manifest") or FilteredManifest(
+                    manifest, filtered_period_ids
+                )
                 filtered_mpd_path = save_dir / f".{track.id}_filtered.mpd"
                 filtered_mpd_path.parent.mkdir(parents=True, exist_ok=True)
-                etree.ElementTree(filtered_manifest).write(
-                    str(filtered_mpd_path), xml_declaration=True, encoding="utf-8"
-                )
+                filtered_mpd_path.write_bytes(filtered_manifest.data)
                 track.from_file = filtered_mpd_path
 
             downloader_args.update(
@@ -579,6 +710,15 @@ class DASH:
                 }
             )
 
+        journal: Optional[SegmentJournal] = None
+        if not skip_merge:
+            # keep the verified segments of an interrupted download, anything else is deleted
+            journal = SegmentJournal(save_dir, downloader_args["urls"])
+            journal.open()
+            resumed_segments = journal.prune(save_dir)
+            if resumed_segments:
+                log.info(f"Resuming download with {resumed_segments}/{len(segments)} segments already downloaded")
+
         debug_logger = get_debug_logger()
         if debug_logger:
             debug_logger.log(
@@ -601,6 +741,8 @@ class DASH:
         for status_update in downloader(**downloader_args):
             file_downloaded = status_update.get("file_downloaded")
             if file_downloaded:
+                if journal:
+                    journal.record(file_downloaded)
                 events.emit(events.Types.SEGMENT_DOWNLOADED, track=track, segment=file_downloaded)
             else:
                 downloaded = status_update.get("downloaded")
@@ -608,6 +750,10 @@ class DASH:
                     status_update["downloaded"] = f"DASH {downloaded}"
                 progress(**status_update)
 
+        if journal:
+            # merging consumes the segments, so an interrupted merge cannot be resumed
+            journal.delete()
+
         # Clean up filtered MPD temp file before enumerating segments
         filtered_mpd_path = save_dir / f".{track.id}_filtered.mpd"
         if filtered_mpd_path.exists():
@@ -682,28 +828,28 @@ class DASH:
                 track.drm = None
                 events.emit(events.Types.TRACK_DECRYPTED, track=track, drm=drm, segment=None)
         else:
-            with open(save_path, "wb") as f:
+            with ConcatWriter(save_path) as f:
                 if init_data:
                     f.write(init_data)
                 if len(segments_to_merge) > 1:
                     progress(downloaded="Merging", completed=0, total=len(segments_to_merge))
                 for segment_file in segments_to_merge:
-                    segment_data = segment_file.read_bytes()
                     # TODO: fix encoding after decryption?
                     if (
                         not drm
                         and isinstance(track, Subtitle)
                         and track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML)
                     ):
-                        segment_data = try_ensure_utf8(segment_data)
+                        segment_data = try_ensure_utf8(segment_file.read_bytes())
                         segment_data = (
                             segment_data.decode("utf8")
                             .replace("&lrm;", html.unescape("&lrm;"))
                             .replace("&rlm;", html.unescape("&rlm;"))
                             .encode("utf8")
                         )
-                    f.write(segment_data)
-                    f.flush()
+                        f.write(segment_data)
+                    else:
+                        f.append(segment_file)
                     segment_file.unlink()
                     progress(advance=1)
 
@@ -975,4 +1121,4 @@ class DASH:
         return url
 
 
-__all__ = ("DASH",)
+__all__ = ("DASH", "FilteredManifest", "MPDNode", "SegmentIndex")
@@ -8,6 +8,9 @@ import os
 import shutil
 import subprocess
 import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
 from functools import partial
 from pathlib import Path
 from typing import Any, Callable, Optional, Union
@@ -31,10 +34,17 @@ from unshackle.core import binaries
 from unshackle.core.cdm.detect import is_playready_cdm, is_widevine_cdm
 from unshackle.core.constants import DOWNLOAD_CANCELLED, DOWNLOAD_LICENCE_ONLY, AnyTrack
 from unshackle.core.downloaders import requests as requests_downloader
+from unshackle.core.downloaders.control import SegmentJournal
+from unshackle.core.downloaders.telemetry import get_telemetry
 from unshackle.core.drm import DRM_T, ClearKey, MonaLisa, PlayReady, Widevine
 from unshackle.core.events import events
+from unshackle.core.manifests.playlist_cache import get_playlist_cache
 from unshackle.core.tracks import Audio, Subtitle, Tracks, Video
 from unshackle.core.utilities import get_debug_logger, get_extension, is_close_match, try_ensure_utf8
+from unshackle.core.utils.concat import concat_files
+
+# key ranges decrypted at once while later segments are still downloading, each by its own decrypter process
+DECRYPT_WORKERS = max(1, min(4, (os.cpu_count() or 1) // 2))
 
 
 class HLS:
@@ -61,21 +71,7 @@ class HLS:
         elif not isinstance(session, (Session, CurlSession)):
             raise TypeError(f"Expected session to be a {Session} or {CurlSession}, not {session!r}")
 
-        res = session.get(url, **args)
-
-        # Handle requests and curl_cffi response objects
-        if isinstance(res, requests.Response):
-            if not res.ok:
-                raise requests.ConnectionError("Failed to request the M3U(8) document.", response=res)
-            content = res.text
-        elif isinstance(res, CurlResponse):
-            if not res.ok:
-                raise requests.ConnectionError("Failed to request the M3U(8) document.", response=res)
-            content = res.text
-        else:
-            raise TypeError(f"Expected response to be a requests.Response or curl_cffi.Response, not {type(res)}")
-
-        master = m3u8.loads(content, uri=url)
+        master = get_playlist_cache().load(url, session, **args)
 
         return cls(master, session)
 
@@ -304,19 +300,14 @@ class HLS:
         if track.from_file:
             master = m3u8.load(str(track.from_file))
         else:
-            # Get the playlist text and handle both session types
-            response = session.get(track.url)
-            if isinstance(response, requests.Response) or isinstance(response, CurlResponse):
-                if not response.ok:
-                    log.error(f"Failed to request the invariant M3U8 playlist: {response.status_code}")
-                    sys.exit(1)
-                playlist_text = response.text
-            else:
-                raise TypeError(
-                    f"Expected response to be a requests.Response or curl_cffi.Response, not {type(response)}"
-                )
-
-            master = m3u8.loads(playlist_text, uri=track.url)
+            # usually already fetched and parsed when the track's DRM was loaded
+            try:
+                master = get_playlist_cache().load(track.url, session)
+            except requests.ConnectionError as e:
+                if e.response is None:
+                    raise
+                log.error(f"Failed to request the invariant M3U8 playlist: {e.response.status_code}")
+                sys.exit(1)
 
         if not master.segments:
             log.error("Track's HLS playlist has no segments, expecting an invariant M3U8 playlist.")
@@ -397,6 +388,7 @@ class HLS:
 
         urls: list[dict[str, Any]] = []
         segment_durations: list[int] = []
+        duration = 0.0
 
         range_offset = 0
         for segment in master.segments:
@@ -404,6 +396,7 @@ class HLS:
                 continue
 
             segment_durations.append(int(segment.duration))
+            duration += segment.duration or 0
 
             if segment.byterange:
                 byte_range = HLS.calculate_byte_range(segment.byterange, range_offset)
@@ -420,13 +413,21 @@ class HLS:
 
         track.data["hls"]["segment_durations"] = segment_durations
 
+        # the size is estimated from the (average) bitrate until enough segments have finished
+        get_telemetry().expect(
+            segments=len(urls),
+            duration=duration,
+            bitrate=getattr(track, "bitrate", None),
+        )
+
         segment_save_dir = save_dir / "segments"
+        segment_filename = "{i:0%d}{ext}" % len(str(len(urls)))
 
         skip_merge = False
         downloader_args = dict(
             urls=urls,
             output_dir=segment_save_dir,
-            filename="{i:0%d}{ext}" % len(str(len(urls))),
+            filename=segment_filename,
             headers=session.headers,
             cookies=session.cookies,
             proxy=proxy,
@@ -447,6 +448,15 @@ class HLS:
                 }
             )
 
+        journal: Optional[SegmentJournal] = None
+        if not skip_merge:
+            # keep the verified segments of an interrupted download, anything else is deleted
+            journal = SegmentJournal(save_dir, urls)
+            journal.open()
+            resumed_segments = journal.prune(segment_save_dir)
+            if resumed_segments:
+                log.info(f"Resuming download with {resumed_segments}/{total_segments} segments already downloaded")
+
         debug_logger = get_debug_logger()
         if debug_logger:
             debug_logger.log(
@@ -465,245 +475,373 @@ class HLS:
                 },
             )
 
-        for status_update in downloader(**downloader_args):
-            file_downloaded = status_update.get("file_downloaded")
-            if file_downloaded:
-                events.emit(events.Types.SEGMENT_DOWNLOADED, track=track, segment=file_downloaded)
+        # Segments are assembled in playlist order while the rest are still downloading. Each
+        # one is appended to the file of its key range (if encrypted) or discontinuity, and is
+        # then emptied. The empty file is kept so that a resumed download won't fetch it again.
+        name_len = len(str(total_segments))
+        unwanted_ids = {id(x) for x in unwanted_segments}
+
+        discon_i = range_offset = real_i = i = 0
+        map_data: Optional[tuple[m3u8.model.InitializationSection, bytes]] = None
+        encryption_data: Optional[tuple[Optional[m3u8.Key], DRM_T]] = None
+        ready: set[int] = set()
+        range_path: Optional[Path] = None
+        range_drm: Optional[DRM_T] = None
+        discontinuity_path: Optional[Path] = None
+        replay_until: Optional[int] = None
+        # Widevine and PlayReady key ranges are decrypted in the background as soon as they're complete,
+        # and are added to their discontinuity in order once they're done, see finish_range()
+        decrypt_pool: Optional[ThreadPoolExecutor] = None
+        decrypting: deque[tuple[Future, Path, DRM_T, Path]] = deque()
+
+        def reset_assembly() -> None:
+            """Set the assembly state to the very start of the playlist."""
+            nonlocal discon_i, range_offset, map_data, encryption_data, real_i, i, ready
+            nonlocal range_path, range_drm, discontinuity_path
+            discon_i = 0
+            range_offset = 0
+            map_data = None
+            encryption_data = (initial_drm_key, session_drm) if session_drm else None
+            real_i = 0  # the next playlist segment to assemble
+            i = -1  # the last wanted segment that was assembled
+            ready = set()  # reorder buffer, downloaded segments waiting for the ones before them
+            range_path = None
+            range_drm = None
+            discontinuity_path = None
+
+        reset_assembly()
+
+        def get_segment_path(index: int) -> Path:
+            return segment_save_dir / segment_filename.format(i=index, ext=get_extension(urls[index]["url"]))
+
+        def append(to: Path, file: Optional[Path] = None, data: Optional[bytes] = None) -> int:
+            """Append data and then the contents of a file to a path. Returns the new size."""
+            return concat_files([file] if file else [], to, data, append=True, sync=False)
+
+        def start_discontinuity(suffix: str) -> None:
+            nonlocal discontinuity_path
+            if not discontinuity_path:
+                discontinuity_path = save_dir / f"{str(discon_i).zfill(name_len)}{suffix}"
+
+        def finish_range() -> None:
+            """
+            Decrypt the segments of the current key range and add them to the discontinuity.
+
+            With Widevine and PlayReady all segments of the range were merged in sequence,
+            prefixed with the init data (if any), so that they can be decrypted at once.
+            That happens on the decrypt pool, so later segments keep being downloaded and
+            assembled meanwhile. The decrypted ranges are added to their discontinuity in
+            order by add_decrypted(), and anything else waits for them to be added first.
+            """
+            nonlocal range_path, range_drm, decrypt_pool
+            if not range_path:
+                return
+
+            start_discontinuity(range_path.suffix)
+            path, drm = range_path, range_drm
+            range_path = None
+            range_drm = None
+
+            if replay_until is None:
+                journal.record_rewrite()
+                if isinstance(drm, (Widevine, PlayReady)):
+                    if not decrypt_pool:
+                        decrypt_pool = ThreadPoolExecutor(max_workers=DECRYPT_WORKERS, thread_name_prefix="decrypt")
+                    decrypting.append((decrypt_pool.submit(drm.decrypt, path), path, drm, discontinuity_path))
+                else:
+                    add_decrypted(wait=True)
+                    add_range(path, drm, discontinuity_path)
+                    checkpoint(i)
+
+        def add_range(path: Path, drm: Optional[DRM_T], to: Path) -> None:
+            """Add a (decrypted) key range to the end of a discontinuity."""
+            events.emit(events.Types.TRACK_DECRYPTED, track=track, drm=drm, segment=path)
+            if to.exists():
+                append(to, path)
+                path.unlink()
             else:
-                downloaded = status_update.get("downloaded")
-                if downloaded and downloaded.endswith("/s"):
-                    status_update["downloaded"] = f"HLS {downloaded}"
-                progress(**status_update)
-
-        # see https://github.com/devine-dl/devine/issues/71
-        for control_file in segment_save_dir.glob("*.aria2__temp"):
-            control_file.unlink()
-
-        if skip_merge:
-            final_save_path = HLS._finalize_n_m3u8dl_re_output(track=track, save_dir=save_dir, save_path=save_path)
-            progress(downloaded="Downloaded")
-            track.path = final_save_path
-            events.emit(events.Types.TRACK_DOWNLOADED, track=track)
-            return
+                path.rename(to)
+
+        def add_decrypted(wait: bool = False) -> None:
+            """Add the key ranges that finished decrypting, in order, optionally waiting for all of them."""
+            while decrypting and (wait or decrypting[0][0].done()):
+                future, path, drm, to = decrypting.popleft()
+                future.result()
+                add_range(path, drm, to)
+
+        def checkpoint(index: int) -> None:
+            """Record that all segments up to index were assembled, unless ranges before them are decrypting."""
+            if decrypting:
+                # the ranges are only in their own files until then, which a resumed download doesn't keep
+                return
+            range_size = range_path.stat().st_size if range_path else 0
+            discontinuity_size = (
+                discontinuity_path.stat().st_size if discontinuity_path and discontinuity_path.exists() else 0
+            )
+            journal.record_assembled(index, range_size, discontinuity_size)
 
-        progress(total=total_segments, completed=0, downloaded="Merging")
+        def finish_discontinuity() -> None:
+            nonlocal discontinuity_path
+            finish_range()
+            discontinuity_path = None
 
-        name_len = len(str(total_segments))
-        discon_i = 0
-        range_offset = 0
-        map_data: Optional[tuple[m3u8.model.InitializationSection, bytes]] = None
-        if session_drm:
-            encryption_data: Optional[tuple[Optional[m3u8.Key], DRM_T]] = (initial_drm_key, session_drm)
-        else:
-            encryption_data: Optional[tuple[Optional[m3u8.Key], DRM_T]] = None
-
-        i = -1
-        for real_i, segment in enumerate(master.segments):
-            if segment not in unwanted_segments:
-                i += 1
-
-            is_last_segment = (real_i + 1) == len(master.segments)
-
-            def merge(to: Path, via: list[Path], delete: bool = False, include_map_data: bool = False):
-                """
-                Merge all files to a given path, optionally including map data.
-
-                Parameters:
-                    to: The output file with all merged data.
-                    via: List of files to merge, in sequence.
-                    delete: Delete the file once it's been merged.
-                    include_map_data: Whether to include the init map data.
-                """
-                with open(to, "wb") as x:
-                    if include_map_data and map_data and map_data[1]:
-                        x.write(map_data[1])
-                    for file in via:
-                        x.write(file.read_bytes())
-                        x.flush()
-                        if delete:
-                            file.unlink()
-
-            def decrypt(include_this_segment: bool) -> Path:
-                """
-                Decrypt all segments that uses the currently set DRM.
-
-                All segments that will be decrypted with this DRM will be merged together
-                in sequence, prefixed with the init data (if any), and then deleted. Once
-                merged they will be decrypted. The merged and decrypted file names state
-                the range of segments that were used.
-
-                Parameters:
-                    include_this_segment: Whether to include the current segment in the
-                        list of segments to merge and decrypt. This should be False if
-                        decrypting on EXT-X-KEY changes, or True when decrypting on the
-                        last segment.
-
-                Returns the decrypted path.
-                """
-                drm = encryption_data[1]
-                first_segment_i = next(
-                    int(file.stem) for file in sorted(segment_save_dir.iterdir()) if file.stem.isdigit()
+        def add_segment(index: int) -> None:
+            """Append a downloaded segment to its key range or discontinuity file."""
+            nonlocal range_path, range_drm
+            segment_path = get_segment_path(index)
+
+            if encryption_data and not range_path:
+                range_path = save_dir / (
+                    f"{str(discon_i).zfill(name_len)}-{str(index).zfill(name_len)}{segment_path.suffix}"
                 )
-                last_segment_i = max(0, i - int(not include_this_segment))
-                range_len = (last_segment_i - first_segment_i) + 1
-
-                segment_range = f"{str(first_segment_i).zfill(name_len)}-{str(last_segment_i).zfill(name_len)}"
-                merged_path = segment_save_dir / f"{segment_range}{get_extension(master.segments[last_segment_i].uri)}"
-                decrypted_path = segment_save_dir / f"{merged_path.stem}_decrypted{merged_path.suffix}"
-
-                files = [
-                    file
-                    for file in sorted(segment_save_dir.iterdir())
-                    if file.stem.isdigit() and first_segment_i <= int(file.stem) <= last_segment_i
-                ]
-                if not files:
-                    raise ValueError(f"None of the segment files for {segment_range} exist...")
-                elif len(files) != range_len:
-                    raise ValueError(f"Missing {range_len - len(files)} segment files for {segment_range}...")
+                range_drm = encryption_data[1]
+                if replay_until is None:
+                    append(range_path, data=map_data[1] if map_data else None)
+            elif not encryption_data:
+                start_discontinuity(segment_path.suffix)
+
+            if replay_until is not None:
+                return
+
+            if isinstance(track, Subtitle):
+                segment_data = try_ensure_utf8(segment_path.read_bytes())
+                if track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML):
+                    segment_data = (
+                        segment_data.decode("utf8")
+                        .replace("&lrm;", html.unescape("&lrm;"))
+                        .replace("&rlm;", html.unescape("&rlm;"))
+                        .encode("utf8")
+                    )
+                segment_path.write_bytes(segment_data)
 
-                if isinstance(drm, (Widevine, PlayReady)):
-                    # with widevine we can merge all segments and decrypt once
-                    merge(to=merged_path, via=files, delete=True, include_map_data=True)
-                    drm.decrypt(merged_path)
-                    merged_path.rename(decrypted_path)
+            if range_path:
+                if isinstance(range_drm, (Widevine, PlayReady)):
+                    append(range_path, segment_path)
                 else:
-                    # with other drm we must decrypt separately and then merge them
+                    # with other drm we must decrypt each segment separately before merging
                     # for aes this is because each segment likely has 16-byte padding
-                    for file in files:
-                        drm.decrypt(file)
-                    merge(to=merged_path, via=files, delete=True, include_map_data=True)
-
-                events.emit(events.Types.TRACK_DECRYPTED, track=track, drm=drm, segment=decrypted_path)
-
-                return decrypted_path
-
-            def merge_discontinuity(include_this_segment: bool, include_map_data: bool = True):
-                """
-                Merge all segments of the discontinuity.
-
-                All segment files for this discontinuity must already be downloaded and
-                already decrypted (if it needs to be decrypted).
-
-                Parameters:
-                    include_this_segment: Whether to include the current segment in the
-                        list of segments to merge and decrypt. This should be False if
-                        decrypting on EXT-X-KEY changes, or True when decrypting on the
-                        last segment.
-                    include_map_data: Whether to prepend the init map data before the
-                        segment files when merging.
-                """
-                last_segment_i = max(0, i - int(not include_this_segment))
-
-                files = [
-                    file
-                    for file in sorted(segment_save_dir.iterdir())
-                    if int(file.stem.replace("_decrypted", "").split("-")[-1]) <= last_segment_i
-                ]
-                if files:
-                    to_dir = segment_save_dir.parent
-                    to_path = to_dir / f"{str(discon_i).zfill(name_len)}{files[-1].suffix}"
-                    merge(to=to_path, via=files, delete=True, include_map_data=include_map_data)
-
-            if segment not in unwanted_segments:
-                if isinstance(track, Subtitle):
-                    segment_file_ext = get_extension(segment.uri)
-                    segment_file_path = segment_save_dir / f"{str(i).zfill(name_len)}{segment_file_ext}"
-                    segment_data = try_ensure_utf8(segment_file_path.read_bytes())
-                    if track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML):
-                        segment_data = (
-                            segment_data.decode("utf8")
-                            .replace("&lrm;", html.unescape("&lrm;"))
-                            .replace("&rlm;", html.unescape("&rlm;"))
-                            .encode("utf8")
+                    # a copy is decrypted so the segment stays intact if we are interrupted
+                    decrypting_path = segment_path.with_name(f"{segment_path.name}.decrypting")
+                    shutil.copyfile(segment_path, decrypting_path)
+                    range_drm.decrypt(decrypting_path)
+                    append(range_path, decrypting_path)
+                    decrypting_path.unlink()
+            else:
+                # earlier ranges of the discontinuity must be added before it
+                add_decrypted(wait=True)
+                include_map_data = map_data and not discontinuity_path.exists()
+                append(discontinuity_path, segment_path, map_data[1] if include_map_data else None)
+
+            add_decrypted()
+            checkpoint(index)
+            os.truncate(segment_path, 0)
+            journal.record(segment_path)
+
+        def assemble() -> None:
+            """Assemble the segments that are next in order and have been downloaded."""
+            nonlocal real_i, i, discon_i, range_offset, map_data, encryption_data
+            while real_i < len(master.segments):
+                if replay_until is not None and i == replay_until:
+                    return
+
+                segment = master.segments[real_i]
+                wanted = id(segment) not in unwanted_ids
+                index = i + 1
+                if wanted and replay_until is None:
+                    if index not in ready:
+                        return
+                    ready.discard(index)
+
+                if wanted:
+                    if segment.discontinuity and index != 0:
+                        finish_discontinuity()
+                        discon_i += 1
+                        range_offset = 0  # TODO: Should this be reset or not?
+                        map_data = None
+
+                    if segment.init_section and (not map_data or segment.init_section != map_data[0]):
+                        if segment.init_section.byterange:
+                            init_byte_range = HLS.calculate_byte_range(segment.init_section.byterange, range_offset)
+                            range_offset = int(init_byte_range.split("-")[0])
+                            init_range_header = {"Range": f"bytes={init_byte_range}"}
+                        else:
+                            init_range_header = {}
+
+                        # Handle both session types for init section request
+                        res = session.get(
+                            url=urljoin(segment.init_section.base_uri, segment.init_section.uri),
+                            headers=init_range_header,
                         )
-                    segment_file_path.write_bytes(segment_data)
 
-                if segment.discontinuity and i != 0:
-                    if encryption_data:
-                        decrypt(include_this_segment=False)
-                    merge_discontinuity(
-                        include_this_segment=False, include_map_data=not encryption_data or not encryption_data[1]
-                    )
+                        # Check response based on session type
+                        if isinstance(res, requests.Response) or isinstance(res, CurlResponse):
+                            res.raise_for_status()
+                            init_content = res.content
+                        else:
+                            raise TypeError(
+                                f"Expected response to be requests.Response or curl_cffi.Response, not {type(res)}"
+                            )
 
-                    discon_i += 1
-                    range_offset = 0  # TODO: Should this be reset or not?
-                    map_data = None
+                        map_data = (segment.init_section, init_content)
 
-                if segment.init_section and (not map_data or segment.init_section != map_data[0]):
-                    if segment.init_section.byterange:
-                        init_byte_range = HLS.calculate_byte_range(segment.init_section.byterange, range_offset)
-                        range_offset = int(init_byte_range.split("-")[0])
-                        init_range_header = {"Range": f"bytes={init_byte_range}"}
+                segment_keys = getattr(segment, "keys", None)
+                if segment_keys:
+                    if cdm:
+                        cdm_segment_keys = HLS.filter_keys_for_cdm(segment_keys, cdm)
+                        key = (
+                            HLS.get_supported_key(cdm_segment_keys)
+                            if cdm_segment_keys
+                            else HLS.get_supported_key(segment_keys)
+                        )
+                    else:
+                        key = HLS.get_supported_key(segment_keys)
+                    if encryption_data and encryption_data[0] != key:
+                        finish_range()
+
+                    if key is None:
+                        encryption_data = None
+                    elif not encryption_data or encryption_data[0] != key:
+                        drm = HLS.get_drm(key, session)
+                        if isinstance(drm, (Widevine, PlayReady)):
+                            try:
+                                if map_data:
+                                    track_kid = track.get_key_id(map_data[1])
+                                else:
+                                    track_kid = None
+                                if not track_kid:
+                                    track_kid = drm.kid
+                                progress(downloaded="LICENSING")
+                                license_widevine(drm, track_kid=track_kid)
+                                progress(downloaded="[yellow]LICENSED")
+                            except Exception:  # noqa
+                                DOWNLOAD_CANCELLED.set()  # skip pending track downloads
+                                progress(downloaded="[red]FAILED")
+                                raise
+                        encryption_data = (key, drm)
+
+                if wanted:
+                    add_segment(index)
+                    i = index
+
+                real_i += 1
+
+        def resume_assembly() -> bool:
+            """
+            Continue the assembly of an interrupted download from its last checkpoint.
+
+            The playlist is replayed up to the checkpoint to get back the init data, keys,
+            and output files at that point, without touching any files. The output files
+            are then truncated to their checkpointed sizes, dropping any data after it.
+
+            Returns False if the assembled data cannot be trusted and must be discarded.
+            """
+            nonlocal replay_until, range_path, range_drm
+            if journal.assembly_lost:
+                return False
+
+            if journal.assembled:
+                index, range_size, discontinuity_size = journal.assembled
+                replay_until = index
+                try:
+                    assemble()
+                finally:
+                    replay_until = None
+                if i != index:
+                    return False
+
+                if range_path and not range_size:
+                    # the range was decrypted and added to the discontinuity right before the interruption
+                    range_path = None
+                    range_drm = None
+
+                for path, size in ((range_path, range_size), (discontinuity_path, discontinuity_size)):
+                    if not path:
+                        if size:
+                            return False
+                    elif not size:
+                        path.unlink(missing_ok=True)
+                    elif not path.exists() or path.stat().st_size < size:
+                        return False
                     else:
-                        init_range_header = {}
+                        os.truncate(path, size)
 
-                    # Handle both session types for init section request
-                    res = session.get(
-                        url=urljoin(segment.init_section.base_uri, segment.init_section.uri),
-                        headers=init_range_header,
-                    )
+            # anything else is output of the previous discontinuities, or from after the checkpoint
+            for file in save_dir.iterdir():
+                if not file.is_file() or file in (journal.path, range_path, discontinuity_path):
+                    continue
+                if file.stem.isdigit() and int(file.stem) < discon_i:
+                    continue
+                file.unlink()
 
-                    # Check response based on session type
-                    if isinstance(res, requests.Response) or isinstance(res, CurlResponse):
-                        res.raise_for_status()
-                        init_content = res.content
-                    else:
-                        raise TypeError(
-                            f"Expected response to be requests.Response or curl_cffi.Response, not {type(res)}"
-                        )
+            return True
 
-                    map_data = (segment.init_section, init_content)
+        if journal and not resume_assembly():
+            log.warning("The partially assembled output cannot be continued, downloading all segments again")
+            journal.reset()
+            reset_assembly()
 
-            segment_keys = getattr(segment, "keys", None)
-            if segment_keys:
-                if cdm:
-                    cdm_segment_keys = HLS.filter_keys_for_cdm(segment_keys, cdm)
-                    key = (
-                        HLS.get_supported_key(cdm_segment_keys)
-                        if cdm_segment_keys
-                        else HLS.get_supported_key(segment_keys)
-                    )
-                else:
-                    key = HLS.get_supported_key(segment_keys)
-                if encryption_data and encryption_data[0] != key and i != 0 and segment not in unwanted_segments:
-                    decrypt(include_this_segment=False)
-
-                if key is None:
-                    encryption_data = None
-                elif not encryption_data or encryption_data[0] != key:
-                    drm = HLS.get_drm(key, session)
-                    if isinstance(drm, (Widevine, PlayReady)):
+        try:
+            for status_update in downloader(**downloader_args):
+                file_downloaded = status_update.get("file_downloaded")
+                if file_downloaded:
+                    if journal:
+                        journal.record(file_downloaded)
+                    events.emit(events.Types.SEGMENT_DOWNLOADED, track=track, segment=file_downloaded)
+                    index = SegmentJournal.get_index(file_downloaded)
+                    if journal and index is not None and i < index < len(urls):
+                        ready.add(index)
                         try:
-                            if map_data:
-                                track_kid = track.get_key_id(map_data[1])
-                            else:
-                                track_kid = None
-                            if not track_kid:
-                                track_kid = drm.kid
-                            progress(downloaded="LICENSING")
-                            license_widevine(drm, track_kid=track_kid)
-                            progress(downloaded="[yellow]LICENSED")
+                            assemble()
                         except Exception:  # noqa
                             DOWNLOAD_CANCELLED.set()  # skip pending track downloads
                             progress(downloaded="[red]FAILED")
                             raise
-                    encryption_data = (key, drm)
-
-            if DOWNLOAD_LICENCE_ONLY.is_set():
-                continue
-
-            if is_last_segment:
-                # required as it won't end with EXT-X-DISCONTINUITY nor a new key
-                if encryption_data:
-                    decrypt(include_this_segment=True)
-                merge_discontinuity(
-                    include_this_segment=True, include_map_data=not encryption_data or not encryption_data[1]
-                )
+                else:
+                    downloaded = status_update.get("downloaded")
+                    if downloaded and downloaded.endswith("/s"):
+                        status_update["downloaded"] = f"HLS {downloaded}"
+                    progress(**status_update)
+
+            # see https://github.com/devine-dl/devine/issues/71
+            for control_file in segment_save_dir.glob("*.aria2__temp"):
+                control_file.unlink()
+
+            if skip_merge:
+                final_save_path = HLS._finalize_n_m3u8dl_re_output(track=track, save_dir=save_dir, save_path=save_path)
+                progress(downloaded="Downloaded")
+                track.path = final_save_path
+                events.emit(events.Types.TRACK_DOWNLOADED, track=track)
+                return
 
-            progress(advance=1)
+            progress(downloaded="Merging")
 
-        if DOWNLOAD_LICENCE_ONLY.is_set():
-            return
+            # pick up any segments the downloader didn't report
+            if segment_save_dir.exists():
+                for file in segment_save_dir.iterdir():
+                    index = SegmentJournal.get_index(file)
+                    if index is not None and i < index < len(urls) and file == get_segment_path(index):
+                        ready.add(index)
+            assemble()
+
+            if real_i != len(master.segments):
+                missing = total_segments - (i + 1)
+                raise ValueError(f"Missing {missing} segment files, starting at {get_segment_path(i + 1).name}...")
+
+            # required as it won't end with EXT-X-DISCONTINUITY nor a new key
+            finish_discontinuity()
+            add_decrypted(wait=True)
+        finally:
+            if decrypt_pool:
+                # also waits for the decrypter processes, so nothing writes to the files being cleaned up
+                decrypt_pool.shutdown(wait=True, cancel_futures=True)
+                if decrypting:
+                    # keep the ranges that were decrypted before a failure, so a resumed download continues after them
+                    with suppress(Exception):
+                        add_decrypted(wait=True)
+                        checkpoint(i)
+
+        journal.delete()
+        shutil.rmtree(segment_save_dir, ignore_errors=True)
 
         def find_segments_recursively(directory: Path) -> list[Path]:
             """Find all segment files recursively in any directory structure created by downloaders."""
@@ -768,13 +906,7 @@ class HLS:
             if isinstance(track, (Video, Audio)):
                 HLS.merge_segments(segments=segments_to_merge, save_path=save_path)
             else:
-                with open(save_path, "wb") as f:
-                    for discontinuity_file in segments_to_merge:
-                        discontinuity_data = discontinuity_file.read_bytes()
-                        f.write(discontinuity_data)
-                        f.flush()
-                        os.fsync(f.fileno())
-                        discontinuity_file.unlink()
+                concat_files(segments_to_merge, save_path, delete=True)
 
         # Clean up empty segment directory
         if save_dir.exists() and save_dir.name.endswith("_segments"):
@@ -855,13 +987,10 @@ class HLS:
 
         # Fallback: Binary concatenation
         logging.getLogger("HLS").debug(f"Using binary concatenation for {len(segments)} segments")
-        with open(save_path, "wb") as output_file:
-            for segment in segments:
-                with open(segment, "rb") as segment_file:
-                    output_file.write(segment_file.read())
+        size = concat_files(segments, save_path)
 
         cleanup_segments_and_dirs()
-        return save_path.stat().st_size
+        return size
 
     @staticmethod
     def parse_session_data_keys(
@@ -22,6 +22,7 @@ from unshackle.core.drm import DRM_T, PlayReady, Widevine
 from unshackle.core.events import events
 from unshackle.core.tracks import Audio, Subtitle, Track, Tracks, Video
 from unshackle.core.utilities import get_debug_logger, try_ensure_utf8
+from unshackle.core.utils.concat import ConcatWriter
 from unshackle.core.utils.xml import load_xml
 
 
@@ -381,23 +382,23 @@ class ISM:
         if skip_merge:
             shutil.move(segments_to_merge[0], save_path)
         else:
-            with open(save_path, "wb") as f:
+            with ConcatWriter(save_path) as f:
                 for segment_file in segments_to_merge:
-                    segment_data = segment_file.read_bytes()
                     if (
                         not session_drm
                         and isinstance(track, Subtitle)
                         and track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML)
                     ):
-                        segment_data = try_ensure_utf8(segment_data)
+                        segment_data = try_ensure_utf8(segment_file.read_bytes())
                         segment_data = (
                             segment_data.decode("utf8")
                             .replace("&lrm;", html.unescape("&lrm;"))
                             .replace("&rlm;", html.unescape("&rlm;"))
                             .encode("utf8")
                         )
-                    f.write(segment_data)
-                    f.flush()
+                        f.write(segment_data)
+                    else:
+                        f.append(segment_file)
                     segment_file.unlink()
                     progress(advance=1)
 
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import m3u8
+import requests
+from curl_cffi.requests import Response as CurlResponse
+from curl_cffi.requests import Session as CurlSession
+from m3u8 import M3U8
+from requests import Session
+
+from unshackle.core.config import config
+
+MAX_AGE = 3600  # seconds a static (variant or ended) playlist is used without revalidating it
+# query parameters that authorize or bust the cache of a request rather than select the playlist
+VOLATILE_PARAMS = {
+    "_",
+    "token",
+    "hdnts",
+    "hdntl",
+    "hdnea",
+    "expires",
+    "policy",
+    "signature",
+    "key-pair-id",
+    "x-amz-algorithm",
+    "x-amz-credential",
+    "x-amz-date",
+    "x-amz-expires",
+    "x-amz-security-token",
+    "x-amz-signature",
+    "x-amz-signedheaders",
+}
+
+log = logging.getLogger("PlaylistCache")
+
+_lock = threading.Lock()
+_cache: Optional[PlaylistCache] = None
+
+
+class CachedPlaylist:
+    """A fetched playlist with the validators to revalidate it with."""
+
+    def __init__(self, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = time.monotonic()
+        self.playlist: Optional[M3U8] = None
+
+    @property
+    def is_static(self) -> bool:
+        """A variant playlist, or a media playlist that has ended, is not expected to change."""
+        return bool(self.playlist and (self.playlist.is_variant or self.playlist.is_endlist))
+
+    def get_validators(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PlaylistCache:
+    """
+    Cache of M3U(8) playlists, so each playlist is fetched and parsed once per run.
+
+    Playlists are keyed by their URL without volatile query parameters (see
+    VOLATILE_PARAMS), so the same playlist with a new token is still a hit. The
+    parsed M3U8 objects are shared by everything loading the same playlist, and
+    by playlists with the same content and base URI, so they must not be modified.
+
+    A static playlist (variant, or with an EXT-X-ENDLIST) is used as-is for up to
+    max_age seconds, other playlists like those of live streams are revalidated
+    every time. Playlists with an ETag or Last-Modified header are also saved to
+    the directory, so later runs revalidate them with a conditional request, and
+    only download them again if they changed.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        max_age: float = MAX_AGE,
+        volatile_params: Optional[set[str]] = None,
+        enabled: bool = True,
+    ):
+        """
+        Parameters:
+            directory: The directory to save playlists to, if any, for later runs.
+            max_age: Seconds to use a static playlist without revalidating it.
+            volatile_params: Query parameters to ignore in the URL of a playlist.
+            enabled: Cache playlists, otherwise every load fetches and parses the playlist.
+        """
+        self.enabled = enabled
+        self.directory = directory
+        self.max_age = max_age
+        self.volatile_params = {param.lower() for param in (volatile_params or VOLATILE_PARAMS)}
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._playlists: dict[str, CachedPlaylist] = {}
+        self._parsed: dict[tuple[str, str], M3U8] = {}
+
+    def get_key(self, url: str, **args: Any) -> str:
+        """Get the key of a playlist request, its URL without volatile query parameters and any args but headers."""
+        parts = urlsplit(url)
+        query = urlencode(
+            sorted(
+                (k, v)
+                for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                if k.lower() not in self.volatile_params
+            )
+        )
+        key = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ""))
+        args = {k: v for k, v in args.items() if k != "headers"}
+        if args:
+            key += f"|{json.dumps(args, sort_keys=True, default=str)}"
+        return key
+
+    def load(self, url: str, session: Optional[Union[Session, CurlSession]] = None, **args: Any) -> M3U8:
+        """
+        Get the parsed playlist at a URL, fetching it only if it's not cached or has changed.
+
+        Parameters:
+            url: The URL of the playlist.
+            session: The session to fetch it with.
+            args: Any other arguments of the request, e.g., headers.
+
+        Raises:
+            requests.ConnectionError: If the playlist could not be fetched, with the response.
+        """
+        if not session:
+            session = Session()
+        elif not isinstance(session, (Session, CurlSession)):
+            raise TypeError(f"Expected session to be a {Session} or {CurlSession}, not {session!r}")
+
+        if not self.enabled:
+            res = session.get(url, **args)
+            if not isinstance(res, (requests.Response, CurlResponse)):
+                raise TypeError(f"Expected response to be a requests.Response or curl_cffi.Response, not {type(res)}")
+            if not res.ok:
+                raise requests.ConnectionError("Failed to request the M3U(8) document.", response=res)
+            return m3u8.loads(res.text, uri=url)
+
+        key = self.get_key(url, **args)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # only one request at a time for each playlist, the others wait and get a hit
+        with key_lock:
+            cached = self._playlists.get(key) or self._read(key)
+            if cached and cached.playlist and cached.is_static and time.monotonic() - cached.fetched < self.max_age:
+                self.stats["hits"] += 1
+                return cached.playlist
+
+            headers = dict(args.pop("headers", None) or {})
+            if cached:
+                headers.update(cached.get_validators())
+            res = session.get(url, headers=headers, **args)
+            if not isinstance(res, (requests.Response, CurlResponse)):
+                raise TypeError(f"Expected response to be a requests.Response or curl_cffi.Response, not {type(res)}")
+
+            if cached and res.status_code == 304:
+                self.stats["revalidated"] += 1
+                cached.fetched = time.monotonic()
+            else:
+                if not res.ok:
+                    raise requests.ConnectionError("Failed to request the M3U(8) document.", response=res)
+                self.stats["misses"] += 1
+                cached = CachedPlaylist(res.text, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+                self._write(key, cached)
+
+            if not cached.playlist:
+                cached.playlist = self._parse(cached.text, url)
+            self._playlists[key] = cached
+            return cached.playlist
+
+    def _parse(self, text: str, url: str) -> M3U8:
+        # the same content may be served at multiple URLs, relative URIs are resolved against its directory
+        parsed_key = (hashlib.sha256(text.encode("utf8")).hexdigest(), url.rsplit("/", maxsplit=1)[0])
+        with self._lock:
+            playlist = self._parsed.get(parsed_key)
+        if playlist is None:
+            playlist = m3u8.loads(text, uri=url)
+            with self._lock:
+                playlist = self._parsed.setdefault(parsed_key, playlist)
+        return playlist
+
+    def _get_path(self, key: str) -> Optional[Path]:
+        if not self.directory:
+            return None
+        return self.directory / f"{hashlib.sha256(key.encode('utf8')).hexdigest()}.json"
+
+    def _read(self, key: str) -> Optional[CachedPlaylist]:
+        path = self._get_path(key)
+        if not path or not path.is_file():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf8"))
+            return CachedPlaylist(data["text"], data.get("etag"), data.get("last_modified"))
+        except (OSError, ValueError, KeyError) as e:
+            log.debug(f"Ignoring unreadable cached playlist {path.name}: {e}")
+            return None
+
+    def _write(self, key: str, cached: CachedPlaylist) -> None:
+        path = self._get_path(key)
+        if not path or not (cached.etag or cached.last_modified):
+            # it can't be revalidated, so a later run would have to download it again anyway
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix(".tmp")
+            temp_path.write_text(
+                json.dumps({"etag": cached.etag, "last_modified": cached.last_modified, "text": cached.text}),
+                encoding="utf8",
+            )
+            temp_path.replace(path)
+        except OSError as e:
+            log.debug(f"Failed to save the playlist to the cache: {e}")
+
+    def clear(self) -> None:
+        """Forget every playlist of this run, saved playlists are kept."""
+        with self._lock:
+            self._playlists.clear()
+            self._parsed.clear()
+
+
+def get_playlist_cache() -> PlaylistCache:
+    """Get the PlaylistCache of this process, made from the `manifest_cache` config."""
+    global _cache
+    with _lock:
+        if _cache is None:
+            cfg = config.manifest_cache
+            _cache = PlaylistCache(
+                directory=config.directories.cache / "playlists",
+                max_age=float(cfg.get("max_age", MAX_AGE)),
+                volatile_params=VOLATILE_PARAMS | set(cfg.get("volatile_params") or []),
+                enabled=cfg.get("enabled", True),
+            )
+        return _cache
+
+
+__all__ = ("PlaylistCache", "get_playlist_cache")
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import TYPE_CHECKING, Optional
 
 import requests
@@ -15,17 +19,40 @@ if TYPE_CHECKING:
 # Ordered by priority: IMDBApi (free), SIMKL, TMDB
 ALL_PROVIDERS: list[type[MetadataProvider]] = [IMDBApiProvider, SimklProvider, TMDBProvider]
 
+SEARCH_TIMEOUT = 30  # seconds to wait on the providers of a search before using the best result so far
+
+# providers are made once and shared, so their sessions are too
+_instances: dict[type[MetadataProvider], MetadataProvider] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def _get_instance(cls: type[MetadataProvider]) -> MetadataProvider:
+    with _lock:
+        provider = _instances.get(cls)
+        if provider is None:
+            provider = _instances[cls] = cls()
+        return provider
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=len(ALL_PROVIDERS) * 2, thread_name_prefix="METADATA")
+        return _executor
+
 
 def get_available_providers() -> list[MetadataProvider]:
-    """Return instantiated providers that have valid credentials."""
-    return [cls() for cls in ALL_PROVIDERS if cls().is_available()]
+    """Return the providers that have valid credentials, in priority order."""
+    return [p for p in map(_get_instance, ALL_PROVIDERS) if p.is_available()]
 
 
 def get_provider(name: str) -> Optional[MetadataProvider]:
     """Get a specific provider by name."""
     for cls in ALL_PROVIDERS:
         if cls.NAME == name:
-            p = cls()
+            p = _get_instance(cls)
             return p if p.is_available() else None
     return None
 
@@ -41,14 +68,20 @@ def search_metadata(
     cache_title_id: Optional[str] = None,
     cache_region: Optional[str] = None,
     cache_account_hash: Optional[str] = None,
+    timeout: float = SEARCH_TIMEOUT,
 ) -> Optional[MetadataResult]:
-    """Search all available providers for metadata. Returns best match."""
+    """
+    Search all available providers for metadata. Returns best match.
+
+    The providers are searched at the same time, and the result of the highest
+    priority provider that matches the title is used. Providers that haven't
+    answered within timeout seconds are skipped.
+    """
+    providers = get_available_providers()
+
     # Check cache first
     if title_cacher and cache_title_id:
-        for cls in ALL_PROVIDERS:
-            p = cls()
-            if not p.is_available():
-                continue
+        for p in providers:
             cached = title_cacher.get_cached_provider(p.NAME, cache_title_id, kind, cache_region, cache_account_hash)
             if cached:
                 result = _cached_to_result(cached, p.NAME, kind)
@@ -56,17 +89,25 @@ def search_metadata(
                     log.debug("Using cached %s data for %r", p.NAME, title)
                     return result
 
-    # Search providers in priority order
-    for cls in ALL_PROVIDERS:
-        p = cls()
-        if not p.is_available():
-            continue
+    # Search every provider at once, using them in priority order
+    executor = _get_executor()
+    searches: list[tuple[MetadataProvider, Future]] = [
+        (p, executor.submit(p.search, title, year, kind)) for p in providers
+    ]
+    deadline = time.monotonic() + timeout
+    for p, future in searches:
         try:
-            result = p.search(title, year, kind)
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            log.debug("%s search timed out", p.NAME)
+            continue
         except (requests.RequestException, ValueError, KeyError) as exc:
             log.debug("%s search failed: %s", p.NAME, exc)
             continue
         if result and result.title and fuzzy_match(result.title, title):
+            # the searches of lower priority providers aren't needed, those already running are left to finish
+            for _, other in searches:
+                other.cancel()
             # Enrich with cross-referenced IDs if we have IMDB but missing TMDB/TVDB
             enrich_ids(result)
             # Cache the result (include enriched IDs so they survive round-trip)
@@ -249,14 +290,18 @@ def enrich_ids(result: MetadataResult) -> None:
 
     kind = result.kind or "movie"
 
-    # Step 1: Collect enrichment results from all available providers
-    enrichments: list[tuple[str, ExternalIds]] = []
+    # Step 1: Collect enrichment results from all available providers, at once
+    executor = _get_executor()
+    lookups: list[tuple[str, Future]] = []
     for provider_name in _ENRICHMENT_PROVIDERS:
         p = get_provider(provider_name)
-        if not p:
-            continue
+        if p:
+            lookups.append((provider_name, executor.submit(p.find_by_imdb_id, ids.imdb_id, kind)))  # type: ignore[attr-defined]
+
+    enrichments: list[tuple[str, ExternalIds]] = []
+    for provider_name, future in lookups:
         try:
-            enriched = p.find_by_imdb_id(ids.imdb_id, kind)  # type: ignore[union-attr]
+            enriched = future.result()
         except Exception as exc:
             log.debug("Enrichment via %s failed: %s", provider_name, exc)
             continue
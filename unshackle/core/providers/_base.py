@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import json
 import logging
 import re
+import threading
+import time
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from difflib import SequenceMatcher
-from typing import Optional, Union
+from typing import Any, Hashable, Optional, Union
 
 import requests
 from requests.adapters import HTTPAdapter, Retry
@@ -17,6 +21,9 @@ HEADERS = {"User-Agent": "unshackle-tags/1.0"}
 STRIP_RE = re.compile(r"[^a-z0-9]+", re.I)
 YEAR_RE = re.compile(r"\s*\(?[12][0-9]{3}\)?$")
 
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = 60 * 60  # seconds a provider response is reused
+
 
 @dataclass
 class ExternalIds:
@@ -40,6 +47,84 @@ class MetadataResult:
     raw: Optional[dict] = None  # original API response for caching
 
 
+class ResponseCache:
+    """
+    TTL and LRU cache of successful provider responses, by request.
+
+    It is shared by every provider of the process, and isn't tied to a title, so
+    the same search or lookup made for each episode, file or tag of a run is only
+    requested once. Responses are kept rather than their parsed data, so each use
+    parses its own copy with Response.json().
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[requests.Response, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[requests.Response]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            response, expires = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: Hashable, response: requests.Response) -> None:
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+class CachedSession(requests.Session):
+    """Session that reuses successful GET and POST responses from the shared ResponseCache."""
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:
+        key = self._get_cache_key(method, url, args, kwargs)
+        if key is None:
+            return super().request(method, url, *args, **kwargs)
+
+        response = response_cache.get(key)
+        if response is not None:
+            log.debug("Using cached response for %s %s", method.upper(), url)
+            return response
+
+        response = super().request(method, url, *args, **kwargs)
+        if response.status_code == 200:
+            _ = response.content  # read it all, so it can be used again
+            response_cache.set(key, response)
+        return response
+
+    @staticmethod
+    def _get_cache_key(method: str, url: str, args: tuple, kwargs: dict[str, Any]) -> Optional[Hashable]:
+        method = method.upper()
+        if method not in ("GET", "POST") or args or kwargs.get("data") or kwargs.get("files"):
+            return None
+        try:
+            return (
+                method,
+                url,
+                json.dumps(kwargs.get("params"), sort_keys=True),
+                json.dumps(kwargs.get("json"), sort_keys=True),
+            )
+        except TypeError:
+            return None
+
+
 class MetadataProvider(metaclass=ABCMeta):
     """Abstract base for metadata providers."""
 
@@ -53,7 +138,7 @@ class MetadataProvider(metaclass=ABCMeta):
     @property
     def session(self) -> requests.Session:
         if self._session is None:
-            self._session = requests.Session()
+            self._session = CachedSession()
             self._session.headers.update(HEADERS)
             retry = Retry(
                 total=3,
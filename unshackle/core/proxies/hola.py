@@ -8,16 +8,18 @@ from unshackle.core.proxies.proxy import Proxy
 
 
 class Hola(Proxy):
-    def __init__(self):
+    def __init__(self, countries: Optional[list[dict[str, str]]] = None):
         """
         Proxy Service using Hola's direct connections via the hola-proxy project.
         https://github.com/Snawoot/hola-proxy
+
+        The countries are listed by running hola-proxy, unless they're given as `countries`.
         """
         self.binary = binaries.HolaProxy
         if not self.binary:
             raise EnvironmentError("hola-proxy executable not found but is required for the Hola proxy provider.")
 
-        self.countries = self.get_countries()
+        self.countries = self.get_countries() if countries is None else countries
 
     def __repr__(self) -> str:
         countries = len(self.countries)
@@ -1,20 +1,31 @@
 import json
 import random
 import re
+import time
 from typing import Optional
 
 import requests
 
 from unshackle.core.proxies.proxy import Proxy
 
+RECOMMENDED_TTL = 600  # seconds to reuse the recommended servers of a country
+
 
 class NordVPN(Proxy):
-    def __init__(self, username: str, password: str, server_map: Optional[dict[str, int]] = None):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        server_map: Optional[dict[str, int]] = None,
+        countries: Optional[list[dict]] = None,
+    ):
         """
         Proxy Service using NordVPN Service Credentials.
 
         A username and password must be provided. These are Service Credentials, not your Login Credentials.
         The Service Credentials can be found here: https://my.nordaccount.com/dashboard/nordvpn/
+
+        NordVPN's list of countries is only requested if it's not given as `countries`, e.g., saved by ProxyRegistry.
         """
         if not username:
             raise ValueError("No Username was provided to the NordVPN Proxy Service.")
@@ -33,7 +44,8 @@ class NordVPN(Proxy):
         self.password = password
         self.server_map = server_map or {}
 
-        self.countries = self.get_countries()
+        self.countries = self.get_countries() if countries is None else countries
+        self.recommended_servers: dict[int, tuple[float, list[dict]]] = {}
 
     def __repr__(self) -> str:
         countries = len(self.countries)
@@ -88,8 +100,11 @@ class NordVPN(Proxy):
                 # country was set to a specific server ID in config
                 hostname = f"{country['code'].lower()}{server_mapping}.nordvpn.com"
             else:
-                # get the recommended server ID
-                recommended_servers = self.get_recommended_servers(country["id"])
+                # get the recommended server ID, reusing recent recommendations
+                fetched, recommended_servers = self.recommended_servers.get(country["id"], (0.0, []))
+                if not recommended_servers or time.monotonic() - fetched > RECOMMENDED_TTL:
+                    recommended_servers = self.get_recommended_servers(country["id"])
+                    self.recommended_servers[country["id"]] = (time.monotonic(), recommended_servers)
                 if not recommended_servers:
                     raise ValueError(
                         f"The NordVPN Country {query} currently has no recommended servers. "
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from unshackle.core import binaries
+from unshackle.core.config import config
+from unshackle.core.proxies.basic import Basic
+from unshackle.core.proxies.hola import Hola
+from unshackle.core.proxies.nordvpn import NordVPN
+from unshackle.core.proxies.proxy import Proxy
+from unshackle.core.proxies.surfsharkvpn import SurfsharkVPN
+from unshackle.core.proxies.windscribevpn import WindscribeVPN
+
+SERVER_LIST_TTL = 6 * 60 * 60  # seconds a cached server list is used before it's refreshed
+RETRY_DELAY = 60  # seconds before a failed provider load or server list refresh is retried, doubled after every failure
+
+log = logging.getLogger("ProxyRegistry")
+
+_lock = threading.Lock()
+_registry: Optional[ProxyRegistry] = None
+
+
+class ProxyRegistry:
+    """
+    The proxy providers of a process, made once and shared by everything resolving a proxy.
+
+    Providers that fetch a server list when made, e.g., the countries of NordVPN, are
+    made with the list saved to the directory by a previous run if there is one, so
+    they're made without waiting on the remote server list. A list older than ttl
+    seconds is still used, but fetched again in the background, and swapped into the
+    provider once it's been fetched.
+
+    Providers that fail to load, and server lists that fail to refresh, are tried
+    again in the background, first after RETRY_DELAY seconds and then after twice
+    as long each time they fail, at most ttl.
+    """
+
+    def __init__(self, proxy_config: dict[str, Any], directory: Optional[Path] = None, ttl: float = SERVER_LIST_TTL):
+        """
+        Parameters:
+            proxy_config: The `proxy_providers` config, of each provider by its key name.
+            directory: The directory to save the server lists to, if any, for later runs.
+            ttl: Seconds to use a server list before fetching it again.
+        """
+        self.proxy_config = proxy_config or {}
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        # only held while the providers are first made, so the rest of the registry isn't blocked by it
+        self._load_lock = threading.Lock()
+        self._providers: Optional[list[Proxy]] = None
+        self._configs: list[tuple[Callable[..., Proxy], dict[str, Any]]] = []
+        self._failed: list[tuple[Callable[..., Proxy], dict[str, Any]]] = []
+        self._failures = 0
+        self._retry_at = 0.0
+        self._retrying = False
+        self._fetched: dict[str, float] = {}
+        self._refreshing: set[str] = set()
+        # failed refreshes of each server list in a row, and when it's next tried
+        self._refresh_failures: dict[str, int] = {}
+        self._refresh_at: dict[str, float] = {}
+
+    @property
+    def providers(self) -> list[Proxy]:
+        """
+        Get the proxy providers, making them the first time, and loading failed providers
+        again and refreshing stale server lists in the background.
+        """
+        if self._providers is None:
+            with self._load_lock:
+                if self._providers is None:
+                    configs = self._get_configs()
+                    loaded, failed = self._load(configs)
+                    with self._lock:
+                        self._configs = configs
+                        self._providers = loaded
+                        self._set_failed(failed)
+        self.retry()
+        self.refresh()
+        return self._providers
+
+    def retry(self, force: bool = False) -> None:
+        """Load the providers that failed to load again in the background, once they're due, or always if forced."""
+        with self._lock:
+            if not self._failed or self._retrying:
+                return
+            if not force and time.time() < self._retry_at:
+                return
+            self._retrying = True
+            failed = self._failed
+        threading.Thread(target=self._retry, args=(failed,), name="ProxyRegistry-retry", daemon=True).start()
+
+    def refresh(self, force: bool = False) -> None:
+        """Fetch the server list of each provider again in the background, if it's stale, or always if forced."""
+        for provider in self._providers or []:
+            name = type(provider).__name__.lower()
+            with self._lock:
+                if name not in self._fetched or name in self._refreshing:
+                    continue
+                if not force and (
+                    time.time() - self._fetched[name] < self.ttl or time.time() < self._refresh_at.get(name, 0)
+                ):
+                    continue
+                self._refreshing.add(name)
+            threading.Thread(
+                target=self._refresh, args=(name, provider), name=f"ProxyRegistry-{name}", daemon=True
+            ).start()
+
+    def _get_configs(self) -> list[tuple[Callable[..., Proxy], dict[str, Any]]]:
+        providers: list[tuple[Callable[..., Proxy], dict[str, Any]]] = []
+        if self.proxy_config.get("basic"):
+            providers.append((Basic, self.proxy_config["basic"]))
+        if self.proxy_config.get("nordvpn"):
+            providers.append((NordVPN, self.proxy_config["nordvpn"]))
+        if self.proxy_config.get("surfsharkvpn"):
+            providers.append((SurfsharkVPN, self.proxy_config["surfsharkvpn"]))
+        if self.proxy_config.get("windscribevpn"):
+            providers.append((WindscribeVPN, self.proxy_config["windscribevpn"]))
+        if binaries.HolaProxy:
+            providers.append((Hola, {}))
+        return providers
+
+    def _load(
+        self, configs: list[tuple[Callable[..., Proxy], dict[str, Any]]]
+    ) -> tuple[list[Proxy], list[tuple[Callable[..., Proxy], dict[str, Any]]]]:
+        """Make the providers of each config, returning the providers made and the configs that failed."""
+        loaded = []
+        failed = []
+        for cls, kwargs in configs:
+            try:
+                if hasattr(cls, "get_countries"):
+                    provider = self._load_with_server_list(cls, kwargs)
+                else:
+                    provider = cls(**kwargs)
+            except Exception as e:
+                log.warning(f"Failed to load the {cls.__name__} proxy provider, it will be retried: {e}")
+                failed.append((cls, kwargs))
+                continue
+            log.info(f"Loaded {cls.__name__}: {provider}")
+            loaded.append(provider)
+
+        if not configs:
+            log.warning("No proxy providers were loaded. Check your proxy provider configuration in unshackle.yaml")
+
+        return loaded, failed
+
+    def _retry(self, failed: list[tuple[Callable[..., Proxy], dict[str, Any]]]) -> None:
+        try:
+            loaded, failed = self._load(failed)
+            with self._lock:
+                if loaded:
+                    # swap in a new list, callers may still be using the old one, kept in the config order
+                    order = [cls for cls, _ in self._configs]
+                    self._providers = sorted(self._providers + loaded, key=lambda x: order.index(type(x)))
+                self._set_failed(failed)
+        finally:
+            with self._lock:
+                self._retrying = False
+
+    def _set_failed(self, failed: list[tuple[Callable[..., Proxy], dict[str, Any]]]) -> None:
+        self._failed = failed
+        if not failed:
+            self._failures = 0
+            return
+        self._retry_at = time.time() + self._get_retry_delay(self._failures)
+        self._failures += 1
+
+    def _get_retry_delay(self, failures: int) -> float:
+        """Get the seconds to wait before trying again after an amount of failures in a row."""
+        return min(RETRY_DELAY * 2**failures, self.ttl)
+
+    def _load_with_server_list(self, cls: Callable[..., Proxy], kwargs: dict[str, Any]) -> Proxy:
+        name = cls.__name__.lower()
+        cached = self._read(name)
+        if cached:
+            fetched, countries = cached
+            provider = cls(**kwargs, countries=countries)
+        else:
+            provider = cls(**kwargs)
+            fetched = time.time()
+            self._write(name, provider.countries)
+        with self._lock:
+            self._fetched[name] = fetched
+        return provider
+
+    def _refresh(self, name: str, provider: Proxy) -> None:
+        try:
+            countries = provider.get_countries()
+            provider.countries = countries
+            self._write(name, countries)
+            with self._lock:
+                self._fetched[name] = time.time()
+                self._refresh_failures.pop(name, None)
+                self._refresh_at.pop(name, None)
+            log.debug(f"Refreshed the server list of {type(provider).__name__}")
+        except Exception as e:
+            # keep using the stale list, but try again soon rather than after another ttl
+            with self._lock:
+                failures = self._refresh_failures.get(name, 0)
+                delay = self._get_retry_delay(failures)
+                self._refresh_failures[name] = failures + 1
+                self._refresh_at[name] = time.time() + delay
+            log.warning(
+                f"Failed to refresh the server list of {type(provider).__name__}, retrying in {delay:.0f}s: {e}"
+            )
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+    def _get_path(self, name: str) -> Optional[Path]:
+        if not self.directory:
+            return None
+        return self.directory / f"{name}.json"
+
+    def _read(self, name: str) -> Optional[tuple[float, Any]]:
+        path = self._get_path(name)
+        if not path or not path.is_file():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf8"))
+            return float(data["fetched"]), data["countries"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug(f"Ignoring unreadable cached server list {path.name}: {e}")
+            return None
+
+    def _write(self, name: str, countries: Any) -> None:
+        path = self._get_path(name)
+        if not path:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps({"fetched": time.time(), "countries": countries}), encoding="utf8")
+            temp_path.replace(path)
+        except (OSError, TypeError) as e:
+            log.debug(f"Failed to save the server list to the cache: {e}")
+
+
+def get_proxy_registry() -> ProxyRegistry:
+    """Get the ProxyRegistry of this process, made from the `proxy_providers` config."""
+    global _registry
+    with _lock:
+        if _registry is None:
+            _registry = ProxyRegistry(
+                proxy_config=config.proxy_providers,
+                directory=config.directories.cache / "proxies",
+                ttl=float(config.serve.get("proxy_server_list_ttl", SERVER_LIST_TTL)),
+            )
+        return _registry
+
+
+__all__ = ("ProxyRegistry", "get_proxy_registry")
@@ -9,12 +9,20 @@ from unshackle.core.proxies.proxy import Proxy
 
 
 class SurfsharkVPN(Proxy):
-    def __init__(self, username: str, password: str, server_map: Optional[dict[str, int]] = None):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        server_map: Optional[dict[str, int]] = None,
+        countries: Optional[list[dict]] = None,
+    ):
         """
         Proxy Service using SurfsharkVPN Service Credentials.
 
         A username and password must be provided. These are Service Credentials, not your Login Credentials.
         The Service Credentials can be found here: https://my.surfshark.com/vpn/manual-setup/main/openvpn
+
+        Give `countries` from an earlier get_countries() to skip requesting the Surfshark server list again.
         """
         if not username:
             raise ValueError("No Username was provided to the SurfsharkVPN Proxy Service.")
@@ -33,7 +41,7 @@ class SurfsharkVPN(Proxy):
         self.password = password
         self.server_map = server_map or {}
 
-        self.countries = self.get_countries()
+        self.countries = self.get_countries() if countries is None else countries
 
     def __repr__(self) -> str:
         countries = len(set(x.get("country") for x in self.countries if x.get("country")))
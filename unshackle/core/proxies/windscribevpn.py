@@ -9,12 +9,20 @@ from unshackle.core.proxies.proxy import Proxy
 
 
 class WindscribeVPN(Proxy):
-    def __init__(self, username: str, password: str, server_map: Optional[dict[str, str]] = None):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        server_map: Optional[dict[str, str]] = None,
+        countries: Optional[list[dict]] = None,
+    ):
         """
         Proxy Service using WindscribeVPN Service Credentials.
 
         A username and password must be provided. These are Service Credentials, not your Login Credentials.
         The Service Credentials can be found here: https://windscribe.com/getconfig/openvpn
+
+        The Windscribe locations are requested when it's made, unless they're given as `countries`.
         """
         if not username:
             raise ValueError("No Username was provided to the WindscribeVPN Proxy Service.")
@@ -28,7 +36,7 @@ class WindscribeVPN(Proxy):
         self.password = password
         self.server_map = server_map or {}
 
-        self.countries = self.get_countries()
+        self.countries = self.get_countries() if countries is None else countries
 
     def __repr__(self) -> str:
         countries = len(set(x.get("country_code") for x in self.countries if x.get("country_code")))
@@ -1,11 +1,20 @@
+from __future__ import annotations
+
+import ast
+import json
+import logging
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 import click
 
 from unshackle.core.config import config
-from unshackle.core.service import Service
 from unshackle.core.utilities import import_module_by_path
 
+if TYPE_CHECKING:
+    from unshackle.core.service import Service
+
 _service_dirs = config.directories.services
 if not isinstance(_service_dirs, list):
     _service_dirs = [_service_dirs]
@@ -15,9 +24,12 @@ _SERVICES = sorted(
     key=lambda x: x.parent.stem,
 )
 
-_MODULES = {path.parent.stem: getattr(import_module_by_path(path), path.parent.stem) for path in _SERVICES}
+# services are only imported once loaded, their aliases are read from their code, see get_aliases()
+_MODULES: dict[str, type[Service]] = {}
+_ALIASES: Optional[dict[str, tuple[str, ...]]] = None
+_lock = threading.RLock()
 
-_ALIASES = {tag: getattr(module, "ALIASES") for tag, module in _MODULES.items()}
+log = logging.getLogger("Services")
 
 
 class Services(click.MultiCommand):
@@ -74,21 +86,99 @@ class Services(click.MultiCommand):
         original_value = value
         value = value.lower()
 
+        aliases = Services.get_aliases()
         for path in _SERVICES:
             tag = path.parent.stem
-            if value in (tag.lower(), *_ALIASES.get(tag, [])):
+            if value in (tag.lower(), *aliases.get(tag, [])):
                 return tag
 
         return original_value
 
     @staticmethod
-    def load(tag: str) -> Service:
+    def get_aliases() -> dict[str, tuple[str, ...]]:
+        """
+        Get the Aliases of every Service by Service tag, without importing the Services.
+
+        The ALIASES of a Service are read from the code of its class, and kept in an index
+        in the cache directory until the code changes. Services with ALIASES that can't be
+        read from the code, e.g., that aren't a literal tuple, are imported to get them.
+        """
+        global _ALIASES
+        with _lock:
+            if _ALIASES is not None:
+                return _ALIASES
+
+            index_path = config.directories.cache / "services.json"
+            try:
+                index = json.loads(index_path.read_text(encoding="utf8"))
+            except (OSError, ValueError):
+                index = {}
+
+            aliases = {}
+            new_index = {}
+            for path in _SERVICES:
+                tag = path.parent.stem
+                stat = path.stat()
+                entry = index.get(str(path))
+                if not entry or entry.get("mtime") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
+                    try:
+                        entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "aliases": _read_aliases(path, tag)}
+                    except (OSError, SyntaxError, ValueError):
+                        entry = {"mtime": None, "aliases": getattr(Services.load(tag), "ALIASES")}
+                aliases[tag] = tuple(entry["aliases"])
+                new_index[str(path)] = entry
+
+            if new_index != index:
+                try:
+                    index_path.parent.mkdir(parents=True, exist_ok=True)
+                    temp_path = index_path.with_suffix(".tmp")
+                    temp_path.write_text(json.dumps(new_index), encoding="utf8")
+                    temp_path.replace(index_path)
+                except OSError as e:
+                    log.debug(f"Failed to save the Service alias index: {e}")
+
+            _ALIASES = aliases
+            return _ALIASES
+
+    @staticmethod
+    def load(tag: str) -> type[Service]:
         """Load a Service module by Service tag."""
-        module = _MODULES.get(tag)
-        if module:
+        path = next((x for x in _SERVICES if x.parent.stem == tag), None)
+        if not path:
+            raise KeyError(f"There is no Service added by the Tag '{tag}'")
+
+        with _lock:
+            module = _MODULES.get(tag)
+            if not module:
+                module = _MODULES[tag] = getattr(import_module_by_path(path), tag)
             return module
 
-        raise KeyError(f"There is no Service added by the Tag '{tag}'")
+
+def _read_aliases(path: Path, tag: str) -> list[str]:
+    """
+    Read the ALIASES of a Service class from its code.
+
+    Raises:
+        ValueError: If the class could not be found, or it has ALIASES that aren't a literal.
+    """
+    tree = ast.parse(path.read_text(encoding="utf8"), filename=str(path))
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef) or node.name != tag:
+            continue
+        for item in node.body:
+            if isinstance(item, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == "ALIASES" for target in item.targets
+            ):
+                return list(ast.literal_eval(item.value))
+            if isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name) and item.target.id == "ALIASES":
+                if item.value is None:
+                    break
+                return list(ast.literal_eval(item.value))
+        if any(not (isinstance(base, ast.Name) and base.id == "Service") for base in node.bases):
+            # it may inherit the ALIASES of another class
+            raise ValueError(f"Unable to read the ALIASES of {tag}, its class has other bases")
+        return []
+    raise ValueError(f"Unable to find the class of {tag} in {path}")
 
 
 __all__ = ("Services",)
@@ -58,6 +58,26 @@ FINGERPRINT_PRESETS = {
 }
 
 
+def get_retry_after(headers: Any) -> float | None:
+    """
+    Get the amount of seconds a Retry-After response header asks to wait for.
+
+    The header may be an amount of seconds or an HTTP date. Returns None if there's
+    no header or it cannot be parsed. It may be negative if the date has passed.
+    """
+    retry_after = headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            retry_date = parsedate_to_datetime(retry_after)
+            return (retry_date - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+
 class MaxRetriesError(exceptions.RequestException):
     def __init__(self, message, cause=None):
         super().__init__(message)
@@ -92,13 +112,9 @@ class CurlSession(Session):
 
     def get_sleep_time(self, response: Response | None, attempt: int) -> float | None:
         if response:
-            retry_after = response.headers.get("Retry-After")
-            if retry_after:
-                try:
-                    return float(retry_after)
-                except ValueError:
-                    if retry_date := parsedate_to_datetime(retry_after):
-                        return (retry_date - datetime.now(timezone.utc)).total_seconds()
+            retry_after = get_retry_after(response.headers)
+            if retry_after is not None:
+                return retry_after
 
         if attempt == 0:
             return 0.0
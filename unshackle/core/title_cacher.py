@@ -97,9 +97,7 @@ class TitleCacher:
         # If reset_cache flag is set, clear the cache entry
         if reset_cache:
             self.log.info(f"Clearing cache for {cache_key}")
-            cache_path = (config.directories.cache / self.service_name / cache_key).with_suffix(".json")
-            if cache_path.exists():
-                cache_path.unlink()
+            Cacher(self.service_name, cache_key).delete()
 
         # Try to get from cache
         cache = self.cacher.get(cache_key, version=1)
@@ -158,11 +156,10 @@ class TitleCacher:
 
     def clear_all_title_cache(self):
         """Clear all title caches for this service."""
-        cache_dir = config.directories.cache / self.service_name
-        if cache_dir.exists():
-            for cache_file in cache_dir.glob("titles_*.json"):
-                cache_file.unlink()
-                self.log.info(f"Cleared cache file: {cache_file.name}")
+        for cache_key in self.cacher.keys():
+            if cache_key.startswith("titles_"):
+                Cacher(self.service_name, cache_key).delete()
+                self.log.info(f"Cleared cache entry: {cache_key}")
 
     def get_cache_stats(self) -> dict:
         """Get cache statistics."""
@@ -138,6 +138,10 @@ class Series(SortedKeyList, ABC):
     def __init__(self, iterable: Optional[Iterable] = None):
         super().__init__(iterable, key=lambda x: (x.season, x.number, x.year or 0))
 
+    def __reduce__(self) -> tuple:
+        # the sort key is a lambda, so pickle only the titles, it's set again by __init__
+        return type(self), (list(self),)
+
     def __str__(self) -> str:
         if not self:
             return super().__str__()
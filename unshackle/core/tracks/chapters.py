@@ -20,6 +20,10 @@ class Chapters(SortedKeyList, ABC):
         for chapter in iterable or []:
             self.add(chapter)
 
+    def __reduce__(self) -> tuple:
+        # the sort key is a lambda, so pickle only the chapters, it's set again by __init__
+        return type(self), (list(self),)
+
     def __repr__(self) -> str:
         return "{name}({items})".format(
             name=self.__class__.__name__, items=", ".join([f"{k}={repr(v)}" for k, v in self.__dict__.items()])
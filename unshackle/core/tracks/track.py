@@ -21,7 +21,9 @@ from unshackle.core import binaries
 from unshackle.core.cdm.detect import is_playready_cdm, is_widevine_cdm
 from unshackle.core.config import config
 from unshackle.core.constants import DOWNLOAD_CANCELLED, DOWNLOAD_LICENCE_ONLY
-from unshackle.core.downloaders import aria2c, curl_impersonate, n_m3u8dl_re, requests
+from unshackle.core.downloaders import aiohttp, aria2c, bandwidth, curl_impersonate, n_m3u8dl_re, requests
+from unshackle.core.downloaders.control import ControlFile, SegmentJournal
+from unshackle.core.downloaders.telemetry import Telemetry, set_telemetry
 from unshackle.core.drm import DRM_T, PlayReady, Widevine
 from unshackle.core.events import events
 from unshackle.core.utilities import get_boxes, try_ensure_utf8
@@ -89,6 +91,7 @@ class Track:
 
         if downloader is None:
             downloader = {
+                "aiohttp": aiohttp,
                 "aria2c": aria2c,
                 "curl_impersonate": curl_impersonate,
                 "requests": requests,
@@ -166,8 +169,10 @@ class Track:
           - period: lxml.Element - The period of this track.
           - adaptation_set: lxml.Element - The adaptation set of this track.
           - representation: lxml.Element - The representation of this track.
+          - filtered_period_ids: list[str] - IDs of the periods that were filtered out of the manifest.
+          - filtered_manifest: FilteredManifest - The manifest without those periods, shared by its tracks.
           - timescale: int - The timescale of the track's segments.
-          - segment_durations: list[int] - A list of each segment's duration.
+          - segment_durations: array[int] - A list of each segment's duration (or $Time$ with a SegmentTimeline).
 
         You should not add, change, or remove any data within reserved keys.
         You may use their data but do note that the values of them may change
@@ -191,8 +196,15 @@ class Track:
         progress: Optional[partial] = None,
         *,
         cdm: Optional[object] = None,
+        resume: bool = False,
     ):
-        """Download and optionally Decrypt this Track."""
+        """
+        Download and optionally Decrypt this Track.
+
+        If resume is set, temp data from a previous interrupted download of this track
+        is continued from instead of being deleted, as long as it can be verified by
+        its control files. See `unshackle.core.downloaders.control`.
+        """
         from unshackle.core.manifests import DASH, HLS, ISM
 
         if DOWNLOAD_LICENCE_ONLY.is_set():
@@ -204,6 +216,13 @@ class Track:
 
         log = logging.getLogger("track")
 
+        # the downloads of this thread share bandwidth with other tracks by this track's priority class
+        bandwidth.set_priority(self)
+
+        # the downloads of this thread add their bytes to the track's telemetry, e.g., for its progress bar's ETA
+        telemetry = getattr(progress, "telemetry", None) or Telemetry()
+        set_telemetry(telemetry)
+
         proxy = next(iter(session.proxies.values()), None)
 
         track_type = self.__class__.__name__
@@ -217,19 +236,26 @@ class Track:
         ):
             self.downloader = requests
 
+        if resume and self.downloader.__name__ == "n_m3u8dl_re":
+            log.warning("N_m3u8DL-RE downloads can't be resumed, downloading the track from the start")
+
         if self.descriptor != self.Descriptor.URL:
             save_dir = save_path.with_name(save_path.name + "_segments")
         else:
             save_dir = save_path.parent
 
-        def cleanup():
-            # track file (e.g., "foo.mp4")
-            save_path.unlink(missing_ok=True)
+        def cleanup(keep_resumable: bool = False):
+            # track file (e.g., "foo.mp4") and its control file (e.g., "foo.mp4.!dev")
+            control_file = ControlFile(save_path)
+            if not (keep_resumable and control_file.exists()):
+                save_path.unlink(missing_ok=True)
+                control_file.delete()
             # aria2c control file (e.g., "foo.mp4.aria2" or "foo.mp4.aria2__temp")
             save_path.with_suffix(f"{save_path.suffix}.aria2").unlink(missing_ok=True)
             save_path.with_suffix(f"{save_path.suffix}.aria2__temp").unlink(missing_ok=True)
             if save_dir.exists() and save_dir.name.endswith("_segments"):
-                shutil.rmtree(save_dir)
+                if not (keep_resumable and SegmentJournal.exists(save_dir)):
+                    shutil.rmtree(save_dir)
 
         if not DOWNLOAD_LICENCE_ONLY.is_set():
             if config.directories.temp.is_file():
@@ -238,11 +264,11 @@ class Track:
             config.directories.temp.mkdir(parents=True, exist_ok=True)
 
             # Delete any pre-existing temp files matching this track.
-            # We can't re-use or continue downloading these tracks as they do not use a
-            # lock file. Or at least the majority don't. Even if they did I've encountered
-            # corruptions caused by sudden interruptions to the lock file.
-            cleanup()
+            # When resuming, only data protected by a control file or segment journal is
+            # kept, anything else may be corrupt from a sudden interruption.
+            cleanup(keep_resumable=resume)
 
+        telemetry.start()
         try:
             if self.descriptor == self.Descriptor.HLS:
                 HLS.download_track(
@@ -381,8 +407,10 @@ class Track:
                     raise
         except (Exception, KeyboardInterrupt):
             if not DOWNLOAD_LICENCE_ONLY.is_set():
-                cleanup()
+                cleanup(keep_resumable=resume)
             raise
+        finally:
+            telemetry.finish()
 
         if DOWNLOAD_CANCELLED.is_set():
             # we stopped during the download, let's exit
@@ -531,15 +559,16 @@ class Track:
             return True
 
         try:
-            import m3u8
             from pyplayready.system.pssh import PSSH as PR_PSSH
             from pywidevine.cdm import Cdm as WidevineCdm
             from pywidevine.pssh import PSSH as WV_PSSH
 
+            from unshackle.core.manifests.playlist_cache import get_playlist_cache
+
             session = getattr(self, "session", None) or Session()
 
-            response = session.get(self.url)
-            playlist = m3u8.loads(response.text, self.url)
+            # shared with the download of the track, so the playlist is only fetched and parsed once
+            playlist = get_playlist_cache().load(self.url, session)
 
             drm_list = []
 
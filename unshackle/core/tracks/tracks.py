@@ -2,19 +2,22 @@ from __future__ import annotations
 
 import logging
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from pathlib import Path
 from typing import Callable, Iterator, Optional, Sequence, Union
 
 from langcodes import Language, closest_supported_match
-from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn, TimeRemainingColumn
+from rich.progress import BarColumn, Progress, SpinnerColumn, Task, TextColumn, TimeRemainingColumn
 from rich.table import Table
+from rich.text import Text
 from rich.tree import Tree
 
 from unshackle.core import binaries
 from unshackle.core.config import config
 from unshackle.core.console import console
 from unshackle.core.constants import LANGUAGE_EXACT_DISTANCE, LANGUAGE_MAX_DISTANCE, AnyTrack, TrackT
+from unshackle.core.downloaders.telemetry import Telemetry
 from unshackle.core.events import events
 from unshackle.core.tracks.attachment import Attachment
 from unshackle.core.tracks.audio import Audio
@@ -25,6 +28,34 @@ from unshackle.core.tracks.video import Video
 from unshackle.core.utilities import get_debug_logger, is_close_match, sanitize_filename
 from unshackle.core.utils.collections import as_list, flatten
 
+DRM_LOAD_WORKERS = 8  # deferred DRM of tracks loaded at once, each is usually a request for its playlist
+
+
+class TelemetryTimeRemainingColumn(TimeRemainingColumn):
+    """
+    Time remaining of a track's download, from the bytes and throughput of its telemetry.
+
+    Segmented downloads advance the bar per segment, which would make the ETA jump
+    around with segment sizes and request latency. Falls back to rich's estimate
+    while the telemetry has no estimate, e.g., for downloaders that don't feed it.
+    """
+
+    def __init__(self, telemetry: Telemetry, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.telemetry = telemetry
+
+    def render(self, task: Task) -> Text:
+        eta = None if task.finished else self.telemetry.get_eta()
+        if eta is None:
+            return super().render(task)
+        minutes, seconds = divmod(int(eta), 60)
+        hours, minutes = divmod(minutes, 60)
+        if self.compact and not hours:
+            formatted = f"{minutes:02d}:{seconds:02d}"
+        else:
+            formatted = f"{hours:d}:{minutes:02d}:{seconds:02d}"
+        return Text(formatted, style="progress.remaining")
+
 
 class Tracks:
     """
@@ -109,11 +140,12 @@ class Tracks:
                 tracks_tree = tree.add(f"[repr.number]{num_tracks}[/] {track_type_plural}")
                 for track in tracks:
                     if add_progress and track_type not in (Chapter, Attachment):
+                        telemetry = Telemetry()
                         progress = Progress(
                             SpinnerColumn(finished_text=""),
                             BarColumn(),
                             "•",
-                            TimeRemainingColumn(compact=True, elapsed_when_finished=True),
+                            TelemetryTimeRemainingColumn(telemetry, compact=True, elapsed_when_finished=True),
                             "•",
                             TextColumn("[progress.data.speed]{task.fields[downloaded]}"),
                             console=console,
@@ -142,6 +174,8 @@ class Tracks:
                                 kwargs["completed"] = _state["total"]
                             _progress.update(task_id=task_id, **kwargs)
 
+                        # the track's downloaders add their bytes to it, see `Track.download()`
+                        update_track_progress.telemetry = telemetry
                         progress_callables.append(update_track_progress)
                         track_table = Table.grid()
                         track_table.add_row(str(track)[6:], style="text2")
@@ -198,8 +232,10 @@ class Tracks:
             tracks = [*list(tracks), *tracks.chapters, *tracks.attachments]
 
         duplicates = 0
+        # same as exists(by_id=...), without a scan of every track per added track
+        track_ids = {x.id for x in self}
         for track in flatten(tracks):
-            if self.exists(by_id=track.id):
+            if track.id in track_ids:
                 if not warn_only:
                     raise ValueError(
                         "One or more of the provided Tracks is a duplicate. "
@@ -214,10 +250,13 @@ class Tracks:
 
             if isinstance(track, Video):
                 self.videos.append(track)
+                track_ids.add(track.id)
             elif isinstance(track, Audio):
                 self.audio.append(track)
+                track_ids.add(track.id)
             elif isinstance(track, Subtitle):
                 self.subtitles.append(track)
+                track_ids.add(track.id)
             elif isinstance(track, Chapter):
                 self.chapters.add(track)
             elif isinstance(track, Attachment):
@@ -363,6 +402,35 @@ class Tracks:
             )
         return selected
 
+    def load_drm(self, service: Optional[object] = None, max_workers: int = DRM_LOAD_WORKERS) -> None:
+        """
+        Load the DRM of the tracks that deferred it while parsing, concurrently.
+
+        It should be called once the tracks were selected, so that the DRM of tracks
+        that won't be downloaded isn't loaded.
+
+        Parameters:
+            service: The Service of the tracks, to get their DRM from if it can.
+            max_workers: Max amount of tracks to load the DRM of at once.
+        """
+        tracks = [track for track in self if getattr(track, "needs_drm_loading", False)]
+        if not tracks:
+            return
+        with ThreadPoolExecutor(min(max_workers, len(tracks)), thread_name_prefix="drm") as pool:
+            # consume the results so the first failure is raised
+            for _ in pool.map(lambda track: track.load_drm_if_needed(service), tracks):
+                pass
+
+    def get_mux_path(self) -> Optional[Path]:
+        """Get the default path to mux to, next to the first video, audio, or subtitle track."""
+        if self.videos:
+            return self.videos[0].path.with_suffix(".muxed.mkv")
+        if self.audio:
+            return self.audio[0].path.with_suffix(".muxed.mka")
+        if self.subtitles:
+            return self.subtitles[0].path.with_suffix(".muxed.mks")
+        return None
+
     def mux(
         self,
         title: str,
@@ -371,6 +439,7 @@ class Tracks:
         audio_expected: bool = True,
         title_language: Optional[Language] = None,
         skip_subtitles: bool = False,
+        output_path: Optional[Path] = None,
     ) -> tuple[Path, int, list[str]]:
         """
         Multiplex all the Tracks into a Matroska Container file.
@@ -386,6 +455,8 @@ class Tracks:
             title_language: The title's intended language. Used to select the best video track
                 for audio metadata when multiple video tracks exist.
             skip_subtitles: Skip muxing subtitle tracks into the container.
+            output_path: The path to mux to, instead of get_mux_path(). It must be unique
+                if other Tracks with the same tracks may be muxed at the same time.
         """
         if self.videos and not self.audio and audio_expected:
             video_track = None
@@ -531,6 +602,9 @@ class Tracks:
             chapters_path = config.directories.temp / config.filenames.chapters.format(
                 title=sanitize_filename(title), random=self.chapters.id
             )
+            if output_path:
+                # other muxes of the same title and chapters may be using the default path
+                chapters_path = chapters_path.with_stem(f"{chapters_path.stem}_{output_path.stem}")
             self.chapters.dump(chapters_path, fallback_name=config.chapter_fallback_name)
             cl.extend(["--chapter-charset", "UTF-8", "--chapters", str(chapters_path)])
         else:
@@ -553,15 +627,7 @@ class Tracks:
             )
 
         output_path = (
-            self.videos[0].path.with_suffix(".muxed.mkv")
-            if self.videos
-            else self.audio[0].path.with_suffix(".muxed.mka")
-            if self.audio
-            else self.subtitles[0].path.with_suffix(".muxed.mks")
-            if self.subtitles
-            else chapters_path.with_suffix(".muxed.mkv")
-            if self.chapters
-            else None
+            output_path or self.get_mux_path() or (chapters_path.with_suffix(".muxed.mkv") if chapters_path else None)
         )
         if not output_path:
             raise ValueError("No tracks provided, at least one track must be provided.")
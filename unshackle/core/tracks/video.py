@@ -5,6 +5,7 @@ import math
 import re
 import subprocess
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Optional, Union
 
@@ -97,6 +98,7 @@ class Video(Track):
         HYBRID = "HYBRID"  # Selects both HDR10 and DV tracks for hybrid processing with DoviTool
 
         @staticmethod
+        @lru_cache(maxsize=64)  # the CICP enums are made on every call, and manifests repeat the same values
         def from_cicp(primaries: int, transfer: int, matrix: int) -> Video.Range:
             """
             Convert CICP (Coding-Independent Code Points) values to Video Range.
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import errno
+import os
+from pathlib import Path
+from types import TracebackType
+from typing import Iterable, Optional, Type
+
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# errors that mean a copy method can't be used for these two files, rather than the copy failing
+FALLBACK_ERRNOS = {
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+    errno.ENOTSOCK,
+    errno.EPERM,
+}
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, length: int) -> int:
+    while offset < length:
+        copied = os.copy_file_range(src_fd, dst_fd, length - offset, offset)
+        if not copied:
+            break
+        offset += copied
+    return offset
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, length: int) -> int:
+    while offset < length:
+        copied = os.sendfile(dst_fd, src_fd, offset, length - offset)
+        if not copied:
+            break
+        offset += copied
+    return offset
+
+
+COPY_METHODS = tuple(
+    method
+    for method, available in (
+        (_copy_file_range, hasattr(os, "copy_file_range")),
+        (_sendfile, hasattr(os, "sendfile")),
+    )
+    if available
+)
+
+
+class ConcatWriter:
+    """
+    Concatenate files and data to a file without passing the file data through Python.
+
+    Files are copied within the kernel with copy_file_range(), which on filesystems
+    like Btrfs, XFS and NFS may not copy any data at all. If it cannot be used, e.g.,
+    the files are on different filesystems, sendfile() is used, and when neither are
+    available it falls back to a buffered copy with a single reusable buffer.
+
+    The file is written to with its own unbuffered descriptor, and is synced to disk
+    once when closed rather than after every write.
+
+    Example:
+        >>> with ConcatWriter(save_path) as f:
+        ...     f.write(init_data)
+        ...     for segment in segments:
+        ...         f.append(segment)
+    """
+
+    def __init__(self, path: Path, append: bool = False, sync: bool = True):
+        """
+        Parameters:
+            path: The file to write to. It will be made if it doesn't exist.
+            append: Write after any existing data instead of truncating the file.
+            sync: Flush the file to disk once it has been closed successfully.
+        """
+        self.path = path
+        self.sync = sync
+        self._buffer: Optional[memoryview] = None
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | (0 if append else os.O_TRUNC), 0o666)
+        self.size = os.lseek(self._fd, 0, os.SEEK_END)
+
+    def write(self, data: bytes) -> int:
+        """Write data to the end of the file. Returns the amount of bytes written."""
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            self.size += written
+            view = view[written:]
+        return len(data)
+
+    def append(self, file: Path) -> int:
+        """Copy a file to the end of the file. Returns the amount of bytes copied."""
+        with open(file, "rb", buffering=0) as src:
+            src_fd = src.fileno()
+            length = os.fstat(src_fd).st_size
+
+            copied = 0
+            for method in COPY_METHODS:
+                try:
+                    copied = method(src_fd, self._fd, copied, length)
+                except OSError as e:
+                    if e.errno not in FALLBACK_ERRNOS:
+                        raise
+                    # anything it did copy is still valid, so the next method continues from it
+                    copied = os.lseek(self._fd, 0, os.SEEK_CUR) - self.size
+                    continue
+                break
+            self.size += copied
+
+            if copied < length:
+                if self._buffer is None:
+                    self._buffer = memoryview(bytearray(COPY_BUFFER_SIZE))
+                src.seek(copied)
+                while read := src.readinto(self._buffer):
+                    copied += self.write(self._buffer[:read])
+
+        return copied
+
+    def close(self, sync: Optional[bool] = None) -> None:
+        if self._fd < 0:
+            return
+        try:
+            if self.sync if sync is None else sync:
+                os.fsync(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> ConcatWriter:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        # there's no point syncing a file that failed to be written
+        self.close(sync=False if exc_type else None)
+
+
+def concat_files(
+    files: Iterable[Path],
+    to: Path,
+    data: Optional[bytes] = None,
+    append: bool = False,
+    delete: bool = False,
+    sync: bool = True,
+) -> int:
+    """
+    Concatenate files to a path, see `ConcatWriter`.
+
+    Parameters:
+        files: The files to concatenate, in sequence.
+        to: The output file with all the concatenated data.
+        data: Data to write before the files, e.g., init data.
+        append: Write after any existing data of the output file instead of truncating it.
+        delete: Delete each file once it has been copied.
+        sync: Flush the output file to disk once, after all files were copied.
+
+    Returns the size of the output file.
+    """
+    with ConcatWriter(to, append=append, sync=sync) as f:
+        if data:
+            f.write(data)
+        for file in files:
+            f.append(file)
+            if delete:
+                file.unlink()
+    return f.size
+
+
+__all__ = ("ConcatWriter", "concat_files")
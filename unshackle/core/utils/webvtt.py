@@ -176,7 +176,7 @@ def merge_segmented_webvtt(vtt_raw: str, segment_durations: Optional[list[int]]
             if max_idx >= len(segment_durations):
                 # Pad with the last known duration (or 0 if empty) so indexing is safe.
                 pad_val = segment_durations[-1] if segment_durations else 0
-                segment_durations = segment_durations + [pad_val] * (max_idx - len(segment_durations) + 1)
+                segment_durations = [*segment_durations, *[pad_val] * (max_idx - len(segment_durations) + 1)]
 
         if captions[0].segment_index == 0:
             first_segment_mpegts = captions[0].mpegts
@@ -1,5 +1,5 @@
 from abc import ABCMeta, abstractmethod
-from typing import Iterator, Optional, Union
+from typing import Any, Iterable, Iterator, Optional, Union
 from uuid import UUID
 
 
@@ -25,10 +25,42 @@ class Vault(metaclass=ABCMeta):
         superior.
         """
 
+    def get_keys_by_kid(self, kids: Iterable[Union[UUID, str]], service: str) -> dict[str, str]:
+        """
+        Get the Keys of multiple KIDs from Vault by Service, as a mapping of KID hex to Key.
+        KIDs the Vault has no Key for are left out.
+
+        Vaults that can look up many KIDs at once, e.g., in one query, should override it,
+        by default every KID is looked up with get_key().
+        """
+        keys = {}
+        for kid in kids:
+            kid = kid.hex if isinstance(kid, UUID) else kid
+            key = self.get_key(kid, service)
+            if key:
+                keys[kid] = key
+        return keys
+
     @abstractmethod
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
         """Get All Keys from Vault by Service."""
 
+    def get_keys_after(self, service: str, after: Optional[Any] = None) -> Iterator[tuple[str, str, Any]]:
+        """
+        Get All Keys from Vault by Service with the position of each Key, only those after the `after` position.
+
+        A position is a JSON-serializable value a caller can save, and give back to continue from the
+        Key after it, e.g., to resume an interrupted copy. Only Vaults that gave a position know what
+        it means.
+
+        By default the position is the amount of Keys got with get_keys(), so the Keys before it are
+        still got, but not yielded. Vaults that can start from a position, e.g., with an ordered query
+        or a page, should override it.
+        """
+        for position, (kid, key) in enumerate(self.get_keys(service), start=1):
+            if after is None or position > after:
+                yield kid, key, position
+
     @abstractmethod
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
         """Add KID:KEY to the Vault."""
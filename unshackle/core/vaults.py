@@ -1,4 +1,9 @@
-from typing import Any, Iterator, Optional, Union
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, Optional, Union
 from uuid import UUID
 
 from unshackle.core.config import config
@@ -9,7 +14,94 @@ _VAULTS = sorted(
     (path for path in config.directories.vaults.glob("*.py") if path.stem.lower() != "__init__"), key=lambda x: x.stem
 )
 
-_MODULES = {path.stem: getattr(import_module_by_path(path), path.stem) for path in _VAULTS}
+# vaults are only imported once loaded, as some import their database drivers, e.g., MySQL
+_MODULES: dict[str, type[Vault]] = {}
+_lock = threading.Lock()
+
+
+KEY_CACHE_SIZE = 4096
+MISSING_KEY_TTL = 300  # seconds to remember that a vault has no key for a KID
+
+
+class KeyCache:
+    """
+    LRU cache of the Keys each Vault has, or doesn't have, by Service and KID.
+
+    It is shared by the whole process, so KIDs looked up by every track and
+    title of a run only query each Vault once. That a Vault has no Key for a
+    KID is only remembered for MISSING_KEY_TTL seconds, or until a Key for it
+    is added to the Vault, as the Key may be added to it by something else.
+    """
+
+    def __init__(self, max_size: int = KEY_CACHE_SIZE, missing_ttl: float = MISSING_KEY_TTL):
+        self.max_size = max_size
+        self.missing_ttl = missing_ttl
+        self._entries: OrderedDict[tuple[int, str, str], tuple[Optional[str], float]] = OrderedDict()
+        # each Vault object gets its own entries, even of the same type and name, without keeping it alive
+        self._vault_ids: weakref.WeakKeyDictionary[Vault, int] = weakref.WeakKeyDictionary()
+        self._next_vault_id = itertools.count()
+        self._lock = threading.Lock()
+
+    def get_cache_key(self, vault: Vault, service: str, kid: str) -> tuple[int, str, str]:
+        vault_id = self._vault_ids.get(vault)
+        if vault_id is None:
+            vault_id = self._vault_ids[vault] = next(self._next_vault_id)
+        return vault_id, service.lower(), kid.lower()
+
+    def get(self, vault: Vault, service: str, kid: str) -> tuple[bool, Optional[str]]:
+        """Get whether it's known if the Vault has a Key for the KID, and the Key if it does."""
+        with self._lock:
+            cache_key = self.get_cache_key(vault, service, kid)
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return False, None
+            key, expires = entry
+            if key is None and time.monotonic() >= expires:
+                del self._entries[cache_key]
+                return False, None
+            self._entries.move_to_end(cache_key)
+            return True, key
+
+    def set(self, vault: Vault, service: str, kid: str, key: Optional[str]) -> None:
+        """Remember the Key the Vault has for the KID, or that it has none if the Key is None."""
+        with self._lock:
+            cache_key = self.get_cache_key(vault, service, kid)
+            self._entries[cache_key] = (key, time.monotonic() + self.missing_ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, vault: Vault, service: str, kid: str) -> None:
+        """Forget whether the Vault has a Key for the KID, e.g., after one was added to it."""
+        with self._lock:
+            self._entries.pop(self.get_cache_key(vault, service, kid), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+key_cache = KeyCache()
+
+
+def get_kid(kid: Union[UUID, str]) -> str:
+    """Get a KID as the lowercase hex string Vaults use."""
+    if isinstance(kid, UUID):
+        return kid.hex
+    return kid.replace("-", "").lower()
+
+
+def get_vault_class(type_: str) -> type[Vault]:
+    """Get a Vault class by its type, importing it if it's not yet been."""
+    path = next((x for x in _VAULTS if x.stem == type_), None)
+    if not path:
+        raise ValueError(f"Unable to find vault command by the name '{type_}'.")
+
+    with _lock:
+        module = _MODULES.get(type_)
+        if not module:
+            module = _MODULES[type_] = getattr(import_module_by_path(path), path.stem)
+        return module
 
 
 class Vaults:
@@ -27,9 +119,7 @@ class Vaults:
 
     def load(self, type_: str, **kwargs: Any) -> bool:
         """Load a Vault into the vaults list. Returns True if successful, False otherwise."""
-        module = _MODULES.get(type_)
-        if not module:
-            raise ValueError(f"Unable to find vault command by the name '{type_}'.")
+        module = get_vault_class(type_)
         try:
             vault = module(**kwargs)
             self.vaults.append(vault)
@@ -39,47 +129,126 @@ class Vaults:
 
     def load_critical(self, type_: str, **kwargs: Any) -> None:
         """Load a critical Vault that must succeed or raise an exception."""
-        module = _MODULES.get(type_)
-        if not module:
-            raise ValueError(f"Unable to find vault command by the name '{type_}'.")
+        module = get_vault_class(type_)
         vault = module(**kwargs)
         self.vaults.append(vault)
 
     def get_key(self, kid: Union[UUID, str]) -> tuple[Optional[str], Optional[Vault]]:
         """Get Key from the first Vault it can by KID (Key ID) and Service."""
+        return self.get_keys([kid]).get(kid, (None, None))
+
+    def get_keys(self, kids: Iterable[Union[UUID, str]]) -> dict[Union[UUID, str], tuple[str, Vault]]:
+        """
+        Get the Keys of multiple KIDs from the first Vault that has each of them, by Service.
+        Each Vault is asked for every KID it may have at once, see Vault.get_keys_by_kid().
+        KIDs that no Vault has a Key for are left out.
+        """
+        found: dict[Union[UUID, str], tuple[str, Vault]] = {}
+        pending = {get_kid(kid): kid for kid in kids}
+
         for vault in self.vaults:
-            key = vault.get_key(kid, self.service)
-            if key and key.count("0") != len(key):
-                return key, vault
-        return None, None
+            if not pending:
+                break
+
+            unknown = []
+            for kid_hex, kid in list(pending.items()):
+                known, key = key_cache.get(vault, self.service, kid_hex)
+                if not known:
+                    unknown.append(kid_hex)
+                elif key:
+                    found[kid] = (key, vault)
+                    del pending[kid_hex]
+
+            for kid_hex, key in self._look_up(vault, unknown).items():
+                if key:
+                    found[pending.pop(kid_hex)] = (key, vault)
+
+        return found
+
+    def get_missing_keys(self, vault: Vault, kid_keys: dict[Union[UUID, str], str]) -> dict[Union[UUID, str], str]:
+        """
+        Get the KID:KEYs a Vault doesn't have, i.e., it has no Key, or another Key, for the KID.
+        KIDs it's not known to have a Key for are looked up at once, see Vault.get_keys_by_kid().
+        """
+        self._look_up(
+            vault, [get_kid(kid) for kid in kid_keys if not key_cache.get(vault, self.service, get_kid(kid))[0]]
+        )
+
+        missing = {}
+        for kid, key in kid_keys.items():
+            known, vault_key = key_cache.get(vault, self.service, get_kid(kid))
+            # it may not be known anymore if the cache dropped it, e.g., when adding more KIDs than it keeps
+            if not known or not vault_key or vault_key.lower() != key.lower():
+                missing[kid] = key
+        return missing
+
+    def _look_up(self, vault: Vault, kids: list[str]) -> dict[str, Optional[str]]:
+        """Get the Keys a Vault has for KIDs, or None for KIDs it has none for, remembering them in the key cache."""
+        if not kids:
+            return {}
+
+        keys = {get_kid(kid): key for kid, key in vault.get_keys_by_kid(kids, self.service).items()}
+        looked_up = {}
+        for kid_hex in kids:
+            key = keys.get(kid_hex)
+            if key and key.count("0") == len(key):
+                key = None
+            key_cache.set(vault, self.service, kid_hex, key)
+            looked_up[kid_hex] = key
+        return looked_up
 
     def add_key(self, kid: Union[UUID, str], key: str, excluding: Optional[Vault] = None) -> int:
-        """Add a KID:KEY to all Vaults, optionally with an exclusion."""
+        """
+        Add a KID:KEY to all Vaults, optionally with an exclusion.
+        It's only added to the Vaults that don't have it, see get_missing_keys().
+        """
+        kid_hex = get_kid(kid)
         success = 0
         for vault in self.vaults:
             if vault != excluding and not vault.no_push:
                 try:
-                    success += vault.add_key(self.service, kid, key)
+                    if not self.get_missing_keys(vault, {kid: key}):
+                        continue
+                except NotImplementedError:
+                    # it can't be looked up, add it anyway
+                    pass
+                try:
+                    if vault.add_key(self.service, kid, key):
+                        success += 1
                 except (PermissionError, NotImplementedError):
                     pass
+                finally:
+                    # it may now have a Key it was remembered not to have, or kept another Key for the KID
+                    key_cache.forget(vault, self.service, kid_hex)
         return success
 
     def add_keys(self, kid_keys: dict[Union[UUID, str], str]) -> int:
         """
         Add multiple KID:KEYs to all Vaults. Duplicate Content Keys are skipped.
+        They're only added to the Vaults that don't have them, see get_missing_keys().
         PermissionErrors when the user cannot create Tables are absorbed and ignored.
         Vaults with no_push=True are skipped.
         """
         success = 0
         for vault in self.vaults:
             if not vault.no_push:
+                try:
+                    new_keys = self.get_missing_keys(vault, kid_keys)
+                except NotImplementedError:
+                    # they can't be looked up, add them all anyway
+                    new_keys = kid_keys
                 try:
                     # Count each vault that successfully processes the keys (whether new or existing)
-                    vault.add_keys(self.service, kid_keys)
+                    if new_keys:
+                        vault.add_keys(self.service, new_keys)
                     success += 1
                 except (PermissionError, NotImplementedError):
                     pass
+                finally:
+                    # KIDs the vault already had a Key for are skipped, so which Key it has for each is unknown
+                    for kid in new_keys:
+                        key_cache.forget(vault, self.service, get_kid(kid))
         return success
 
 
-__all__ = ("Vaults",)
+__all__ = ("Vaults", "KeyCache", "key_cache")
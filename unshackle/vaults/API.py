@@ -1,4 +1,4 @@
-from typing import Iterator, Optional, Union
+from typing import Any, Iterator, Optional, Union
 from uuid import UUID
 
 from requests import Session
@@ -6,6 +6,8 @@ from requests import Session
 from unshackle.core import __version__
 from unshackle.core.vault import Vault
 
+PAGE_SIZE = 10  # keys per page, the positions of get_keys_after() depend on it
+
 
 class API(Vault):
     """Key Vault using a simple RESTful HTTP API call."""
@@ -48,12 +50,18 @@ class API(Vault):
         return content_key
 
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
-        page = 1
+        for kid, key, _ in self.get_keys_after(service):
+            yield kid, key
+
+    def get_keys_after(self, service: str, after: Optional[Any] = None) -> Iterator[tuple[str, str, Any]]:
+        # the position of a key is its page, and its number on the page, so continuing from a position
+        # fetches its page, and not the pages before it, again
+        page, skip = after or (1, 0)
 
         while True:
             data = self.session.get(
                 url=f"{self.uri}/{service.lower()}",
-                params={"page": page, "total": 10},
+                params={"page": page, "total": PAGE_SIZE},
                 headers={"Accept": "application/json"},
             ).json()
 
@@ -75,14 +83,16 @@ class API(Vault):
                 if not isinstance(content_keys, dict):
                     raise ValueError(f"Expected {content_keys} to be {dict}, was {type(content_keys)}")
 
-                for key_id, key in content_keys.items():
-                    yield key_id, key
+                for number, (key_id, key) in enumerate(content_keys.items(), start=1):
+                    if number > skip:
+                        yield key_id, key, (page, number)
 
             pages = int(data["pages"])
             if pages <= page:
                 break
 
             page += 1
+            skip = 0
 
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
         if isinstance(kid, UUID):
@@ -1,5 +1,6 @@
-import threading
-from typing import Iterator, Optional, Union
+import queue
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional, Union
 from uuid import UUID
 
 import pymysql
@@ -8,6 +9,10 @@ from pymysql.cursors import DictCursor
 from unshackle.core.services import Services
 from unshackle.core.vault import Vault
 
+BATCH_SIZE = 500  # KIDs per query
+PAGE_SIZE = 1000  # rows per query of get_keys_after()
+POOL_SIZE = 8  # idle connections kept open for reuse by any thread
+
 
 class MySQL(Vault):
     """Key Vault using a remotely-accessed mysql database connection."""
@@ -19,9 +24,7 @@ class MySQL(Vault):
         """
         super().__init__(name, no_push)
         self.slug = f"{host}:{database}:{username}"
-        self.conn_factory = ConnectionFactory(
-            dict(host=host, db=database, user=username, cursorclass=DictCursor, **kwargs)
-        )
+        self.pool = ConnectionPool(dict(host=host, db=database, user=username, cursorclass=DictCursor, **kwargs))
 
         self.permissions = self.get_permissions()
         if not self.has_permission("SELECT"):
@@ -31,51 +34,116 @@ class MySQL(Vault):
         if isinstance(kid, UUID):
             kid = kid.hex
 
-        service_variants = [service]
-        if service != service.lower():
-            service_variants.append(service.lower())
-        if service != service.upper():
-            service_variants.append(service.upper())
+        service_tables = self.get_service_tables(service)
+        if not service_tables:
+            return None
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-        try:
-            for service_name in service_variants:
-                if not self.has_table(service_name):
-                    continue
+            try:
+                for service_name in service_tables:
+                    cursor.execute(
+                        # TODO: SQL injection risk
+                        f"SELECT `id`, `key_` FROM `{service_name}` WHERE `kid`=%s AND `key_`!=%s",
+                        (kid, "0" * 32),
+                    )
+                    cek = cursor.fetchone()
+                    if cek:
+                        return cek["key_"]
+
+                return None
+            finally:
+                cursor.close()
+
+    def get_keys_by_kid(self, kids: Iterable[Union[UUID, str]], service: str) -> dict[str, str]:
+        kids = {(kid.hex if isinstance(kid, UUID) else kid).lower(): kid for kid in kids}
+
+        service_tables = self.get_service_tables(service)
+        if not service_tables:
+            return {}
+
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
+
+            keys: dict[str, str] = {}
+            try:
+                for service_name in service_tables:
+                    pending = [kid for kid in kids.values() if kid not in keys]
+                    for i in range(0, len(pending), BATCH_SIZE):
+                        batch = pending[i : i + BATCH_SIZE]
+                        placeholders = ",".join(["%s"] * len(batch))
+                        cursor.execute(
+                            # TODO: SQL injection risk
+                            f"SELECT `kid`, `key_` FROM `{service_name}` WHERE `kid` IN ({placeholders}) AND `key_`!=%s",
+                            (*batch, "0" * 32),
+                        )
+                        for row in cursor.fetchall():
+                            # kid may be matched case-insensitively, use the KID as it was given
+                            kid = kids.get(row["kid"].lower())
+                            if kid is not None:
+                                keys.setdefault(kid, row["key_"])
+                return keys
+            finally:
+                cursor.close()
+
+    def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
+        if not self.has_table(service):
+            # no table, no keys, simple
+            return None
 
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
+
+            try:
                 cursor.execute(
                     # TODO: SQL injection risk
-                    f"SELECT `id`, `key_` FROM `{service_name}` WHERE `kid`=%s AND `key_`!=%s",
-                    (kid, "0" * 32),
+                    f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=%s",
+                    ("0" * 32,),
                 )
-                cek = cursor.fetchone()
-                if cek:
-                    return cek["key_"]
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
 
-            return None
-        finally:
-            cursor.close()
+        # yield after giving the connection back, so it's not held while the caller works
+        for row in rows:
+            yield row["kid"], row["key_"]
 
-    def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
+    def get_keys_after(self, service: str, after: Optional[Any] = None) -> Iterator[tuple[str, str, Any]]:
+        # the position of a key is its KID:KEY
         if not self.has_table(service):
-            # no table, no keys, simple
             return None
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=%s",
-                ("0" * 32,),
-            )
-            for row in cursor.fetchall():
-                yield row["kid"], row["key_"]
-        finally:
-            cursor.close()
+        while True:
+            # a page at a time, with a connection only while it's fetched, the UNIQUE(kid, key_) index
+            # gives the rows in order, and after the last page, without a sort or scan
+            with self.pool.get() as conn:
+                cursor = conn.cursor()
+
+                try:
+                    if after:
+                        cursor.execute(
+                            # TODO: SQL injection risk
+                            f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=%s AND (`kid`, `key_`) > (%s, %s) "
+                            "ORDER BY `kid`, `key_` LIMIT %s",
+                            ("0" * 32, *after, PAGE_SIZE),
+                        )
+                    else:
+                        cursor.execute(
+                            # TODO: SQL injection risk
+                            f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=%s ORDER BY `kid`, `key_` LIMIT %s",
+                            ("0" * 32, PAGE_SIZE),
+                        )
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+
+            for row in rows:
+                after = (row["kid"], row["key_"])
+                yield row["kid"], row["key_"], after
+
+            if len(rows) < PAGE_SIZE:
+                break
 
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
         if not key or key.count("0") == len(key):
@@ -93,26 +161,19 @@ class MySQL(Vault):
         if isinstance(kid, UUID):
             kid = kid.hex
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-        try:
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"SELECT `id` FROM `{service}` WHERE `kid`=%s AND `key_`=%s",
-                (kid, key),
-            )
-            if cursor.fetchone():
-                # table already has this exact KID:KEY stored
-                return True
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"INSERT INTO `{service}` (kid, key_) VALUES (%s, %s)",
-                (kid, key),
-            )
-        finally:
-            conn.commit()
-            cursor.close()
+            try:
+                # the UNIQUE(kid, key_) index ignores an exact KID:KEY that's already stored
+                cursor.execute(
+                    # TODO: SQL injection risk
+                    f"INSERT IGNORE INTO `{service}` (kid, key_) VALUES (%s, %s)",
+                    (kid, key),
+                )
+            finally:
+                conn.commit()
+                cursor.close()
 
         return True
 
@@ -141,53 +202,86 @@ class MySQL(Vault):
         if not kid_keys:
             return 0
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-        try:
-            placeholders = ",".join(["%s"] * len(kid_keys))
-            cursor.execute(f"SELECT kid FROM `{service}` WHERE kid IN ({placeholders})", list(kid_keys.keys()))
-            existing_kids = {row["kid"] for row in cursor.fetchall()}
+            try:
+                existing_kids = set()
+                kids = list(kid_keys)
+                for i in range(0, len(kids), BATCH_SIZE):
+                    batch = kids[i : i + BATCH_SIZE]
+                    placeholders = ",".join(["%s"] * len(batch))
+                    cursor.execute(f"SELECT kid FROM `{service}` WHERE kid IN ({placeholders})", batch)
+                    existing_kids.update(row["kid"] for row in cursor.fetchall())
+
+                new_keys = [(kid, key) for kid, key in kid_keys.items() if kid not in existing_kids]
+
+                if not new_keys:
+                    return 0
+
+                # pymysql sends these as multi-row INSERTs, all committed at once
+                cursor.executemany(
+                    f"INSERT IGNORE INTO `{service}` (kid, key_) VALUES (%s, %s)",
+                    new_keys,
+                )
+                return max(cursor.rowcount, 0)
+            finally:
+                conn.commit()
+                cursor.close()
 
-            new_keys = {kid: key for kid, key in kid_keys.items() if kid not in existing_kids}
+    def get_services(self) -> Iterator[str]:
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-            if not new_keys:
-                return 0
+            try:
+                cursor.execute("SHOW TABLES")
+                tables = cursor.fetchall()
+            finally:
+                cursor.close()
 
-            cursor.executemany(
-                f"INSERT INTO `{service}` (kid, key_) VALUES (%s, %s)",
-                new_keys.items(),
-            )
-            return len(new_keys)
-        finally:
-            conn.commit()
-            cursor.close()
+        for table in tables:
+            # each entry has a key named `Tables_in_<db name>`
+            yield Services.get_tag(list(table.values())[0])
 
-    def get_services(self) -> Iterator[str]:
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+    def get_service_tables(self, service: str) -> list[str]:
+        """
+        Get the Tables of a Service, trying the original, lowercase, and uppercase Service name
+        to handle case sensitivity issues, with a single query.
+        """
+        service_variants = [service]
+        if service != service.lower():
+            service_variants.append(service.lower())
+        if service != service.upper():
+            service_variants.append(service.upper())
 
-        try:
-            cursor.execute("SHOW TABLES")
-            for table in cursor.fetchall():
-                # each entry has a key named `Tables_in_<db name>`
-                yield Services.get_tag(list(table.values())[0])
-        finally:
-            cursor.close()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
+
+            try:
+                placeholders = ",".join(["%s"] * len(service_variants))
+                cursor.execute(
+                    "SELECT TABLE_NAME AS name FROM information_schema.TABLES "
+                    f"WHERE TABLE_SCHEMA=%s AND TABLE_NAME IN ({placeholders})",
+                    (conn.db, *service_variants),
+                )
+                tables = {row["name"] for row in cursor.fetchall()}
+                return [name for name in service_variants if name in tables]
+            finally:
+                cursor.close()
 
     def has_table(self, name: str) -> bool:
         """Check if the Vault has a Table with the specified name."""
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-        try:
-            cursor.execute(
-                "SELECT count(TABLE_NAME) FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s",
-                (conn.db, name),
-            )
-            return list(cursor.fetchone().values())[0] == 1
-        finally:
-            cursor.close()
+            try:
+                cursor.execute(
+                    "SELECT count(TABLE_NAME) FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s",
+                    (conn.db, name),
+                )
+                return list(cursor.fetchone().values())[0] == 1
+            finally:
+                cursor.close()
 
     def create_table(self, name: str):
         """Create a Table with the specified name if not yet created."""
@@ -197,46 +291,46 @@ class MySQL(Vault):
         if not self.has_permission("CREATE"):
             raise PermissionError(f"MySQL vault {self.slug} has no CREATE permission.")
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-        try:
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"""
-                CREATE TABLE IF NOT EXISTS {name} (
-                  id          int AUTO_INCREMENT PRIMARY KEY,
-                  kid         VARCHAR(64) NOT NULL,
-                  key_        VARCHAR(64) NOT NULL,
-                  UNIQUE(kid, key_)
-                );
-                """
-            )
-        finally:
-            conn.commit()
-            cursor.close()
+            try:
+                cursor.execute(
+                    # TODO: SQL injection risk
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {name} (
+                      id          int AUTO_INCREMENT PRIMARY KEY,
+                      kid         VARCHAR(64) NOT NULL,
+                      key_        VARCHAR(64) NOT NULL,
+                      UNIQUE(kid, key_)
+                    );
+                    """
+                )
+            finally:
+                conn.commit()
+                cursor.close()
 
     def get_permissions(self) -> list:
         """Get and parse Grants to a more easily usable list tuple array."""
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        with self.pool.get() as conn:
+            cursor = conn.cursor()
 
-        try:
-            cursor.execute("SHOW GRANTS")
-            grants = cursor.fetchall()
-            grants = [next(iter(x.values())) for x in grants]
-            grants = [tuple(x[6:].split(" TO ")[0].split(" ON ")) for x in list(grants)]
-            grants = [
-                (
-                    list(map(str.strip, perms.replace("ALL PRIVILEGES", "*").split(","))),
-                    location.replace("`", "").split("."),
-                )
-                for perms, location in grants
-            ]
-            return grants
-        finally:
-            conn.commit()
-            cursor.close()
+            try:
+                cursor.execute("SHOW GRANTS")
+                grants = cursor.fetchall()
+                grants = [next(iter(x.values())) for x in grants]
+                grants = [tuple(x[6:].split(" TO ")[0].split(" ON ")) for x in list(grants)]
+                grants = [
+                    (
+                        list(map(str.strip, perms.replace("ALL PRIVILEGES", "*").split(","))),
+                        location.replace("`", "").split("."),
+                    )
+                    for perms, location in grants
+                ]
+                return grants
+            finally:
+                conn.commit()
+                cursor.close()
 
     def has_permission(self, operation: str, database: Optional[str] = None, table: Optional[str] = None) -> bool:
         """Check if the current connection has a specific permission."""
@@ -248,15 +342,44 @@ class MySQL(Vault):
         return bool(grants)
 
 
-class ConnectionFactory:
-    def __init__(self, con: dict):
+class ConnectionPool:
+    """
+    Connections shared by every thread, each used by one thread at a time.
+
+    A connection is taken from the idle connections, or made if there are none,
+    and given back after use, keeping up to POOL_SIZE of them open.
+    """
+
+    def __init__(self, con: dict, size: int = POOL_SIZE):
         self._con = con
-        self._store = threading.local()
+        self._idle: queue.LifoQueue[pymysql.Connection] = queue.LifoQueue(size)
 
     def _create_connection(self) -> pymysql.Connection:
         return pymysql.connect(**self._con)
 
-    def get(self) -> pymysql.Connection:
-        if not hasattr(self._store, "conn"):
-            self._store.conn = self._create_connection()
-        return self._store.conn
+    @contextmanager
+    def get(self) -> Iterator[pymysql.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+            conn.ping(reconnect=True)
+        except queue.Empty:
+            conn = self._create_connection()
+
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except pymysql.Error:
+                pass  # broken connection, don't give it back
+            else:
+                self._put(conn)
+            raise
+        else:
+            self._put(conn)
+
+    def _put(self, conn: pymysql.Connection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
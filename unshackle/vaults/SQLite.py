@@ -2,12 +2,15 @@ import sqlite3
 import threading
 from pathlib import Path
 from sqlite3 import Connection
-from typing import Iterator, Optional, Union
+from typing import Any, Iterable, Iterator, Optional, Union
 from uuid import UUID
 
 from unshackle.core.services import Services
 from unshackle.core.vault import Vault
 
+BATCH_SIZE = 500  # KIDs per query, below SQLite's lowest default limit of variables per statement
+CACHE_SIZE = 32 * 1024  # KiB of pages cached per connection
+
 
 class SQLite(Vault):
     """Key Vault using a locally-accessed sqlite DB file."""
@@ -17,6 +20,7 @@ class SQLite(Vault):
         self.path = Path(path).expanduser()
         # TODO: Use a DictCursor or such to get fetches as dict?
         self.conn_factory = ConnectionFactory(self.path)
+        self._prepared_tables: set[str] = set()
 
     def get_key(self, kid: Union[UUID, str], service: str) -> Optional[str]:
         if isinstance(kid, UUID):
@@ -25,18 +29,8 @@ class SQLite(Vault):
         conn = self.conn_factory.get()
         cursor = conn.cursor()
 
-        # Try both the original service name and lowercase version to handle case sensitivity issues
-        service_variants = [service]
-        if service != service.lower():
-            service_variants.append(service.lower())
-        if service != service.upper():
-            service_variants.append(service.upper())
-
         try:
-            for service_name in service_variants:
-                if not self.has_table(service_name):
-                    continue
-
+            for service_name in self.get_service_tables(service):
                 cursor.execute(
                     f"SELECT `id`, `key_` FROM `{service_name}` WHERE `kid`=? AND `key_`!=?", (kid, "0" * 32)
                 )
@@ -48,6 +42,32 @@ class SQLite(Vault):
         finally:
             cursor.close()
 
+    def get_keys_by_kid(self, kids: Iterable[Union[UUID, str]], service: str) -> dict[str, str]:
+        kids = {(kid.hex if isinstance(kid, UUID) else kid).lower(): kid for kid in kids}
+
+        conn = self.conn_factory.get()
+        cursor = conn.cursor()
+
+        keys: dict[str, str] = {}
+        try:
+            for service_name in self.get_service_tables(service):
+                pending = [kid for kid in kids.values() if kid not in keys]
+                for i in range(0, len(pending), BATCH_SIZE):
+                    batch = pending[i : i + BATCH_SIZE]
+                    placeholders = ",".join(["?"] * len(batch))
+                    cursor.execute(
+                        f"SELECT `kid`, `key_` FROM `{service_name}` WHERE `kid` IN ({placeholders}) AND `key_`!=?",
+                        (*batch, "0" * 32),
+                    )
+                    for kid, key_ in cursor.fetchall():
+                        # kid is matched case-insensitively, use the KID as it was given
+                        kid = kids.get(kid.lower())
+                        if kid is not None:
+                            keys.setdefault(kid, key_)
+            return keys
+        finally:
+            cursor.close()
+
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
         if not self.has_table(service):
             # no table, no keys, simple
@@ -58,17 +78,42 @@ class SQLite(Vault):
 
         try:
             cursor.execute(f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=?", ("0" * 32,))
-            for kid, key_ in cursor.fetchall():
+            # rows are read as they're used, so a large table isn't loaded into memory at once
+            for kid, key_ in cursor:
                 yield kid, key_
         finally:
             cursor.close()
 
+    def get_keys_after(self, service: str, after: Optional[Any] = None) -> Iterator[tuple[str, str, Any]]:
+        # the position of a key is its KID:KEY
+        if not self.has_table(service):
+            return None
+
+        conn = self.conn_factory.get()
+        cursor = conn.cursor()
+
+        try:
+            # the UNIQUE(kid, key_) index gives the rows in order, and after them, without a sort or scan
+            if after:
+                cursor.execute(
+                    f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=? AND (`kid`, `key_`) > (?, ?) "
+                    "ORDER BY `kid`, `key_`",
+                    ("0" * 32, *after),
+                )
+            else:
+                cursor.execute(
+                    f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=? ORDER BY `kid`, `key_`", ("0" * 32,)
+                )
+            for kid, key_ in cursor:
+                yield kid, key_, (kid, key_)
+        finally:
+            cursor.close()
+
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
         if not key or key.count("0") == len(key):
             raise ValueError("You cannot add a NULL Content Key to a Vault.")
 
-        if not self.has_table(service):
-            self.create_table(service)
+        self.prepare_table(service)
 
         if isinstance(kid, UUID):
             kid = kid.hex
@@ -77,18 +122,12 @@ class SQLite(Vault):
         cursor = conn.cursor()
 
         try:
+            # a table already having this exact KID:KEY stored is fine
             cursor.execute(
                 # TODO: SQL injection risk
-                f"SELECT `id` FROM `{service}` WHERE `kid`=? AND `key_`=?",
-                (kid, key),
-            )
-            if cursor.fetchone():
-                # table already has this exact KID:KEY stored
-                return True
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"INSERT INTO `{service}` (kid, key_) VALUES (?, ?)",
-                (kid, key),
+                f"INSERT OR IGNORE INTO `{service}` (kid, key_) SELECT ?, ? "
+                f"WHERE NOT EXISTS (SELECT 1 FROM `{service}` WHERE `kid`=? AND `key_`=?)",
+                (kid, key, kid, key),
             )
         finally:
             conn.commit()
@@ -101,8 +140,7 @@ class SQLite(Vault):
             if not key or key.count("0") == len(key):
                 raise ValueError("You cannot add a NULL Content Key to a Vault.")
 
-        if not self.has_table(service):
-            self.create_table(service)
+        self.prepare_table(service)
 
         if not isinstance(kid_keys, dict):
             raise ValueError(f"The kid_keys provided is not a dictionary, {kid_keys!r}")
@@ -144,11 +182,13 @@ class SQLite(Vault):
             if not new_keys:
                 return 0
 
+            # all in one transaction, the unique KID:KEY index skips any added since the query
             cursor.executemany(
-                f"INSERT INTO `{service}` (kid, key_) VALUES (?, ?)",
+                # TODO: SQL injection risk
+                f"INSERT OR IGNORE INTO `{service}` (kid, key_) VALUES (?, ?)",
                 new_keys.items(),
             )
-            return len(new_keys)
+            return max(cursor.rowcount, 0)
         finally:
             conn.commit()
             cursor.close()
@@ -165,6 +205,30 @@ class SQLite(Vault):
         finally:
             cursor.close()
 
+    def get_service_tables(self, service: str) -> list[str]:
+        """
+        Get the Tables of a Service, trying the original, lowercase, and uppercase Service name
+        to handle case sensitivity issues, with a single query.
+        """
+        service_variants = [service]
+        if service != service.lower():
+            service_variants.append(service.lower())
+        if service != service.upper():
+            service_variants.append(service.upper())
+
+        conn = self.conn_factory.get()
+        cursor = conn.cursor()
+
+        try:
+            placeholders = ",".join(["?"] * len(service_variants))
+            cursor.execute(
+                f"SELECT name FROM sqlite_master WHERE type='table' AND name IN ({placeholders})", service_variants
+            )
+            tables = {name for (name,) in cursor.fetchall()}
+            return [name for name in service_variants if name in tables]
+        finally:
+            cursor.close()
+
     def has_table(self, name: str) -> bool:
         """Check if the Vault has a Table with the specified name."""
         conn = self.conn_factory.get()
@@ -176,6 +240,36 @@ class SQLite(Vault):
         finally:
             cursor.close()
 
+    def prepare_table(self, name: str) -> None:
+        """Create a Table with the specified name if not yet created, and ensure it has a unique KID:KEY index."""
+        if name in self._prepared_tables:
+            return
+
+        self.create_table(name)
+
+        conn = self.conn_factory.get()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(f"PRAGMA index_list(`{name}`)")
+            for index in cursor.fetchall():
+                index_name, unique = index[1], index[2]
+                if unique:
+                    cursor.execute(f"PRAGMA index_info(`{index_name}`)")
+                    if [column[2] for column in cursor.fetchall()] == ["kid", "key_"]:
+                        break
+            else:
+                try:
+                    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS `{name}_kid_key_` ON `{name}` (kid, key_)")
+                except sqlite3.IntegrityError:
+                    # it has duplicate KID:KEYs already, inserts still skip them without the index
+                    pass
+        finally:
+            conn.commit()
+            cursor.close()
+
+        self._prepared_tables.add(name)
+
     def create_table(self, name: str):
         """Create a Table with the specified name if not yet created."""
         if self.has_table(name):
@@ -208,7 +302,17 @@ class ConnectionFactory:
         self._store = threading.local()
 
     def _create_connection(self) -> Connection:
-        return sqlite3.connect(self._path)
+        conn = sqlite3.connect(self._path, timeout=30)
+        try:
+            # readers don't block the writer (and vice versa), and commits don't wait for a full sync
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # bulk inserts of random KIDs touch most of the index, so keep more of it in memory (in KiB)
+            conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE}")
+        except sqlite3.DatabaseError:
+            # e.g., a read-only file or a file system without shared memory support
+            pass
+        return conn
 
     def get(self) -> Connection:
         if not hasattr(self._store, "conn"):